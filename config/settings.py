@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "quiz.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -60,6 +64,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "quiz.middleware.QueryStatsMiddleware",
+    "quiz.middleware.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -85,13 +91,88 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+# SQLite unless DATABASE_ENGINE=postgresql, which reads the POSTGRES_*
+# variables below and needs psycopg 3 (pip install "psycopg[binary,pool]").
+DATABASE_ENGINE = os.environ.get("DATABASE_ENGINE", "sqlite")
+
+# SQLite tuned for many students saving answers at once: WAL lets reads run
+# alongside the one writer, IMMEDIATE transactions take the write lock up
+# front so they wait out the busy timeout instead of failing to upgrade a
+# read lock, and synchronous=NORMAL is safe with WAL (a power cut can lose
+# the last commits, never corrupt the file).
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # KiB
+    "temp_store": "MEMORY",
 }
 
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "quiz"),
+            "USER": os.environ.get("POSTGRES_USER", "quiz"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            # Keep connections open between requests, and check them before
+            # reuse so a restarted server does not fail the next request
+            "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if os.environ.get("DATABASE_POOL", "").lower() in ("1", "true", "yes"):
+        # psycopg's pool shares connections between the threads of a
+        # process; Django requires persistent connections off to use it
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DATABASE_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DATABASE_POOL_MAX_SIZE", "20")),
+            "timeout": int(os.environ.get("DATABASE_POOL_TIMEOUT", "10")),
+        }
+elif DATABASE_ENGINE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                "timeout": 20,  # busy timeout, seconds
+                "transaction_mode": "IMMEDIATE",
+                "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"DATABASE_ENGINE must be sqlite or postgresql, not {DATABASE_ENGINE!r}")
+
+# Funnel answer saves during an exam through one writer thread per process
+# (quiz/write_queue.py) instead of each request thread writing itself. Only
+# worth it where the database has a single writer.
+QUIZ_SERIALIZE_WRITES = DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3"
+
+# Count the queries of every request, log those over the limits (with their
+# repeated statements) and show per-view totals to staff at /stats/queries/
+QUIZ_QUERY_STATS = os.environ.get("QUIZ_QUERY_STATS", "").lower() in ("1", "true", "yes")
+QUIZ_QUERY_STATS_MAX_QUERIES = 50
+QUIZ_QUERY_STATS_MAX_SQL_MS = 250
+
+# Prometheus metrics at /metrics. Scrapers send "Authorization: Bearer
+# <QUIZ_METRICS_TOKEN>"; staff can open it when logged in. With several
+# worker processes, QUIZ_METRICS_DIR must be a directory shared by them and
+# emptied when the server starts.
+QUIZ_METRICS = os.environ.get("QUIZ_METRICS", "1").lower() in ("1", "true", "yes")
+QUIZ_METRICS_TOKEN = os.environ.get("QUIZ_METRICS_TOKEN", "")
+QUIZ_METRICS_DIR = os.environ.get("QUIZ_METRICS_DIR", "")
+
+# Staff can profile a request by sending "X-Quiz-Profile: 1" or adding
+# ?_profile=1; the newest QUIZ_PROFILE_KEEP profiles are kept here and
+# listed at /stats/profiles/
+QUIZ_PROFILE_DIR = os.environ.get("QUIZ_PROFILE_DIR", BASE_DIR / "profiles")
+QUIZ_PROFILE_KEEP = 50
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,70 +1,60 @@
 import os
 import django
 import sys
-import re
 
 # Setup Django environment
 sys.path.append('/Users/dhirendrasingh/.gemini/antigravity/scratch')
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
+from quiz.import_validation import ERROR, ImportReport, validate_record
+from quiz.latex_parser import parse_file
 from quiz.models import Question, Option
 
 INPUT_FILE = 'converted_questions.tex'
 
-def parse_converted_latex(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Split by \begin{question} ... \end{question}
-    # Using regex to capture blocks
-    
-    question_blocks = re.findall(r'\\begin\{question\}(.*?)\\end\{question\}', content, re.DOTALL)
-    
+def parse_converted_latex(file_path, report):
     parsed_questions = []
+    report.add_file(file_path)
     
-    for block in question_blocks:
+    for record in parse_file(file_path):
+        # Unknown \type, \chapter or \difficulty values are errors, not silently defaulted
+        issues = validate_record(record)
+        if not report.add_record(file_path, record, issues):
+            for issue in issues:
+                if issue.severity == ERROR:
+                    print(f"Skipping question at line {issue.line}: {issue.message}")
+            continue
+
         q_data = {}
+        q_data['type'] = record.question_type or 'MCQ_SINGLE'
+        q_data['chapter'] = record.chapter
+        q_data['difficulty'] = record.difficulty or 'MODERATE'
+        q_data['text'] = record.text
+        q_data['assertion'] = record.assertion
+        q_data['reason'] = record.reason
+        q_data['answer'] = record.answer
         
-        # Extract fields
-        type_match = re.search(r'\\type\{(.*?)\}', block)
-        chapter_match = re.search(r'\\chapter\{(.*?)\}', block)
-        difficulty_match = re.search(r'\\difficulty\{(.*?)\}', block)
-        text_match = re.search(r'\\text\{(.*?)\}', block, re.DOTALL)
-        assertion_match = re.search(r'\\assertion\{(.*?)\}', block, re.DOTALL)
-        reason_match = re.search(r'\\reason\{(.*?)\}', block, re.DOTALL)
-        answer_match = re.search(r'\\answer\{(.*?)\}', block)
-        
-        q_data['type'] = type_match.group(1) if type_match else 'MCQ_SINGLE'
-        q_data['chapter'] = chapter_match.group(1) if chapter_match else 'DEFAULT_CHAPTER'
-        q_data['difficulty'] = difficulty_match.group(1) if difficulty_match else 'MODERATE'
-        q_data['text'] = text_match.group(1).strip() if text_match else ''
-        q_data['assertion'] = assertion_match.group(1).strip() if assertion_match else ''
-        q_data['reason'] = reason_match.group(1).strip() if reason_match else ''
-        q_data['answer'] = answer_match.group(1) if answer_match else ''
-        
-        # Extract options
         # \option{A}{Content}
-        options = re.findall(r'\\option\{(.*?)\}\{(.*?)\}', block, re.DOTALL)
-        q_data['options'] = options
+        q_data['options'] = [(opt.label, opt.text) for opt in record.options]
         
         parsed_questions.append(q_data)
         
     return parsed_questions
 
-def import_questions():
+def import_questions(dry_run=False):
     print(f"Reading {INPUT_FILE}...")
-    questions = parse_converted_latex(INPUT_FILE)
+    report = ImportReport(dry_run=dry_run)
+    questions = parse_converted_latex(INPUT_FILE, report)
     print(f"Found {len(questions)} questions to import.")
+    if dry_run:
+        report.write(sys.stdout)
+        return
     
     count = 0
     for q_data in questions:
         # Create Question
-        # Map chapter if needed, or use default if not in choices
-        # The model has choices, but CharField might accept others if not validated strictly at DB level?
-        # Django choices are validation level. DB is just varchar usually.
-        # But let's check if we need to map 'DEFAULT_CHAPTER'.
-        # For now, we'll just save it.
+        # type/chapter/difficulty were checked against the model choices above
         
         # Check if question has some content
         if not q_data['text'] and not q_data['assertion']:
@@ -76,7 +66,7 @@ def import_questions():
             assertion=q_data['assertion'],
             reason=q_data['reason'],
             question_type=q_data['type'],
-            chapter='NEWTONS_LAWS', # Defaulting to a valid choice for now, or use q_data['chapter'] if valid
+            chapter=q_data['chapter'],
             difficulty=q_data['difficulty']
         )
         
@@ -97,4 +87,4 @@ def import_questions():
     print(f"Successfully imported {count} questions.")
 
 if __name__ == "__main__":
-    import_questions()
+    import_questions(dry_run='--dry-run' in sys.argv)
@@ -24,8 +24,8 @@ class SolutionBlockInline(nested_admin.NestedTabularInline):
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('text', 'question_type', 'chapter', 'difficulty', 'allow_partial_marking')
-    list_filter = ('question_type', 'chapter', 'difficulty', 'allow_partial_marking')
+    list_display = ('text', 'question_type', 'chapter', 'difficulty', 'irt_difficulty', 'allow_partial_marking')
+    list_filter = ('question_type', 'chapter', 'difficulty', 'allow_partial_marking', 'is_retired')
     inlines = [MatrixRowInline, MatrixColInline, OptionInline, SolutionBlockInline]
     search_fields = ('text',)
 
@@ -0,0 +1,305 @@
+"""
+Item analysis of a quiz: the proportion of completed attempts answering each
+question correctly (its p-value), the point-biserial correlation between
+answering it correctly and the attempt score, how often each option was
+chosen and by whom, and the average score of each matrix row.
+
+Everything is derived from an AnswerTable: the distinct answers given to
+each question, with how many completed attempts gave them and the sum of
+those attempts' scores, plus the count, sum and sum of squares of all
+attempt scores. The table comes from one grouped query over the quiz's
+responses, so Python only sees distinct answers (a few per option) rather
+than every response. It is cached per quiz, and attempts completed later
+are folded in by record_attempt() instead of running the query again.
+"""
+import json
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+
+from . import metrics
+from .caching import AGGREGATE_TIMEOUT, quiz_cache_key
+from .exporter import option_label
+from .grading import DEFAULT_MARKS, load_answer_keys, grade, matrix_row_results
+from .models import Attempt, Question, QuizQuestion, Response
+
+CACHE_NAME = 'item-analysis'
+
+
+def canonical_answer(answer_data):
+    """
+    JSON for an answer with list order ignored, so equal answers share a row.
+    """
+    if isinstance(answer_data, list):
+        answer_data = sorted(str(x) for x in answer_data)
+    elif isinstance(answer_data, dict):
+        answer_data = {str(k): sorted(str(x) for x in v) if isinstance(v, list) else v
+                       for k, v in answer_data.items()}
+    return json.dumps(answer_data, sort_keys=True)
+
+
+@dataclass
+class AnswerTable:
+    attempts: int = 0
+    score_sum: float = 0.0
+    score_sq_sum: float = 0.0
+    # (question_id, canonical answer JSON) -> [attempts, sum of their scores]
+    answers: dict = field(default_factory=dict)
+
+    def add_answer(self, question_id, answer_data, count, score_sum):
+        if not answer_data:
+            return
+        entry = self.answers.setdefault((question_id, canonical_answer(answer_data)), [0, 0.0])
+        entry[0] += count
+        entry[1] += score_sum
+
+    def add_attempt(self, score, answers):
+        """
+        answers: (question_id, answer_data) pairs of one completed attempt.
+        """
+        self.attempts += 1
+        self.score_sum += score
+        self.score_sq_sum += score * score
+        for question_id, answer_data in answers:
+            self.add_answer(question_id, answer_data, 1, score)
+
+
+def completed_attempts(quiz_id):
+    return Attempt.objects.filter(quiz_id=quiz_id, completed_at__isnull=False)
+
+
+def load_answer_table(quiz_id):
+    table = AnswerTable()
+    totals = completed_attempts(quiz_id).aggregate(
+        n=Count('id'), s=Sum('score'), s2=Sum(F('score') * F('score'))
+    )
+    table.attempts = totals['n']
+    table.score_sum = totals['s'] or 0.0
+    table.score_sq_sum = totals['s2'] or 0.0
+
+    rows = Response.objects.filter(
+        attempt__quiz_id=quiz_id, attempt__completed_at__isnull=False
+    ).values_list('question_id', 'answer_data').annotate(
+        n=Count('id'), s=Sum('attempt__score')
+    ).order_by()
+    for question_id, answer_data, n, score_sum in rows:
+        table.add_answer(question_id, answer_data, n, score_sum or 0.0)
+    return table
+
+
+def get_answer_table(quiz_id):
+    """
+    The cached AnswerTable of a quiz, rebuilt when it is missing or does not
+    cover every completed attempt (a lost update from another process).
+    """
+    key = quiz_cache_key(CACHE_NAME, quiz_id)
+    table = cache.get(key)
+    hit = table is not None and table.attempts == completed_attempts(quiz_id).count()
+    metrics.cache_lookup(CACHE_NAME, hit)
+    if not hit:
+        table = load_answer_table(quiz_id)
+        cache.set(key, table, AGGREGATE_TIMEOUT)
+    return table
+
+
+def record_attempt(attempt):
+    """
+    Adds a just-completed attempt to the cached table, if there is one.
+    """
+    key = quiz_cache_key(CACHE_NAME, attempt.quiz_id)
+    table = cache.get(key)
+    if table is None:
+        return
+    answers = Response.objects.filter(attempt=attempt).values_list('question_id', 'answer_data')
+    table.add_attempt(attempt.score, answers)
+    cache.set(key, table, AGGREGATE_TIMEOUT)
+
+
+@dataclass
+class OptionStats:
+    label: str
+    text: str
+    is_correct: bool
+    count: int
+    fraction: float
+    # Mean attempt score of the students who chose it; a distractor that
+    # attracts higher scorers than the key is worth a second look
+    mean_score: float
+
+
+@dataclass
+class RowStats:
+    label: str
+    correct: int
+    proportion: float
+    average_marks: float
+
+
+@dataclass
+class ItemStats:
+    question: Question
+    marks: float
+    answered: int
+    correct: int
+    p_value: float
+    point_biserial: float
+    average_marks: float
+    options: list = field(default_factory=list)
+    rows: list = field(default_factory=list)
+
+
+@dataclass
+class QuizAnalysis:
+    attempts: int
+    mean_score: float
+    score_sd: float
+    items: list
+
+
+def _finite(value):
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def analyze_quiz(quiz_id, table=None):
+    """
+    Returns the QuizAnalysis of a quiz, from the cached AnswerTable unless
+    one is given.
+    """
+    if table is None:
+        table = get_answer_table(quiz_id)
+    quiz_questions = list(
+        QuizQuestion.objects.filter(quiz_id=quiz_id).select_related('question')
+        .prefetch_related('question__options').order_by('order', 'question_id')
+    )
+    index = {qq.question_id: i for i, qq in enumerate(quiz_questions)}
+    keys = load_answer_keys(index)
+    n_items = len(quiz_questions)
+    n = table.attempts
+
+    # One entry per distinct (question, answer), graded once
+    entries = [(qid, json.loads(raw), count, score_sum)
+               for (qid, raw), (count, score_sum) in table.answers.items() if qid in index]
+    item = np.fromiter((index[qid] for qid, _, _, _ in entries), dtype=np.int64, count=len(entries))
+    counts = np.fromiter((e[2] for e in entries), dtype=np.float64, count=len(entries))
+    score_sums = np.fromiter((e[3] for e in entries), dtype=np.float64, count=len(entries))
+    awarded = np.zeros(len(entries))
+    is_correct = np.zeros(len(entries))
+    is_graded = np.zeros(len(entries))
+    for i, (qid, answer, _, _) in enumerate(entries):
+        qq = quiz_questions[index[qid]]
+        awarded[i], ok = grade(keys[qid], answer, qq.marks, qq.negative_marks)
+        is_correct[i] = bool(ok)
+        is_graded[i] = ok is not None
+
+    def per_item(weights):
+        return np.bincount(item, weights=weights, minlength=n_items)
+
+    answered = per_item(counts)
+    graded = per_item(counts * is_graded)
+    correct = per_item(counts * is_correct)
+    correct_score = per_item(score_sums * is_correct)
+    marks_total = per_item(counts * awarded)
+
+    mean = table.score_sum / n if n else 0.0
+    sd = math.sqrt(max(table.score_sq_sum / n - mean * mean, 0.0)) if n else 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = correct / n
+        # r_pb = (M_correct - M) / sd * sqrt(p / (1 - p)), from the sums
+        r_pb = (correct_score / n - p * mean) / (sd * np.sqrt(p * (1 - p)))
+        average = marks_total / n
+
+    options = _option_stats(quiz_questions, entries, counts, score_sums, n)
+    rows = _row_stats(quiz_questions, keys, entries, counts, n)
+
+    items = []
+    for i, qq in enumerate(quiz_questions):
+        gradable = graded[i] > 0
+        items.append(ItemStats(
+            question=qq.question,
+            marks=qq.marks,
+            answered=int(answered[i]),
+            correct=int(correct[i]),
+            p_value=_finite(p[i]) if gradable else None,
+            point_biserial=_finite(r_pb[i]) if gradable else None,
+            average_marks=_finite(average[i]),
+            options=options.get(qq.question_id, []),
+            rows=rows.get(qq.question_id, []),
+        ))
+    return QuizAnalysis(attempts=n, mean_score=mean, score_sd=sd, items=items)
+
+
+def _option_stats(quiz_questions, entries, counts, score_sums, n):
+    options = []
+    position = {}
+    for qq in quiz_questions:
+        if qq.question.question_type in (Question.Type.MATRIX, Question.Type.MATRIX_SINGLE,
+                                         Question.Type.NUMERICAL):
+            continue
+        for i, option in enumerate(sorted(qq.question.options.all(), key=lambda o: o.id)):
+            position[str(option.id)] = len(options)
+            options.append((qq.question_id, option_label(i), option))
+
+    chosen, weight, score = [], [], []
+    for i, (_, answer, _, _) in enumerate(entries):
+        if not isinstance(answer, list):
+            continue
+        for value in answer:
+            j = position.get(value)
+            if j is not None:
+                chosen.append(j)
+                weight.append(counts[i])
+                score.append(score_sums[i])
+    chosen = np.array(chosen, dtype=np.int64)
+    selected = np.bincount(chosen, weights=weight, minlength=len(options))
+    selected_score = np.bincount(chosen, weights=score, minlength=len(options))
+
+    by_question = {}
+    for j, (qid, label, option) in enumerate(options):
+        by_question.setdefault(qid, []).append(OptionStats(
+            label=label,
+            text=option.text,
+            is_correct=option.is_correct,
+            count=int(selected[j]),
+            fraction=selected[j] / n if n else 0.0,
+            mean_score=selected_score[j] / selected[j] if selected[j] else None,
+        ))
+    return by_question
+
+
+def _row_stats(quiz_questions, keys, entries, counts, n):
+    rows = []
+    position = {}
+    for qq in quiz_questions:
+        key = keys.get(qq.question_id)
+        if key is None or key.question_type != Question.Type.MATRIX or not key.matrix_correct:
+            continue
+        marks = qq.marks if qq.marks > 0 else DEFAULT_MARKS
+        for label in key.matrix_correct:
+            position[qq.question_id, label] = len(rows)
+            rows.append((qq.question_id, label, marks / len(key.matrix_correct)))
+
+    hits, weight = [], []
+    for i, (qid, answer, _, _) in enumerate(entries):
+        key = keys[qid]
+        if key.question_type != Question.Type.MATRIX:
+            continue
+        for label, ok in matrix_row_results(key, answer):
+            if ok and (qid, label) in position:
+                hits.append(position[qid, label])
+                weight.append(counts[i])
+    correct = np.bincount(np.array(hits, dtype=np.int64), weights=weight, minlength=len(rows))
+
+    by_question = {}
+    for j, (qid, label, marks_per_row) in enumerate(rows):
+        proportion = correct[j] / n if n else 0.0
+        by_question.setdefault(qid, []).append(RowStats(
+            label=label,
+            correct=int(correct[j]),
+            proportion=proportion,
+            average_marks=proportion * marks_per_row,
+        ))
+    return by_question
@@ -0,0 +1,149 @@
+"""
+Micro-benchmarks for grading, result rendering, the question bank, test
+generation and the LaTeX importer.
+
+Every case runs at several sizes on a throwaway test database filled by
+fixtures.py. A case function gets the size, builds its data (untimed) and
+returns a callable that prepares one repetition (also untimed) and returns
+the operation to time. Each result keeps the median wall time and the
+largest query count over its repetitions. compare() checks results against
+baseline.json: any extra query is a regression, and so is a time more than
+the tolerance factor slower.
+
+Run them with manage.py benchmark.
+"""
+import importlib
+import json
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+BASELINE_PATH = Path(__file__).with_name('baseline.json')
+# Timing noise below this is never a regression
+MIN_SLOWDOWN_SECONDS = 0.02
+
+BENCHMARKS = {}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@dataclass
+class Benchmark:
+    name: str
+    sizes: tuple
+    case: object
+
+
+@dataclass
+class Result:
+    name: str
+    size: int
+    seconds: float
+    queries: int
+    repeats: int
+
+    @property
+    def key(self):
+        return f'{self.name}[{self.size}]'
+
+
+def benchmark(name, sizes):
+    def register(case):
+        BENCHMARKS[name] = Benchmark(name, tuple(sizes), case)
+        return case
+    return register
+
+
+def reset_database():
+    call_command('flush', interactive=False, verbosity=0)
+    cache.clear()
+
+
+def run_case(bench, size, repeat=5, budget=10.0):
+    reset_database()
+    prepare = bench.case(size)
+    times, queries = [], 0
+    while len(times) < repeat and (not times or sum(times) < budget):
+        operation = prepare()
+        # The query log only keeps the last 9000 queries
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            operation()
+            times.append(time.perf_counter() - started)
+        queries = max(queries, len(captured))
+    return Result(bench.name, size, statistics.median(times), queries, len(times))
+
+
+def run(names=None, quick=False, repeat=5, budget=10.0, on_result=None):
+    """
+    Runs the named benchmarks (all by default); quick keeps the two smallest
+    sizes of each. Must be called with a test database in place.
+    """
+    # Importing the cases registers them with @benchmark. They import this
+    # module in turn, so they are loaded here rather than at the top
+    importlib.import_module(f'{__name__}.cases')
+
+    unknown = set(names or ()) - set(BENCHMARKS)
+    if unknown:
+        raise KeyError(f'Unknown benchmark(s): {", ".join(sorted(unknown))}')
+    results = []
+    for name, bench in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        for size in bench.sizes[:2] if quick else bench.sizes:
+            result = run_case(bench, size, repeat, budget)
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """
+    Merges results into the baseline file, keeping entries not re-run.
+    """
+    baseline = load_baseline(path)
+    for result in results:
+        baseline[result.key] = {'seconds': round(result.seconds, 6), 'queries': result.queries}
+    with open(path, 'w') as f:
+        json.dump(dict(sorted(baseline.items())), f, indent=2)
+        f.write('\n')
+
+
+def compare(results, baseline, tolerance=2.0):
+    """
+    [(result, message), ...] for the results that regressed.
+    """
+    regressions = []
+    for result in results:
+        expected = baseline.get(result.key)
+        if expected is None:
+            continue
+        if result.queries > expected['queries']:
+            regressions.append((result, f'{result.queries} queries, baseline {expected["queries"]}'))
+        slower = result.seconds - expected['seconds']
+        if result.seconds > expected['seconds'] * tolerance and slower > MIN_SLOWDOWN_SECONDS:
+            regressions.append((result, f'{result.seconds * 1000:.1f} ms, baseline {expected["seconds"] * 1000:.1f} ms '
+                                        f'({result.seconds / expected["seconds"]:.1f}x)'))
+    return regressions
+
+
+def as_json(results):
+    return [dict(asdict(result), key=result.key) for result in results]
@@ -0,0 +1,123 @@
+"""
+The benchmark cases; see the package docstring for how they are run.
+"""
+import itertools
+import random
+
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from quiz import views
+from quiz.import_sources import content_hash
+from quiz.importer import BulkQuestionWriter
+from quiz.latex_parser import parse_string
+
+from . import BenchmarkError, benchmark, fixtures
+
+QUIZ_SIZES = (10, 100, 1000)
+BANK_SIZES = (100, 1000, 10000, 100000)
+IMPORT_SIZES = (10, 100, 1000)
+# Questions per generated test, as in a full JEE paper
+TEST_LENGTH = 90
+
+
+def _quiz(size):
+    quiz = fixtures.make_quiz(fixtures.make_bank(size))
+    return quiz, fixtures.make_answers(quiz)
+
+
+def _client(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def _request(send, *args, **kwargs):
+    """
+    An operation sending one request; a 4xx or 5xx fails the benchmark.
+    """
+    def operation():
+        response = send(*args, **kwargs)
+        if response.status_code >= 400:
+            raise BenchmarkError(f'{response.request["PATH_INFO"]} returned HTTP {response.status_code}')
+    return operation
+
+
+@benchmark('calculate_final_score', QUIZ_SIZES)
+def calculate_final_score(size):
+    quiz, answers = _quiz(size)
+    user = fixtures.make_user('student')
+
+    def prepare():
+        attempt = fixtures.make_attempt(quiz, user, answers)
+        return lambda: views.calculate_final_score(attempt)
+    return prepare
+
+
+@benchmark('submit_quiz', QUIZ_SIZES)
+def submit_quiz(size):
+    quiz, answers = _quiz(size)
+    user = fixtures.make_user('student')
+    client = _client(user)
+    url = reverse('submit_quiz', args=(quiz.id,))
+    data = fixtures.form_data(answers)
+
+    def submit():
+        # A 1000-question form is over Django's default limit of 1000 fields
+        with override_settings(DATA_UPLOAD_MAX_NUMBER_FIELDS=None):
+            return client.post(url, data)
+
+    def prepare():
+        views.Attempt.objects.create(quiz=quiz, user=user)
+        return _request(submit)
+    return prepare
+
+
+@benchmark('result', QUIZ_SIZES)
+def result(size):
+    quiz, answers = _quiz(size)
+    user = fixtures.make_user('student')
+    attempt = fixtures.make_attempt(quiz, user, answers)
+    views.calculate_final_score(attempt)
+    client = _client(user)
+    url = reverse('result', args=(attempt.id,))
+    return lambda: _request(client.get, url)
+
+
+@benchmark('question_bank', BANK_SIZES)
+def question_bank(size):
+    fixtures.make_bank(size)
+    client = _client(fixtures.make_user('staff', staff=True))
+    url = reverse('question_bank')
+    return lambda: _request(client.get, url)
+
+
+@benchmark('create_test', BANK_SIZES)
+def create_test(size):
+    fixtures.make_bank(size)
+    client = _client(fixtures.make_user('student'))
+    url = reverse('create_test')
+    data = {'syllabus_type': 'FULL', 'num_questions': TEST_LENGTH, 'time_limit': 180}
+
+    def prepare():
+        random.seed(0)
+        return _request(client.post, url, data)
+    return prepare
+
+
+@benchmark('import_latex', IMPORT_SIZES)
+def import_latex(size):
+    source = fixtures.latex_source(size)
+    runs = itertools.count()
+
+    def prepare():
+        # A new file name each time, so every run inserts instead of skipping
+        name = f'benchmark-{next(runs)}.tex'
+
+        def operation():
+            writer = BulkQuestionWriter()
+            for record in parse_string(source):
+                writer.add(record, '.', source_key=f'{name}#{record.index}', content_hash=content_hash(record))
+            writer.close()
+        return operation
+    return prepare
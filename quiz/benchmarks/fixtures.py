@@ -0,0 +1,115 @@
+"""
+Reproducible synthetic data for the benchmarks: the same seed and size
+always give the same bank, quiz and answers. Everything is inserted with
+bulk_create.
+"""
+import random
+
+from django.contrib.auth import get_user_model
+
+from quiz import synthetic
+from quiz.latex_parser import ParsedChoice, ParsedQuestion, ParsedSolution, format_question
+from quiz.models import Attempt, Question, Quiz, QuizQuestion, Response
+from quiz.synthetic import CHAPTERS, COL_LABELS, DIFFICULTIES, ROW_LABELS
+
+BATCH_SIZE = 2000
+
+
+def make_bank(size, seed=0):
+    """
+    Creates size questions of every type with their options or matrix rows
+    and columns; returns them in creation order.
+    """
+    return synthetic.create_questions(size, random.Random(seed), batch_size=BATCH_SIZE)
+
+
+def make_quiz(questions, title='Benchmark quiz'):
+    quiz = Quiz.objects.create(title=title, is_public=True, time_limit_minutes=180)
+    QuizQuestion.objects.bulk_create([
+        QuizQuestion(quiz=quiz, question=question, order=i) for i, question in enumerate(questions, 1)
+    ], batch_size=BATCH_SIZE)
+    return quiz
+
+
+def make_user(username, staff=False):
+    user, _ = get_user_model().objects.get_or_create(username=username, defaults={'is_staff': staff})
+    return user
+
+
+def answer_for(question, rng, skill=0.6):
+    """
+    answer_data as the views save it, correct with probability skill.
+    question is prefetched with options and matrix rows.
+    """
+    correct = rng.random() < skill
+    if question.question_type == Question.Type.NUMERICAL:
+        return [str(question.numerical_answer if correct else rng.randint(0, 100))]
+    if question.question_type in synthetic.MATRIX_TYPES:
+        return {row.label: row.matches.split(',') if correct else [rng.choice(COL_LABELS)]
+                for row in question.matrix_rows.all()}
+    options = list(question.options.all())
+    if correct:
+        return [str(o.id) for o in options if o.is_correct]
+    return [str(rng.choice(options).id)]
+
+
+def form_data(answers):
+    """
+    submit_quiz POST fields for {question: answer_data}.
+    """
+    data = {}
+    for question, answer in answers.items():
+        if isinstance(answer, dict):
+            data.update({f'question_{question.id}_row_{row}': cols for row, cols in answer.items()})
+        else:
+            data[f'question_{question.id}'] = answer
+    return data
+
+
+def make_answers(quiz, seed=0):
+    """
+    {question: answer_data} for every question of quiz.
+    """
+    rng = random.Random(seed)
+    questions = quiz.questions.order_by('quizquestion__order').prefetch_related('options', 'matrix_rows')
+    return {question: answer_for(question, rng) for question in questions}
+
+
+def make_attempt(quiz, user, answers):
+    """
+    An open attempt of user with a saved Response for every answer.
+    """
+    attempt = Attempt.objects.create(quiz=quiz, user=user)
+    Response.objects.bulk_create([
+        Response(attempt=attempt, question=question, answer_data=answer, status=Response.QuestionStatus.ANSWERED)
+        for question, answer in answers.items()
+    ], batch_size=BATCH_SIZE)
+    return attempt
+
+
+def latex_source(size, seed=0):
+    """
+    A .tex file with size questions in the import format.
+    """
+    rng = random.Random(seed)
+    blocks = []
+    for i, q_type in enumerate(synthetic.question_types(rng, size)):
+        record = ParsedQuestion(index=i, line=None, question_type=q_type, chapter=rng.choice(CHAPTERS),
+                                difficulty=rng.choice(DIFFICULTIES),
+                                text=f'Synthetic question {i}: evaluate $\\frac{{{i}}}{{2}}$')
+        if q_type == Question.Type.NUMERICAL:
+            record.answer, record.tolerance = str(rng.randint(0, 100)), '0.5'
+        elif q_type in synthetic.MATRIX_TYPES:
+            record.rows = [ParsedChoice(label, f'Row {label}') for label in ROW_LABELS]
+            record.cols = [ParsedChoice(label, f'Column {label}') for label in COL_LABELS]
+            matches = 1 if q_type == Question.Type.MATRIX_SINGLE else 2
+            record.matrix_answers = {label: sorted(rng.sample(COL_LABELS, matches)) for label in ROW_LABELS}
+        else:
+            if q_type == Question.Type.ASSERTION_REASON:
+                record.assertion, record.reason = f'Assertion {i}', f'Reason {i}'
+            labels = 'AB' if q_type == Question.Type.TRUE_FALSE else 'ABCD'
+            record.options = [ParsedChoice(label, f'Option {label}') for label in labels]
+            record.answer = ','.join(sorted(rng.sample(labels, 2 if q_type == Question.Type.MCQ_MULTI else 1)))
+        record.solutions = [ParsedSolution(text=f'Solution of question {i}.')]
+        blocks.append(format_question(record))
+    return '\n\n'.join(blocks) + '\n'
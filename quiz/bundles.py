@@ -0,0 +1,325 @@
+"""
+Portable quiz bundles: a zip holding quizzes with their questions, passages
+and images, for moving them between instances.
+
+Layout:
+    manifest.json       format, version and counts (written last)
+    passages.jsonl      one passage per line
+    questions.jsonl     one question per line, children inline
+    quizzes.jsonl       one quiz per line, with its question list
+    media/<sha256><ext> every referenced image, stored once
+
+Records keep the ids they had on the exporting instance; they are only used
+to link records inside the bundle and are remapped on import. Images are
+referenced by content hash, so they deduplicate in the bundle and land under
+the same content-addressed names on the importing side.
+
+Both directions stream: the writer works on unseekable outputs (zipfile adds
+data descriptors) and reads questions with .iterator(); the reader goes
+through the JSONL members line by line and writes in bulk batches. Memory
+grows only with the id maps, not with the bundle size.
+"""
+import hashlib
+import io
+import json
+import os
+import zipfile
+from collections import Counter
+
+from django.contrib.auth.models import Group
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import FileField, Prefetch
+from django.utils import timezone
+
+from .models import Passage, Question, Option, MatrixRow, MatrixCol, SolutionBlock, Quiz, QuizQuestion
+from .storage import HASHED_NAME_RE
+
+BUNDLE_FORMAT = 'physics-platform-quiz-bundle'
+BUNDLE_VERSION = 1
+MEDIA_DIR = 'media/'
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Per-instance bookkeeping that must not travel with a question
+QUESTION_EXCLUDE = ('source_key', 'content_hash', 'is_retired')
+QUESTION_CHILDREN = (
+    ('options', Option),
+    ('matrix_rows', MatrixRow),
+    ('matrix_cols', MatrixCol),
+    ('solution_blocks', SolutionBlock),
+)
+
+
+class BundleError(Exception):
+    pass
+
+
+def data_fields(model, exclude=()):
+    """
+    Concrete, non-relational fields other than the primary key.
+    """
+    return [f for f in model._meta.concrete_fields
+            if not f.primary_key and not f.is_relation and f.name not in exclude]
+
+
+class BundleWriter:
+    """
+    Usage:
+        with open(path, 'wb') as f:
+            manifest = BundleWriter(f).write(quizzes)
+    """
+
+    def __init__(self, fileobj, chunk_size=500):
+        self.zip = zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.chunk_size = chunk_size
+        self.counts = Counter()
+        # Media reference -> (storage, name) of one file with that content
+        self.media = {}
+        self.refs = {}
+        self.date_time = timezone.localtime().timetuple()[:6]
+
+    def media_ref(self, image):
+        if not image:
+            return None
+        if image.name in self.refs:
+            return self.refs[image.name]
+        ext = os.path.splitext(image.name)[1].lower()
+        if HASHED_NAME_RE.search(image.name):
+            digest = os.path.splitext(os.path.basename(image.name))[0]
+        else:
+            sha = hashlib.sha256()
+            with image.storage.open(image.name, 'rb') as f:
+                for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+        ref = self.refs[image.name] = f'{digest}{ext}'
+        self.media.setdefault(ref, (image.storage, image.name))
+        return ref
+
+    def dump(self, obj, exclude=()):
+        data = {'id': obj.pk}
+        for f in data_fields(type(obj), exclude):
+            if isinstance(f, FileField):
+                data[f.name] = self.media_ref(getattr(obj, f.name))
+            else:
+                data[f.name] = f.value_from_object(obj)
+        return data
+
+    def open_member(self, name, compress_type=zipfile.ZIP_DEFLATED):
+        info = zipfile.ZipInfo(name, self.date_time)
+        info.compress_type = compress_type
+        # force_zip64: the size of a streamed member is not known up front
+        return self.zip.open(info, 'w', force_zip64=True)
+
+    def write_lines(self, member, items):
+        with self.open_member(member) as out:
+            for item in items:
+                out.write(json.dumps(item, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.counts[member] += 1
+
+    def iter_passages(self, quiz_ids):
+        passages = Passage.objects.filter(questions__quizquestion__quiz__in=quiz_ids) | \
+            Passage.objects.filter(quiz__in=quiz_ids)
+        for passage in passages.distinct().order_by('id').iterator(chunk_size=self.chunk_size):
+            yield self.dump(passage)
+
+    def iter_questions(self, quiz_ids):
+        questions = Question.objects.filter(quizquestion__quiz__in=quiz_ids).distinct().order_by('id')
+        questions = questions.prefetch_related(*[
+            Prefetch(name, queryset=model.objects.order_by('id')) for name, model in QUESTION_CHILDREN
+        ])
+        for question in questions.iterator(chunk_size=self.chunk_size):
+            data = self.dump(question, QUESTION_EXCLUDE)
+            data['passage'] = question.passage_id
+            for name, model in QUESTION_CHILDREN:
+                data[name] = [self.dump(child) for child in getattr(question, name).all()]
+            yield data
+
+    def iter_quizzes(self, quizzes):
+        for quiz in quizzes:
+            data = self.dump(quiz)
+            data['questions'] = [
+                {'question': question_id, 'marks': marks, 'negative_marks': negative_marks, 'order': order}
+                for question_id, marks, negative_marks, order in QuizQuestion.objects.filter(quiz=quiz)
+                .order_by('order', 'id').values_list('question_id', 'marks', 'negative_marks', 'order')
+            ]
+            data['passages'] = list(quiz.passages.values_list('id', flat=True))
+            # Users differ between instances; groups are matched by name on import
+            data['assigned_groups'] = list(quiz.assigned_groups.values_list('name', flat=True))
+            yield data
+
+    def write_media(self):
+        for ref, (storage, name) in sorted(self.media.items()):
+            # Images are already compressed
+            with storage.open(name, 'rb') as src, self.open_member(MEDIA_DIR + ref, zipfile.ZIP_STORED) as out:
+                for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+                    out.write(chunk)
+
+    def write(self, quizzes):
+        quizzes = list(quizzes)
+        quiz_ids = [quiz.id for quiz in quizzes]
+        try:
+            self.write_lines('passages.jsonl', self.iter_passages(quiz_ids))
+            self.write_lines('questions.jsonl', self.iter_questions(quiz_ids))
+            self.write_lines('quizzes.jsonl', self.iter_quizzes(quizzes))
+            self.write_media()
+            manifest = {
+                'format': BUNDLE_FORMAT,
+                'version': BUNDLE_VERSION,
+                'created_at': timezone.now().isoformat(),
+                'quizzes': self.counts['quizzes.jsonl'],
+                'passages': self.counts['passages.jsonl'],
+                'questions': self.counts['questions.jsonl'],
+                'media': len(self.media),
+            }
+            self.zip.writestr('manifest.json', json.dumps(manifest, indent=2))
+        finally:
+            self.zip.close()
+        return manifest
+
+
+class BundleReader:
+    """
+    Usage:
+        with transaction.atomic():
+            counts = BundleReader(path).load()
+
+    Everything is created as new rows; a bundle imported twice gives two
+    copies. Images already present in storage are not written again.
+    """
+
+    def __init__(self, path, batch_size=500, on_warning=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.on_warning = on_warning or (lambda message: None)
+        self.counts = Counter()
+        self.passage_ids = {}
+        self.question_ids = {}
+        # (upload directory, media reference) -> storage name
+        self.stored = {}
+
+    def read_lines(self, zf, member):
+        with zf.open(member) as raw:
+            for line_no, line in enumerate(io.TextIOWrapper(raw, encoding='utf-8'), 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise BundleError(f'{member} line {line_no}: {e.msg}') from None
+
+    def batches(self, zf, member):
+        batch = []
+        for data in self.read_lines(zf, member):
+            batch.append(data)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def store_media(self, zf, instance, field, ref):
+        if not ref:
+            return None
+        name = field.generate_filename(instance, ref)
+        key = (os.path.dirname(name), ref)
+        if key in self.stored:
+            return self.stored[key]
+        storage = field.storage
+        digest = os.path.splitext(ref)[0]
+        if hasattr(storage, 'hashed_name') and storage.exists(storage.hashed_name(name, digest)):
+            stored = storage.hashed_name(name, digest)
+        else:
+            try:
+                with zf.open(MEDIA_DIR + ref) as src:
+                    stored = storage.save(name, File(src, name=ref), max_length=field.max_length)
+            except KeyError:
+                self.on_warning(f'Image {ref} is missing from the bundle')
+                return None
+            self.counts['media'] += 1
+        self.stored[key] = stored
+        return stored
+
+    def build(self, zf, model, data, exclude=(), **extra):
+        instance = model(**extra)
+        for f in data_fields(model, exclude):
+            if f.name not in data:
+                continue
+            if isinstance(f, FileField):
+                setattr(instance, f.name, self.store_media(zf, instance, f, data[f.name]))
+            else:
+                setattr(instance, f.attname, f.to_python(data[f.name]))
+        return instance
+
+    def load_passages(self, zf):
+        for batch in self.batches(zf, 'passages.jsonl'):
+            passages = [self.build(zf, Passage, data) for data in batch]
+            Passage.objects.bulk_create(passages, batch_size=self.batch_size)
+            for data, passage in zip(batch, passages):
+                self.passage_ids[data['id']] = passage.id
+            self.counts['passages'] += len(passages)
+
+    def load_questions(self, zf):
+        for batch in self.batches(zf, 'questions.jsonl'):
+            questions = [
+                self.build(zf, Question, data, QUESTION_EXCLUDE, passage_id=self.passage_ids.get(data.get('passage')))
+                for data in batch
+            ]
+            Question.objects.bulk_create(questions, batch_size=self.batch_size)
+            for name, model in QUESTION_CHILDREN:
+                children = [
+                    self.build(zf, model, child, question=question)
+                    for data, question in zip(batch, questions)
+                    for child in data.get(name) or []
+                ]
+                model.objects.bulk_create(children, batch_size=self.batch_size)
+                self.counts[name] += len(children)
+            for data, question in zip(batch, questions):
+                self.question_ids[data['id']] = question.id
+            self.counts['questions'] += len(questions)
+
+    def load_quizzes(self, zf):
+        groups = dict(Group.objects.values_list('name', 'id'))
+        for batch in self.batches(zf, 'quizzes.jsonl'):
+            quizzes = [self.build(zf, Quiz, data) for data in batch]
+            Quiz.objects.bulk_create(quizzes, batch_size=self.batch_size)
+
+            # Through rows are created directly: the m2m_changed handler that
+            # adds passage questions must not run, the question list is complete
+            quiz_questions, quiz_passages, quiz_groups = [], [], []
+            for data, quiz in zip(batch, quizzes):
+                for item in data.get('questions') or []:
+                    question_id = self.question_ids.get(item['question'])
+                    if question_id is None:
+                        raise BundleError(f'Quiz {data["id"]} references question {item["question"]}, '
+                                          f'which is not in the bundle')
+                    quiz_questions.append(QuizQuestion(
+                        quiz=quiz, question_id=question_id, marks=item.get('marks', 4.0),
+                        negative_marks=item.get('negative_marks', 1.0), order=item.get('order', 0),
+                    ))
+                for passage_id in data.get('passages') or []:
+                    if passage_id in self.passage_ids:
+                        quiz_passages.append(Quiz.passages.through(quiz=quiz, passage_id=self.passage_ids[passage_id]))
+                for group in data.get('assigned_groups') or []:
+                    if group in groups:
+                        quiz_groups.append(Quiz.assigned_groups.through(quiz=quiz, group_id=groups[group]))
+                    else:
+                        self.on_warning(f'Group "{group}" does not exist; not assigned to "{quiz.title}"')
+            QuizQuestion.objects.bulk_create(quiz_questions, batch_size=self.batch_size)
+            Quiz.passages.through.objects.bulk_create(quiz_passages, batch_size=self.batch_size)
+            Quiz.assigned_groups.through.objects.bulk_create(quiz_groups, batch_size=self.batch_size)
+            self.counts['quizzes'] += len(quizzes)
+
+    def load(self):
+        with zipfile.ZipFile(self.path) as zf:
+            try:
+                manifest = json.loads(zf.read('manifest.json'))
+            except KeyError:
+                raise BundleError(f'{self.path} has no manifest.json; is it a quiz bundle?') from None
+            if manifest.get('format') != BUNDLE_FORMAT:
+                raise BundleError(f'{self.path} is not a quiz bundle')
+            if manifest.get('version', 0) > BUNDLE_VERSION:
+                raise BundleError(f'Bundle version {manifest["version"]} is newer than this instance supports')
+            self.load_passages(zf)
+            self.load_questions(zf)
+            self.load_quizzes(zf)
+        return self.counts
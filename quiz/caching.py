@@ -0,0 +1,61 @@
+"""
+Versioned cache keys for aggregates (item analysis, leaderboards, cohort
+dashboards).
+
+Quizzes and groups each have a version number in the cache and aggregates
+are stored under keys that include the versions they depend on, so bumping
+one drops everything cached for it at once: a quiz when attempts are
+deleted, a group when its membership changes.
+
+With the default local-memory cache, versions and entries are per process,
+so a bump only reaches the process that made it. Readers therefore also
+check what they get against the database (see analytics.get_answer_table
+and cohorts.get_report).
+"""
+import time
+
+from django.core.cache import cache
+
+AGGREGATE_TIMEOUT = 24 * 60 * 60
+
+
+def _version(scope):
+    key = f'{scope}:version'
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1 so that entries cached under an
+        # evicted version number are never picked up again
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(scope):
+    try:
+        cache.incr(f'{scope}:version')
+    except ValueError:
+        _version(scope)
+
+
+def quiz_version(quiz_id):
+    return _version(f'quiz:{quiz_id}')
+
+
+def bump_quiz_version(quiz_id):
+    _bump(f'quiz:{quiz_id}')
+
+
+def group_version(group_id):
+    return _version(f'group:{group_id}')
+
+
+def bump_group_version(group_id):
+    _bump(f'group:{group_id}')
+
+
+def quiz_cache_key(name, quiz_id):
+    return f'{name}:quiz:{quiz_id}:v{quiz_version(quiz_id)}'
+
+
+def cohort_cache_key(name, group_id, quiz_id):
+    return f'{name}:group:{group_id}:v{group_version(group_id)}:quiz:{quiz_id}:v{quiz_version(quiz_id)}'
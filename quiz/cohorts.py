@@ -0,0 +1,147 @@
+"""
+Group (batch) x quiz dashboard: completion, score distribution, time taken
+and accuracy by chapter for the members of an auth Group.
+
+The figures come from grouped queries joined to group membership: the best
+score of each member, the duration of each completed attempt, and the
+distinct (question, answer) pairs with their counts, which are graded once
+each (as in analytics.py) and summed per chapter. Reports are cached per
+group and quiz. Completing an attempt drops the reports of the student's
+groups, and membership changes bump the group's cache version. Both only
+reach this process's cache, so a cached report is also checked against the
+group's member count, completed attempts and latest completion, and rebuilt
+when another process has changed them.
+"""
+import statistics
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max
+from django.utils import timezone
+
+from . import metrics
+from .caching import AGGREGATE_TIMEOUT, cohort_cache_key
+from .grading import DEFAULT_MARKS, load_answer_keys, grade
+from .models import Attempt, Question, QuizQuestion, Response
+
+CACHE_NAME = 'cohort'
+HISTOGRAM_BINS = 10
+CHAPTER_NAMES = dict(Question.CHAPTER_CHOICES)
+
+
+@dataclass
+class ChapterAccuracy:
+    chapter: str
+    name: str
+    attempted: int = 0
+    correct: int = 0
+    marks: float = 0.0
+
+    @property
+    def accuracy(self):
+        return 100.0 * self.correct / self.attempted if self.attempted else None
+
+
+@dataclass
+class CohortReport:
+    members: int
+    completed: int
+    attempts: int
+    max_marks: float
+    score_mean: float = None
+    score_median: float = None
+    score_min: float = None
+    score_max: float = None
+    median_seconds: float = None
+    # [(low, high, students), ...] over the members' best scores
+    histogram: list = field(default_factory=list)
+    chapters: list = field(default_factory=list)
+    computed_at: object = None
+    # (members, attempts, latest completed_at) the report was built from
+    state: tuple = None
+
+    @property
+    def completion_rate(self):
+        return 100.0 * self.completed / self.members if self.members else None
+
+
+def _completed(group_id, quiz_id):
+    return Attempt.objects.filter(quiz_id=quiz_id, completed_at__isnull=False, user__groups=group_id)
+
+
+def current_state(group_id, quiz_id):
+    """
+    What a cached report must still match: the group's member count, and
+    the count and latest completion of its completed attempts. A deleted
+    attempt changes the count, a new one the latest completion.
+    """
+    members = get_user_model().objects.filter(groups=group_id).count()
+    attempts = _completed(group_id, quiz_id).aggregate(n=Count('id'), last=Max('completed_at'))
+    return members, attempts['n'], attempts['last']
+
+
+def build_report(group_id, quiz_id):
+    members = get_user_model().objects.filter(groups=group_id).count()
+    completed = _completed(group_id, quiz_id)
+    quiz_questions = {qq.question_id: qq for qq in QuizQuestion.objects.filter(quiz_id=quiz_id)}
+    max_marks = sum(qq.marks if qq.marks > 0 else DEFAULT_MARKS for qq in quiz_questions.values())
+
+    best = list(completed.values('user_id').annotate(best=Max('score')).order_by().values_list('best', flat=True))
+    finished = list(completed.annotate(
+        duration=ExpressionWrapper(F('completed_at') - F('started_at'), output_field=DurationField())
+    ).values_list('duration', 'completed_at'))
+    durations = [duration.total_seconds() for duration, _ in finished]
+    report = CohortReport(members=members, completed=len(best), attempts=len(durations),
+                          max_marks=max_marks, computed_at=timezone.now(),
+                          state=(members, len(finished), max((c for _, c in finished), default=None)))
+    if best:
+        report.score_mean = statistics.fmean(best)
+        report.score_median = statistics.median(best)
+        report.score_min, report.score_max = min(best), max(best)
+        low, high = min(0.0, report.score_min), max(max_marks, report.score_max)
+        counts, edges = np.histogram(best, bins=HISTOGRAM_BINS, range=(low, high if high > low else low + 1))
+        report.histogram = [(float(edges[i]), float(edges[i + 1]), int(n)) for i, n in enumerate(counts)]
+    if durations:
+        report.median_seconds = statistics.median(durations)
+
+    keys = load_answer_keys(quiz_questions)
+    chapters = {}
+    answers = Response.objects.filter(
+        attempt__in=completed, question_id__in=quiz_questions
+    ).values_list('question_id', 'question__chapter', 'answer_data').annotate(n=Count('id')).order_by()
+    for question_id, chapter, answer_data, n in answers:
+        if not answer_data:
+            continue
+        qq = quiz_questions[question_id]
+        marks, is_correct = grade(keys[question_id], answer_data, qq.marks, qq.negative_marks)
+        totals = chapters.setdefault(chapter or '', ChapterAccuracy(chapter or '', CHAPTER_NAMES.get(chapter, 'No chapter')))
+        totals.attempted += n
+        totals.correct += n if is_correct else 0
+        totals.marks += n * marks
+    report.chapters = sorted(chapters.values(), key=lambda c: (c.accuracy is None, c.accuracy or 0))
+    return report
+
+
+def get_report(group_id, quiz_id):
+    """
+    The cached report of a group and quiz, rebuilt when it is missing or
+    out of date (changes made by another process).
+    """
+    key = cohort_cache_key(CACHE_NAME, group_id, quiz_id)
+    report = cache.get(key)
+    hit = report is not None and report.state == current_state(group_id, quiz_id)
+    metrics.cache_lookup(CACHE_NAME, hit)
+    if not hit:
+        report = build_report(group_id, quiz_id)
+        cache.set(key, report, AGGREGATE_TIMEOUT)
+    return report
+
+
+def invalidate_attempt(attempt):
+    """
+    Drops the cached reports that a just-completed attempt changes.
+    """
+    group_ids = attempt.user.groups.values_list('id', flat=True)
+    cache.delete_many([cohort_cache_key(CACHE_NAME, group_id, attempt.quiz_id) for group_id in group_ids])
@@ -0,0 +1,182 @@
+"""
+Resized WebP/JPEG variants of question images, for srcset.
+
+Every stored image gets variants at the DERIVATIVE_WIDTHS narrower than
+itself plus one at its own width, in each of DERIVATIVE_FORMATS, under
+
+    derivatives/<image name without extension>-<width>w.<ext>
+
+and a <name>.json manifest listing them. The manifest is written last, so
+its presence means all variants exist; templates read it through
+variants_for() and fall back to the original image until it appears.
+
+render_variants() only needs Pillow and file paths, so it runs in worker
+processes: generate() fans it out over a ProcessPoolExecutor for imports
+and the backfill command, schedule() hands single uploads to a small
+thread pool after the saving transaction commits.
+"""
+import json
+import os
+import posixpath
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+DERIVATIVE_DIR = 'derivatives'
+DERIVATIVE_WIDTHS = (320, 640, 1024)
+# Format name -> (extension, MIME type, Pillow save options)
+DERIVATIVE_FORMATS = {
+    'webp': ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+MANIFEST_VERSION = 1
+MANIFEST_CACHE_SIZE = 10000
+
+_upload_pool = None
+_manifests = {}
+
+
+def derivative_base(name):
+    return posixpath.join(DERIVATIVE_DIR, posixpath.splitext(name.replace('\\', '/'))[0])
+
+
+def manifest_name(name):
+    return derivative_base(name) + '.json'
+
+
+def _write_atomic(path, write):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.derivative-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _flatten(image):
+    """RGB on a white background, which is what diagrams are drawn on."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(source_path, name, media_root, widths=DERIVATIVE_WIDTHS):
+    """
+    Writes the variants and manifest of the image stored as name and returns
+    the manifest. Works on plain paths so it can run in any process.
+    """
+    with Image.open(source_path) as image:
+        image = _flatten(ImageOps.exif_transpose(image))
+    width, height = image.size
+    targets = sorted({w for w in widths if w < width} | {width})
+    base = derivative_base(name)
+
+    manifest = {'version': MANIFEST_VERSION, 'width': width, 'height': height, 'variants': {}}
+    for fmt, (ext, _, options) in DERIVATIVE_FORMATS.items():
+        variants = manifest['variants'][fmt] = []
+        for target in targets:
+            resized = image if target == width else image.resize(
+                (target, max(1, round(height * target / width))), Image.Resampling.LANCZOS)
+            variant = f'{base}-{target}w.{ext}'
+            _write_atomic(os.path.join(media_root, variant),
+                          lambda f: resized.save(f, format=fmt.upper(), **options))
+            variants.append([target, variant])
+
+    _write_atomic(os.path.join(media_root, manifest_name(name)),
+                  lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+    return manifest
+
+
+def _render(job):
+    source_path, name, media_root = job
+    try:
+        render_variants(source_path, name, media_root)
+        return name, None
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return name, str(e)
+
+
+def pending_jobs(names, storage, force=False):
+    """
+    (source path, name, media root) for each name that still needs variants.
+    """
+    seen = set()
+    for name in names:
+        if not name or name in seen:
+            continue
+        seen.add(name)
+        if force or not storage.exists(manifest_name(name)):
+            yield storage.path(name), name, str(storage.location)
+
+
+def generate(names, storage, workers=1, force=False):
+    """
+    Builds the missing variants for names (storage names of images) and
+    yields (name, error or None) as each one finishes.
+    """
+    jobs = pending_jobs(names, storage, force)
+    if workers <= 1:
+        yield from map(_render, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Small chunks keep results flowing back while large images render
+        yield from executor.map(_render, jobs, chunksize=4)
+
+
+def build(names, storage, workers=1, force=False, on_error=None):
+    """
+    generate() run to completion. Returns (built, failed).
+    """
+    built = failed = 0
+    for name, error in generate(names, storage, workers, force):
+        if error:
+            failed += 1
+            if on_error:
+                on_error(f'Could not build variants of {name}: {error}')
+        else:
+            built += 1
+    return built, failed
+
+
+def schedule(names, storage):
+    """
+    Builds variants for freshly uploaded images in the background.
+    """
+    global _upload_pool
+    jobs = list(pending_jobs(names, storage))
+    if not jobs:
+        return
+    if _upload_pool is None:
+        _upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+    for job in jobs:
+        _upload_pool.submit(_render, job)
+
+
+def variants_for(image):
+    """
+    The manifest of a stored image, or None if its variants are not built.
+    Manifests of content-addressed images never change, so found ones are
+    kept in memory.
+    """
+    if not image:
+        return None
+    name = image.name
+    if name in _manifests:
+        return _manifests[name]
+    try:
+        with image.storage.open(manifest_name(name), 'rb') as f:
+            manifest = json.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+    if len(_manifests) < MANIFEST_CACHE_SIZE:
+        _manifests[name] = manifest
+    return manifest
@@ -0,0 +1,157 @@
+"""
+Streams questions out of the database in the formats the importer reads.
+
+Questions are read with .iterator(chunk_size=...) and their options, matrix
+rows/columns and solution blocks are prefetched per chunk, so memory use
+does not grow with the size of the bank. Each question is turned into the
+same ParsedQuestion record the parsers produce, then written as a LaTeX
+block or as one JSON line.
+"""
+import json
+import os
+import shutil
+from string import ascii_uppercase
+
+from django.db.models import Prefetch
+
+from .latex_parser import ParsedChoice, ParsedQuestion, ParsedSolution, format_question, to_dict
+from .models import Question, Option, MatrixRow, MatrixCol, SolutionBlock
+
+FORMATS = ('tex', 'jsonl')
+MATRIX_TYPES = (Question.Type.MATRIX, Question.Type.MATRIX_SINGLE)
+
+LATEX_HEADER = '''% Exported from the question bank. Import with:
+%   python manage.py import_questions <this file>
+
+'''
+
+
+def option_label(position):
+    """A, B, ..., Z, AA, AB, ... (options are stored without labels)."""
+    label = ''
+    position += 1
+    while position:
+        position, rest = divmod(position - 1, 26)
+        label = ascii_uppercase[rest] + label
+    return label
+
+
+def export_queryset(queryset=None):
+    """
+    Questions with the children an export needs, in a stable order.
+
+    The children are prefetched into plain lists (to_attr), which skips
+    building a related manager per question.
+    """
+    queryset = Question.objects.all() if queryset is None else queryset
+    return queryset.order_by('id').prefetch_related(
+        Prefetch('options', queryset=Option.objects.order_by('id'), to_attr='export_options'),
+        Prefetch('matrix_rows', queryset=MatrixRow.objects.order_by('id'), to_attr='export_rows'),
+        Prefetch('matrix_cols', queryset=MatrixCol.objects.order_by('id'), to_attr='export_cols'),
+        Prefetch('solution_blocks', queryset=SolutionBlock.objects.order_by('order', 'id'),
+                 to_attr='export_solutions'),
+    )
+
+
+class QuestionExporter:
+    """
+    Usage:
+        exporter = QuestionExporter(out, 'tex', out_dir, media_dir=None)
+        for question in export_queryset(...).iterator(chunk_size=1000):
+            exporter.write(question)
+
+    Image paths are written relative to out_dir, which is where the importer
+    will look for them. With media_dir the image files are copied there
+    (under their storage names) so the export can be moved as a whole.
+    write() raises ValueError for questions the format cannot represent.
+    """
+
+    def __init__(self, out, fmt, out_dir, media_dir=None):
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown format {fmt!r}')
+        self.out = out
+        self.fmt = fmt
+        self.out_dir = out_dir
+        self.media_dir = media_dir
+        self.copied = set()
+        self.questions = 0
+        self.images = 0
+        if fmt == 'tex':
+            out.write(LATEX_HEADER)
+
+    def image_path(self, image):
+        if not image:
+            return None
+        path = image.path
+        if self.media_dir:
+            target = os.path.join(self.media_dir, image.name)
+            if image.name not in self.copied:
+                if not os.path.exists(path):
+                    raise ValueError(f'image file {image.name} is missing')
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copyfile(path, target)
+                    self.images += 1
+                self.copied.add(image.name)
+            path = target
+        if self.out_dir is None:
+            return os.path.abspath(path)
+        return os.path.relpath(path, self.out_dir).replace(os.sep, '/')
+
+    def to_record(self, question):
+        record = ParsedQuestion(
+            index=self.questions,
+            line=None,
+            question_type=question.question_type,
+            chapter=question.chapter or None,
+            subtopic=question.subtopic or None,
+            difficulty=question.difficulty,
+            # True is the importer's default
+            partial_marking=None if question.allow_partial_marking else False,
+            text=question.text or '',
+            image=self.image_path(question.image),
+            assertion=question.assertion or '',
+            reason=question.reason or '',
+        )
+
+        correct = []
+        for position, option in enumerate(question.export_options):
+            label = option_label(position)
+            record.options.append(ParsedChoice(label, option.text, self.image_path(option.image)))
+            if option.is_correct:
+                correct.append(label)
+        record.answer = ','.join(correct)
+
+        if question.question_type == Question.Type.NUMERICAL:
+            if question.numerical_answer is not None:
+                record.answer = repr(question.numerical_answer)
+            if question.numerical_tolerance:
+                record.tolerance = repr(question.numerical_tolerance)
+
+        if question.question_type in MATRIX_TYPES:
+            for row in question.export_rows:
+                record.rows.append(ParsedChoice(row.label, row.text, self.image_path(row.image)))
+                matches = [c.strip() for c in row.matches.split(',') if c.strip()]
+                if matches:
+                    record.matrix_answers[row.label] = matches
+            for col in question.export_cols:
+                record.cols.append(ParsedChoice(col.label, col.text, self.image_path(col.image)))
+
+        for block in question.export_solutions:
+            record.solutions.append(ParsedSolution(block.text, self.image_path(block.image)))
+        return record
+
+    def write(self, question):
+        try:
+            record = self.to_record(question)
+        except ValueError as e:
+            raise ValueError(f'question {question.id}: {e}') from None
+        if self.fmt == 'tex':
+            try:
+                text = format_question(record)
+            except ValueError as e:
+                raise ValueError(f'question {question.id}: {e}; export it as jsonl instead') from None
+            self.out.write(text + '\n')
+        else:
+            self.out.write(json.dumps(to_dict(record), ensure_ascii=False) + '\n')
+        self.questions += 1
@@ -0,0 +1,149 @@
+"""
+Grading helpers that work from answer keys loaded in bulk.
+
+The rules mirror calculate_final_score in views.py, but the keys for a whole
+batch of questions are fetched with a handful of queries so that batch jobs
+(calibration, analytics) can grade thousands of responses without hitting the
+database once per response.
+"""
+from dataclasses import dataclass, field
+
+from .models import Question, Option, MatrixRow
+
+# SQLite caps the number of bound parameters per statement
+ID_CHUNK_SIZE = 900
+
+DEFAULT_MARKS = 4.0
+DEFAULT_NEGATIVE_MARKS = 1.0
+
+
+@dataclass
+class AnswerKey:
+    question_type: str
+    allow_partial_marking: bool = True
+    correct_option_ids: frozenset = frozenset()
+    numerical_answer: float = None
+    numerical_tolerance: float = 0.0
+    # Row label -> set of correct column labels (Matrix Match)
+    matrix_correct: dict = field(default_factory=dict)
+
+
+def chunked(values, size=ID_CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def load_answer_keys(question_ids):
+    """
+    Returns {question_id: AnswerKey} for the given questions.
+    """
+    keys = {}
+    question_ids = list(set(question_ids))
+
+    for ids in chunked(question_ids):
+        rows = Question.objects.filter(id__in=ids).values_list(
+            'id', 'question_type', 'allow_partial_marking',
+            'numerical_answer', 'numerical_tolerance', 'matrix_config'
+        )
+        for qid, q_type, partial, num_ans, num_tol, matrix_config in rows:
+            key = AnswerKey(
+                question_type=q_type,
+                allow_partial_marking=partial,
+                numerical_answer=num_ans,
+                numerical_tolerance=num_tol or 0.0,
+            )
+            # Legacy imports stored the matrix answer in matrix_config
+            if matrix_config and matrix_config.get('rows'):
+                correct = matrix_config.get('correct', {})
+                key.matrix_correct = {
+                    str(row['id']): frozenset(str(c) for c in correct.get(row['id'], []))
+                    for row in matrix_config['rows']
+                }
+            keys[qid] = key
+
+    correct_options = {}
+    for ids in chunked(question_ids):
+        for qid, oid in Option.objects.filter(question_id__in=ids, is_correct=True).values_list('question_id', 'id'):
+            correct_options.setdefault(qid, set()).add(str(oid))
+    for qid, oids in correct_options.items():
+        if qid in keys:
+            keys[qid].correct_option_ids = frozenset(oids)
+
+    for ids in chunked(question_ids):
+        for qid, label, matches in MatrixRow.objects.filter(question_id__in=ids).values_list('question_id', 'label', 'matches'):
+            key = keys.get(qid)
+            if key is None or key.question_type != Question.Type.MATRIX:
+                continue
+            key.matrix_correct.setdefault(label, frozenset(x.strip() for x in matches.split(',') if x.strip()))
+
+    return keys
+
+
+def matrix_row_results(key, answer_data):
+    """
+    Returns [(row_label, is_correct), ...] for a Matrix Match answer.
+    """
+    user_dict = answer_data if isinstance(answer_data, dict) else {}
+    return [
+        (label, set(str(c) for c in user_dict.get(label, [])) == correct)
+        for label, correct in key.matrix_correct.items()
+    ]
+
+
+def grade(key, answer_data, marks=DEFAULT_MARKS, negative_marks=DEFAULT_NEGATIVE_MARKS):
+    """
+    Grades a single answer against its key.
+
+    Returns (marks_awarded, is_correct). is_correct is None when the answer is
+    empty or the question type is not auto-graded.
+    """
+    if not answer_data:
+        return 0.0, None
+
+    q_marks = marks if marks > 0 else DEFAULT_MARKS
+    q_neg = negative_marks if negative_marks > 0 else DEFAULT_NEGATIVE_MARKS
+    q_type = key.question_type
+
+    if q_type in [Question.Type.MCQ_SINGLE, Question.Type.ASSERTION_REASON]:
+        if not isinstance(answer_data, list):
+            return 0.0, None
+        if str(answer_data[0]) in key.correct_option_ids:
+            return q_marks, True
+        return -q_neg, False
+
+    if q_type == Question.Type.MCQ_MULTI:
+        if not isinstance(answer_data, list):
+            return 0.0, None
+        selected = set(str(x) for x in answer_data)
+        correct = key.correct_option_ids
+        if any(sid not in correct for sid in selected):
+            return -q_neg, False
+        if not correct:
+            return 0.0, None
+        if key.allow_partial_marking:
+            return len(selected) * (q_marks / len(correct)), selected == correct
+        if selected == correct:
+            return q_marks, True
+        return -q_neg, False
+
+    if q_type == Question.Type.NUMERICAL:
+        if key.numerical_answer is None or not isinstance(answer_data, list):
+            return 0.0, None
+        try:
+            val = float(answer_data[0])
+        except (TypeError, ValueError):
+            return 0.0, None
+        if abs(val - key.numerical_answer) <= key.numerical_tolerance:
+            return q_marks, True
+        return -q_neg, False
+
+    if q_type == Question.Type.MATRIX:
+        results = matrix_row_results(key, answer_data)
+        if not results:
+            return 0.0, None
+        marks_per_row = q_marks / len(results)
+        n_correct = sum(1 for _, ok in results if ok)
+        return n_correct * marks_per_row, n_correct == len(results)
+
+    return 0.0, None
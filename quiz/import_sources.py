@@ -0,0 +1,263 @@
+"""
+Finding, parsing and hashing import sources, optionally in worker processes.
+
+Nothing here touches Django, so the functions can run in a
+ProcessPoolExecutor on any start method (fork or spawn). The parent process
+keeps the database writes: it consumes the ParsedFile results in order and
+feeds them to a single BulkQuestionWriter.
+
+Files are yielded RECORD_BATCH records at a time, so memory stays bounded
+by the batch rather than by the file. A worker can only return a whole file,
+pickled back to the parent, so files larger than STREAM_FILE_SIZE are parsed
+in the parent even with a pool.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from .latex_parser import from_dict, parse_file
+
+SOURCE_EXTENSIONS = ('.tex', '.jsonl')
+HASH_CHUNK_SIZE = 1024 * 1024
+STREAM_FILE_SIZE = 8 * 1024 * 1024
+RECORD_BATCH = 1000
+GLOB_CHARS = '*?['
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+@dataclass
+class ImageRef:
+    path: str       # resolved path on disk
+    digest: str     # sha256 of the file contents
+    size: int
+
+
+@dataclass
+class ParsedFile:
+    """
+    A parsed file, or one part of a file parsed RECORD_BATCH records at a
+    time: parts are numbered from 0 and the last one has last=True.
+    """
+    path: str
+    records: list = field(default_factory=list)
+    # Image path as written in the file -> ImageRef, or None if it does not exist
+    images: dict = field(default_factory=dict)
+    error: str = None
+    # Wall time spent parsing and hashing images, wherever that ran
+    parse_seconds: float = 0.0
+    hash_seconds: float = 0.0
+    part: int = 0
+    last: bool = True
+
+    @property
+    def base_dir(self):
+        return os.path.dirname(self.path)
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+            size += len(chunk)
+    return sha.hexdigest(), size
+
+
+def record_image_paths(record):
+    paths = [record.image]
+    paths += [c.image for c in record.options + record.rows + record.cols]
+    paths += [s.image for s in record.solutions]
+    return [p for p in paths if p]
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return WHITESPACE_RE.sub(' ', value).strip()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    return value
+
+
+def content_hash(record, images=None):
+    """
+    SHA-256 of everything in a parsed question that ends up in the database.
+
+    Whitespace is collapsed and line numbers are left out, so reformatting a
+    file or inserting a question above another one does not change the hash;
+    images contribute their file digests rather than their paths.
+    """
+    images = images or {}
+
+    def image(rel_path):
+        if not rel_path:
+            return None
+        ref = images.get(rel_path)
+        return ref.digest if ref else rel_path
+
+    content = {
+        'type': record.question_type,
+        'chapter': record.chapter,
+        'subtopic': record.subtopic,
+        'difficulty': record.difficulty,
+        'partial_marking': record.partial_marking,
+        'text': record.text,
+        'image': image(record.image),
+        'assertion': record.assertion,
+        'reason': record.reason,
+        'answer': record.answer,
+        'tolerance': record.tolerance,
+        'options': [[c.label, c.text, image(c.image)] for c in record.options],
+        'rows': [[c.label, c.text, image(c.image)] for c in record.rows],
+        'cols': [[c.label, c.text, image(c.image)] for c in record.cols],
+        'matrix_answers': record.matrix_answers,
+        'solutions': [[s.text, image(s.image)] for s in record.solutions],
+    }
+    encoded = json.dumps(_normalize(content), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def parse_jsonl(path):
+    """
+    Yields a ParsedQuestion per non-blank line of a JSON Lines export.
+    """
+    index = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = from_dict(json.loads(line), index, line_no)
+            except json.JSONDecodeError as e:
+                record = from_dict({}, index, line_no)
+                record.errors.append((f'invalid JSON: {e.msg}', line_no))
+            yield record
+            index += 1
+
+
+def _hash_images(records, images, base_dir):
+    for record in records:
+        for rel_path in record_image_paths(record):
+            if rel_path in images:
+                continue
+            full_path = os.path.join(base_dir, rel_path)
+            if os.path.isfile(full_path):
+                digest, size = file_digest(full_path)
+                images[rel_path] = ImageRef(full_path, digest, size)
+            else:
+                images[rel_path] = None
+
+
+def iter_source_parts(path, batch_size):
+    """
+    Parses one .tex or .jsonl file and hashes every image it references,
+    yielding ParsedFile parts of at most batch_size records (None for the
+    whole file in one part).
+
+    The parts share one images map, so an image used all over the file is
+    hashed once. A read error ends the file with a part that carries the
+    error and no records; the parts before it have already been yielded.
+    """
+    parse = parse_jsonl if path.endswith('.jsonl') else parse_file
+    records = parse(path)
+    images = {}
+    part = 0
+    while True:
+        result = ParsedFile(path=path, images=images, part=part, last=False)
+        started = time.perf_counter()
+        try:
+            for record in records:
+                result.records.append(record)
+                if len(result.records) == batch_size:
+                    break
+            else:
+                result.last = True
+        except (OSError, UnicodeDecodeError) as e:
+            result.records = []
+            result.error = str(e)
+            result.last = True
+        parsed = time.perf_counter()
+        result.parse_seconds = parsed - started
+        _hash_images(result.records, images, result.base_dir)
+        result.hash_seconds = time.perf_counter() - parsed
+        yield result
+        if result.last:
+            return
+        part += 1
+
+
+def parse_source_file(path):
+    """
+    Parses one .tex or .jsonl file and hashes every image it references.
+    """
+    return next(iter_source_parts(path, batch_size=None))
+
+
+def _streamed(path):
+    try:
+        return os.path.getsize(path) > STREAM_FILE_SIZE
+    except OSError:
+        return False
+
+
+def expand_sources(patterns):
+    """
+    Expands files, directories (searched recursively for .tex and .jsonl)
+    and glob patterns into a de-duplicated list of source files: in the
+    order the patterns are given, each directory and glob sorted.
+    """
+    found = []
+    for pattern in patterns:
+        if any(c in pattern for c in GLOB_CHARS):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                for root, dirs, files in os.walk(match):
+                    dirs.sort()
+                    found += [os.path.join(root, f) for f in sorted(files) if f.endswith(SOURCE_EXTENSIONS)]
+            elif os.path.isfile(match):
+                found.append(match)
+    seen = set()
+    return [p for p in found if not (p in seen or seen.add(p))]
+
+
+def iter_parsed_files(paths, workers=1):
+    """
+    Yields the ParsedFile parts of each path, in the order given, one per
+    RECORD_BATCH records.
+
+    With workers > 1 files up to STREAM_FILE_SIZE are instead parsed whole,
+    one part each, in a process pool; results are still yielded in order,
+    each as soon as it and its predecessors are done. At most 2 * workers
+    files are in flight, so a slow writer does not let parsed files pile up
+    in memory. A large file is streamed in this process once the files
+    before it have been yielded.
+    """
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield from iter_source_parts(path, RECORD_BATCH)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for path in paths:
+            if _streamed(path):
+                while in_flight:
+                    yield in_flight.popleft().result()
+                yield from iter_source_parts(path, RECORD_BATCH)
+                continue
+            in_flight.append(executor.submit(parse_source_file, path))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
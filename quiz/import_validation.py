@@ -0,0 +1,255 @@
+"""
+Validation of parsed questions and the report behind import --dry-run.
+
+Severities follow what the importer does with the question:
+    error    the question is rejected
+    warning  it is imported, but something is defaulted or left out
+             (a missing \\difficulty becomes MODERATE, a missing image is
+             skipped, ...)
+"""
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+from PIL import Image, UnidentifiedImageError
+
+from .models import Question
+
+ERROR = 'error'
+WARNING = 'warning'
+
+OPTION_TYPES = (Question.Type.MCQ_SINGLE, Question.Type.MCQ_MULTI,
+                Question.Type.TRUE_FALSE, Question.Type.ASSERTION_REASON)
+MATRIX_TYPES = (Question.Type.MATRIX, Question.Type.MATRIX_SINGLE)
+CHAPTERS = [c for c, _ in Question.CHAPTER_CHOICES]
+DIFFICULTIES = [d for d, _ in Question.DIFFICULTY_CHOICES]
+
+
+@dataclass
+class Issue:
+    severity: str
+    message: str
+    line: int = None
+    field: str = None
+
+
+def _choices(values):
+    return ', '.join(values)
+
+
+def validate_record(record, strict=False):
+    """
+    Returns the Issues found in a ParsedQuestion, without touching images.
+
+    strict makes \\type, \\chapter, \\difficulty and \\answer mandatory, as
+    in the standard import format.
+    """
+    issues = []
+    missing = ERROR if strict else WARNING
+
+    def add(severity, message, line=None, field=None):
+        issues.append(Issue(severity, message, line or record.line, field))
+
+    def line_of(command):
+        return record.lines.get(command, record.line)
+
+    for message, line in record.errors:
+        add(ERROR, message, line)
+    for name, line in record.unknown:
+        add(WARNING, f'unknown command \\{name} ignored', line)
+
+    if not record.question_type:
+        add(missing, 'missing \\type' + ('' if strict else ', MCQ_SINGLE assumed'), field='type')
+    elif record.question_type not in Question.Type.values:
+        add(ERROR, f'unknown \\type {record.question_type!r}; expected one of {_choices(Question.Type.values)}',
+            line_of('type'), 'type')
+    if not record.chapter:
+        add(missing, 'missing \\chapter', field='chapter')
+    elif record.chapter not in CHAPTERS:
+        add(ERROR, f'unknown \\chapter {record.chapter!r}; expected one of {_choices(CHAPTERS)}',
+            line_of('chapter'), 'chapter')
+    if not record.difficulty:
+        add(missing, 'missing \\difficulty' + ('' if strict else ', MODERATE assumed'), field='difficulty')
+    elif record.difficulty not in DIFFICULTIES:
+        add(ERROR, f'unknown \\difficulty {record.difficulty!r}; expected one of {_choices(DIFFICULTIES)}',
+            line_of('difficulty'), 'difficulty')
+    if not record.text and not record.assertion:
+        add(ERROR, 'question text is missing', field='text')
+
+    q_type = record.question_type or Question.Type.MCQ_SINGLE
+    answer_line = line_of('answer')
+    if q_type in OPTION_TYPES:
+        labels = [c.label for c in record.options]
+        duplicates = sorted({label for label in labels if labels.count(label) > 1})
+        if not labels:
+            add(ERROR, 'no \\option given', field='options')
+        elif duplicates:
+            add(ERROR, f'duplicate option label(s) {", ".join(duplicates)}', field='options')
+        answers = record.answer_labels
+        if not answers:
+            add(missing, 'missing \\answer' + ('' if strict else '; no option will be marked correct'),
+                field='answer')
+        unknown = [label for label in answers if label not in labels]
+        if labels and unknown:
+            add(ERROR, f'answer {", ".join(unknown)} does not match any option ({", ".join(labels)})',
+                answer_line, 'answer')
+        if q_type != Question.Type.MCQ_MULTI and len(answers) > 1:
+            add(ERROR, f'{q_type} question has {len(answers)} answers', answer_line, 'answer')
+    elif q_type == Question.Type.NUMERICAL:
+        if not record.answer:
+            add(missing, 'missing \\answer', field='answer')
+        elif record.numerical_answer is None:
+            add(ERROR, f'answer {record.answer!r} is not a number', answer_line, 'answer')
+        if record.tolerance and record.numerical_tolerance is None:
+            add(ERROR, f'tolerance {record.tolerance!r} is not a number', line_of('tolerance'), 'tolerance')
+    elif q_type in MATRIX_TYPES:
+        rows = [c.label for c in record.rows]
+        cols = [c.label for c in record.cols]
+        if not rows or not cols:
+            add(ERROR, 'matrix questions need \\row and \\col entries', field='rows')
+        correct = record.matrix_correct
+        if not correct:
+            add(missing, 'missing \\matrix_answer', field='answer')
+        for row, matches in correct.items():
+            line = line_of('matrix_answer') if record.matrix_answers else answer_line
+            if row not in rows:
+                add(ERROR, f'answer row {row} is not a \\row ({", ".join(rows)})', line, 'answer')
+            unknown = [c for c in matches if c not in cols]
+            if unknown:
+                add(ERROR, f'answer for row {row} uses unknown column(s) {", ".join(unknown)}', line, 'answer')
+            if q_type == Question.Type.MATRIX_SINGLE and len(matches) > 1:
+                add(ERROR, f'row {row} has {len(matches)} matches in a MATRIX_SINGLE question', line, 'answer')
+    return issues
+
+
+class ImageChecker:
+    """
+    Checks that the images a record uses exist and can be opened by Pillow.
+    Each file is only opened once per run.
+    """
+
+    def __init__(self):
+        self.checked = {}
+
+    def problem(self, path):
+        if path not in self.checked:
+            try:
+                with Image.open(path) as image:
+                    image.verify()
+                self.checked[path] = None
+            except FileNotFoundError:
+                self.checked[path] = 'not found'
+            except (UnidentifiedImageError, OSError, SyntaxError) as e:
+                self.checked[path] = f'is not a readable image ({e})'
+        return self.checked[path]
+
+    def check(self, record, base_dir, images=None):
+        """
+        images is the map from import_sources.parse_source_file; without it
+        the paths are resolved against base_dir.
+        """
+        issues = []
+        used = [(record.image, record.lines.get('text', record.line))]
+        used += [(c.image, c.line) for c in record.options + record.rows + record.cols]
+        used += [(s.image, s.line) for s in record.solutions]
+        for rel_path, line in used:
+            if not rel_path:
+                continue
+            if images is not None and rel_path in images:
+                ref = images[rel_path]
+                problem = self.problem(ref.path) if ref else 'not found'
+            else:
+                problem = self.problem(os.path.join(base_dir, rel_path))
+            if problem == 'not found':
+                issues.append(Issue(WARNING, f'image {rel_path} not found; imported without it',
+                                    line or record.line, 'image'))
+            elif problem:
+                issues.append(Issue(WARNING, f'image {rel_path} {problem}', line or record.line, 'image'))
+        return issues
+
+
+class ImportReport:
+    """
+    Collects issues and per-stage timings (parse, validate, image, write).
+
+    Stages that run in worker processes are summed over the workers, so
+    with --workers > 1 the stage times can add up to more than the total.
+    """
+
+    STAGES = ('parse', 'validate', 'image', 'write')
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.started = time.perf_counter()
+        self.timings = Counter({stage: 0.0 for stage in self.STAGES})
+        self.files = []
+        self.issues = []
+        self.questions = 0
+        self.rejected = 0
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - started
+
+    def add_time(self, name, seconds):
+        self.timings[name] += seconds
+
+    def add_file(self, path, error=None):
+        """
+        Starts the entry of a file; called again for each further part of a
+        file read in parts, which only records the error if there is one.
+        """
+        if self.files and self.files[-1]['path'] == path:
+            self.files[-1]['error'] = error or self.files[-1]['error']
+            return
+        self.files.append({'path': path, 'questions': 0, 'errors': 0, 'warnings': 0, 'error': error})
+
+    def add_record(self, path, record, issues):
+        """
+        Records the issues of one question; returns False if it is rejected.
+        """
+        entry = self.files[-1]
+        entry['questions'] += 1
+        self.questions += 1
+        rejected = False
+        for issue in issues:
+            self.issues.append({'file': path, 'question': record.index, **asdict(issue)})
+            entry['errors' if issue.severity == ERROR else 'warnings'] += 1
+            rejected = rejected or issue.severity == ERROR
+        self.rejected += rejected
+        return not rejected
+
+    def count(self, severity):
+        return sum(1 for issue in self.issues if issue['severity'] == severity)
+
+    def to_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'summary': {
+                'files': len(self.files),
+                'questions': self.questions,
+                'valid': self.questions - self.rejected,
+                'rejected': self.rejected,
+                'errors': self.count(ERROR),
+                'warnings': self.count(WARNING),
+            },
+            'timings': {
+                **{stage: round(self.timings[stage], 4) for stage in self.STAGES},
+                'total': round(time.perf_counter() - self.started, 4),
+            },
+            'files': self.files,
+            'issues': self.issues,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def write(self, out):
+        out.write(self.to_json() + '\n')
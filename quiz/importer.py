@@ -0,0 +1,467 @@
+"""
+Batched database writer for parsed LaTeX questions.
+
+Questions are buffered and written batch by batch inside one transaction per
+batch: the Question rows are inserted with bulk_create first, then their
+Options, MatrixRows, MatrixCols and SolutionBlocks, one bulk_create per model.
+
+Records added with a source_key (<file>#<block index>) are upserted. A
+record is first matched by content_hash to a question imported before from
+the same file, so inserting or removing a block only re-keys the questions
+after it; those are skipped without touching their images. A record without
+such a match is written over the question at its position (changed content)
+or inserted. A rewritten question keeps its row, and its children are
+matched to the existing rows by position, so Option ids referenced from
+saved answers stay valid, and only the surplus is created or deleted.
+"""
+import operator
+import os
+import time
+from dataclasses import dataclass, field
+from functools import reduce
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+
+from .grading import chunked
+from .models import Question, Option, MatrixRow, MatrixCol, SolutionBlock
+
+MATRIX_TYPES = (Question.Type.MATRIX, Question.Type.MATRIX_SINGLE)
+
+# Columns rewritten when an imported question changes
+QUESTION_UPDATE_FIELDS = [
+    'text', 'assertion', 'reason', 'image', 'question_type', 'allow_partial_marking',
+    'chapter', 'subtopic', 'difficulty', 'numerical_answer', 'numerical_tolerance',
+    'matrix_config', 'content_hash', 'is_retired',
+]
+CHILD_UPDATE_FIELDS = {
+    Option: ['text', 'image', 'is_correct'],
+    MatrixRow: ['label', 'text', 'image', 'matches'],
+    MatrixCol: ['label', 'text', 'image'],
+    SolutionBlock: ['text', 'image', 'order'],
+}
+
+
+@dataclass
+class ImportStats:
+    questions: int = 0          # rows written: created + updated
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    moved: int = 0              # unchanged questions found at another position in their file
+    retired: int = 0
+    options: int = 0
+    matrix_rows: int = 0
+    matrix_cols: int = 0
+    solution_blocks: int = 0
+    images: int = 0
+    image_seconds: float = 0.0  # storing image files, part of the write time
+    started: float = field(default_factory=time.perf_counter)
+    finished: float = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self):
+        processed = self.questions + self.unchanged
+        return processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f'{self.questions} questions ({self.created} new, {self.updated} updated, '
+                f'{self.unchanged} unchanged, {self.moved} moved, {self.retired} retired), {self.options} options, '
+                f'{self.matrix_rows} matrix rows, {self.matrix_cols} matrix columns, '
+                f'{self.solution_blocks} solution blocks, {self.images} images '
+                f'in {self.elapsed:.2f}s ({self.rate:.0f} questions/s)')
+
+
+@dataclass
+class _Source:
+    record: object
+    base_dir: str
+    images: dict
+    source_key: str = None
+    content_hash: str = None
+
+
+@dataclass
+class _Pending:
+    question: Question
+    options: list
+    rows: list
+    cols: list
+    solutions: list
+
+    def children(self):
+        return ((Option, self.options), (MatrixRow, self.rows),
+                (MatrixCol, self.cols), (SolutionBlock, self.solutions))
+
+
+def source_prefix(source_key):
+    """
+    'chapter1.tex#12' -> 'chapter1.tex#', the prefix shared by every
+    question imported from that file.
+    """
+    return source_key.rpartition('#')[0] + '#'
+
+
+class BulkQuestionWriter:
+    """
+    Usage:
+        writer = BulkQuestionWriter(batch_size=500)
+        for record in parse_file(path):
+            writer.add(record, base_dir, source_key=f'{path}#{record.index}',
+                       content_hash=content_hash(record))
+        writer.end_file(f'{path}#')
+        stats = writer.close()
+
+    Records must already have passed import_validation.validate_record
+    without errors; the writer does not check them again. Records without a
+    source_key are always inserted as new questions. end_file() is optional (close() ends
+    every file), but lets the writer release the file's held-back records.
+    """
+
+    def __init__(self, batch_size=500, on_warning=None):
+        self.batch_size = batch_size
+        self.on_warning = on_warning or (lambda message: None)
+        self.stats = ImportStats()
+        self.pending = []
+        # Images already stored in this run: (upload path, sha256) -> storage name
+        self.stored_images = {}
+        # Storage names of every image the imported rows point at
+        self.image_names = set()
+        # Questions imported before from the files seen so far: (file prefix,
+        # content hash) -> ids, source key -> id, id -> (source key, retired)
+        self.loaded_prefixes = set()
+        self.by_hash = {}
+        self.by_key = {}
+        self.rows = {}
+        # Ids already matched to a record (or written) in this run
+        self.claimed = set()
+        # Records waiting for the end of their file, by source key prefix
+        self.deferred = {}
+        self.ended = set()
+
+    def add(self, record, base_dir, images=None, source_key=None, content_hash=None):
+        """
+        images optionally maps the image paths used in the record to the
+        ImageRefs resolved (and hashed) by import_sources.parse_source_file.
+
+        Building the record (and storing its images) waits until flush()
+        knows whether it changed.
+        """
+        self.pending.append(_Source(record, base_dir, images or {}, source_key, content_hash))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def end_file(self, prefix):
+        """
+        Tells the writer every record of the file with this source key
+        prefix ('<file>#') has been added, so the records it held back are
+        written over the question at their position or inserted.
+        """
+        self.ended.add(prefix)
+        self.pending.extend(self.deferred.pop(prefix, []))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def close(self):
+        for prefix in list(self.deferred):
+            self.end_file(prefix)
+        self.flush()
+        self.stats.finished = time.perf_counter()
+        return self.stats
+
+    def resolve_image(self, base_dir, rel_path, line=None, images=None):
+        """
+        Returns (full_path, sha256 or None), or None if the file is missing.
+        """
+        if not rel_path:
+            return None
+        if images and rel_path in images:
+            ref = images[rel_path]
+            if ref is not None:
+                return ref.path, ref.digest
+            full_path = os.path.join(base_dir, rel_path)
+        else:
+            full_path = os.path.join(base_dir, rel_path)
+            if os.path.exists(full_path):
+                return full_path, None
+        self.on_warning(f'Image not found: {full_path}' + (f' (line {line})' if line else ''))
+        return None
+
+    def attach_image(self, instance, base_dir, rel_path, line=None, images=None):
+        """
+        Stores the image file and points instance.image at it without saving
+        the instance, so the row itself can go through bulk_create.
+        """
+        if not rel_path:
+            return
+        started = time.perf_counter()
+        try:
+            self.store_image(instance, base_dir, rel_path, line, images)
+        finally:
+            self.stats.image_seconds += time.perf_counter() - started
+        if instance.image:
+            self.image_names.add(instance.image.name)
+
+    def store_image(self, instance, base_dir, rel_path, line=None, images=None):
+        resolved = self.resolve_image(base_dir, rel_path, line, images)
+        if not resolved:
+            return
+        full_path, digest = resolved
+        image_field = instance._meta.get_field('image')
+        name = image_field.generate_filename(instance, os.path.basename(full_path))
+        key = (os.path.dirname(name), digest)
+        if digest and key in self.stored_images:
+            # Same bytes already stored for this field during this import
+            instance.image = self.stored_images[key]
+            return
+        if digest and hasattr(image_field.storage, 'hashed_name'):
+            # Content-addressed storage: skip reading files that are already stored
+            hashed = image_field.storage.hashed_name(name, digest)
+            if image_field.storage.exists(hashed):
+                instance.image = self.stored_images[key] = hashed
+                return
+        with open(full_path, 'rb') as f:
+            instance.image = image_field.storage.save(name, File(f), max_length=image_field.max_length)
+        if digest:
+            self.stored_images[key] = instance.image.name
+        self.stats.images += 1
+
+    def retire_missing(self, prefix, seen_keys):
+        """
+        Marks questions imported from keys starting with prefix, but absent
+        from seen_keys, as retired. They are kept because attempts may still
+        reference them.
+        """
+        self.end_file(prefix)
+        self.flush()
+        seen_keys = set(seen_keys)
+        stale = [pk for pk, key in Question.objects.filter(source_key__startswith=prefix, is_retired=False)
+                 .values_list('id', 'source_key') if key not in seen_keys]
+        for ids in chunked(stale):
+            self.stats.retired += Question.objects.filter(id__in=ids).update(is_retired=True)
+
+    def build(self, record, base_dir, images=None):
+        q_type = record.question_type or Question.Type.MCQ_SINGLE
+        question = Question(
+            text=record.text,
+            assertion=record.assertion or None,
+            reason=record.reason or None,
+            question_type=q_type,
+            chapter=record.chapter,
+            subtopic=record.subtopic,
+            difficulty=record.difficulty or 'MODERATE',
+            allow_partial_marking=record.partial_marking if record.partial_marking is not None else True,
+        )
+        if q_type == Question.Type.NUMERICAL:
+            question.numerical_answer = record.numerical_answer
+            question.numerical_tolerance = record.numerical_tolerance or 0.0
+        self.attach_image(question, base_dir, record.image, record.line, images)
+
+        answer_labels = record.answer_labels
+        options = []
+        for opt in record.options:
+            option = Option(text=opt.text, is_correct=opt.label in answer_labels)
+            self.attach_image(option, base_dir, opt.image, opt.line, images)
+            options.append(option)
+
+        rows, cols = [], []
+        if q_type in MATRIX_TYPES:
+            matrix_correct = record.matrix_correct
+            for row in record.rows:
+                matrix_row = MatrixRow(label=row.label, text=row.text,
+                                       matches=','.join(matrix_correct.get(row.label, [])))
+                self.attach_image(matrix_row, base_dir, row.image, row.line, images)
+                rows.append(matrix_row)
+            for col in record.cols:
+                matrix_col = MatrixCol(label=col.label, text=col.text)
+                self.attach_image(matrix_col, base_dir, col.image, col.line, images)
+                cols.append(matrix_col)
+            # Grading in calculate_final_score still reads matrix_config
+            question.matrix_config = {
+                'rows': [{'id': r.label, 'text': r.text, 'image': r.image.url if r.image else None} for r in rows],
+                'cols': [{'id': c.label, 'text': c.text, 'image': c.image.url if c.image else None} for c in cols],
+                'correct': matrix_correct,
+            }
+
+        solutions = []
+        for order, sol in enumerate(record.solutions, 1):
+            block = SolutionBlock(text=sol.text, order=order)
+            self.attach_image(block, base_dir, sol.image, sol.line, images)
+            solutions.append(block)
+
+        return _Pending(question, options, rows, cols, solutions)
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+
+        self.load_sources(src.source_key for src in batch if src.source_key)
+        sources, seen = [], set()
+        for src in batch:
+            if src.source_key:
+                if src.source_key in seen:
+                    self.on_warning(f'Duplicate source key {src.source_key} skipped')
+                    continue
+                seen.add(src.source_key)
+            sources.append(src)
+
+        # Content first, so a question that only moved within its file keeps
+        # its row; the rest fall back to the row at their position. That row's
+        # content may still come later in the file, so until the file ended
+        # such records are held back
+        matches, deferred = {}, set()
+        for src in sources:
+            if src.source_key:
+                candidates = self.by_hash.get((source_prefix(src.source_key), src.content_hash), ())
+                pk = next((pk for pk in candidates if pk not in self.claimed), None)
+                if pk is not None:
+                    self.claimed.add(pk)
+                    matches[src.source_key] = (pk, True)
+        for src in sources:
+            if src.source_key and src.source_key not in matches:
+                pk = self.by_key.get(src.source_key)
+                if pk is not None and pk not in self.claimed:
+                    prefix = source_prefix(src.source_key)
+                    if prefix not in self.ended:
+                        self.deferred.setdefault(prefix, []).append(src)
+                        deferred.add(src.source_key)
+                        continue
+                    self.claimed.add(pk)
+                    matches[src.source_key] = (pk, False)
+
+        created, updated, moves = [], [], {}
+        for src in sources:
+            if src.source_key in deferred:
+                continue
+            pk, same_content = matches.get(src.source_key, (None, False))
+            if pk is not None and self.rows[pk][0] != src.source_key:
+                moves[pk] = src.source_key
+            if same_content and not self.rows[pk][1]:
+                self.stats.unchanged += 1
+                continue
+            pending = self.build(src.record, src.base_dir, src.images)
+            pending.question.source_key = src.source_key
+            pending.question.content_hash = src.content_hash
+            if pk is not None:
+                pending.question.id = pk
+                updated.append(pending)
+            else:
+                created.append(pending)
+
+        with transaction.atomic():
+            self.move_sources(moves, [p.question.source_key for p in created if p.question.source_key])
+            # SQLite and PostgreSQL both return the new primary keys here
+            Question.objects.bulk_create([p.question for p in created], batch_size=self.batch_size)
+            if updated:
+                Question.objects.bulk_update([p.question for p in updated], QUESTION_UPDATE_FIELDS,
+                                             batch_size=self.batch_size)
+
+            new_children = {model: [] for model in CHILD_UPDATE_FIELDS}
+            for p in created:
+                for model, objs in p.children():
+                    for obj in objs:
+                        obj.question = p.question
+                    new_children[model].extend(objs)
+            changed_children = self.sync_children(updated, new_children)
+            for model, objs in new_children.items():
+                if objs:
+                    model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+        for p in created:
+            if p.question.source_key:
+                self.by_key[p.question.source_key] = p.question.id
+                self.rows[p.question.id] = (p.question.source_key, False)
+                self.claimed.add(p.question.id)
+        self.stats.created += len(created)
+        self.stats.updated += len(updated)
+        self.stats.moved += len(moves)
+        self.stats.questions += len(created) + len(updated)
+        written = {model: len(new_children[model]) + changed_children[model] for model in CHILD_UPDATE_FIELDS}
+        self.stats.options += written[Option]
+        self.stats.matrix_rows += written[MatrixRow]
+        self.stats.matrix_cols += written[MatrixCol]
+        self.stats.solution_blocks += written[SolutionBlock]
+
+    def load_sources(self, keys):
+        """
+        Loads the key, content hash and retired flag of every question
+        imported before from the files of these keys, once per file.
+        """
+        prefixes = {source_prefix(key) for key in keys} - self.loaded_prefixes
+        self.loaded_prefixes |= prefixes
+        for chunk in chunked(prefixes, 100):
+            condition = reduce(operator.or_, (Q(source_key__startswith=prefix) for prefix in chunk))
+            for pk, key, digest, retired in Question.objects.filter(condition).values_list(
+                    'id', 'source_key', 'content_hash', 'is_retired'):
+                self.by_hash.setdefault((source_prefix(key), digest), []).append(pk)
+                self.by_key[key] = pk
+                self.rows[pk] = (key, retired)
+
+    def move_sources(self, moves, new_keys):
+        """
+        Gives the rows in moves ({pk: source key}) their new keys. Rows still
+        holding one of those keys or one of new_keys are parked under
+        <file>#~<pk> first: retire_missing retires them unless a later record
+        of the file claims them.
+        """
+        taken = set(moves.values()) | set(new_keys)
+        parked = []
+        for key in taken:
+            pk = self.by_key.pop(key, None)
+            if pk is not None:
+                parked_key = f'{source_prefix(key)}~{pk}'
+                parked.append(Question(id=pk, source_key=parked_key))
+                self.by_key[parked_key] = pk
+                self.rows[pk] = (parked_key, self.rows[pk][1])
+        Question.objects.bulk_update(parked, ['source_key'], batch_size=self.batch_size)
+        for pk, key in moves.items():
+            old_key, retired = self.rows[pk]
+            if self.by_key.get(old_key) == pk:
+                del self.by_key[old_key]
+            self.by_key[key] = pk
+            self.rows[pk] = (key, retired)
+        Question.objects.bulk_update([Question(id=pk, source_key=key) for pk, key in moves.items()],
+                                     ['source_key'], batch_size=self.batch_size)
+
+    def sync_children(self, updated, new_children):
+        """
+        Pairs the children built for updated questions with the existing rows
+        by position: pairs are updated in place, extra children are appended
+        to new_children and surplus rows are deleted. Returns the number of
+        rows updated per model.
+        """
+        changed = {model: 0 for model in CHILD_UPDATE_FIELDS}
+        if not updated:
+            return changed
+        question_ids = [p.question.id for p in updated]
+        for model, fields in CHILD_UPDATE_FIELDS.items():
+            current = {}
+            for ids in chunked(question_ids):
+                for pk, question_id in model.objects.filter(question_id__in=ids).order_by('id').values_list(
+                        'id', 'question_id'):
+                    current.setdefault(question_id, []).append(pk)
+
+            to_update, to_delete = [], []
+            for p in updated:
+                objs = dict(p.children())[model]
+                old_ids = current.get(p.question.id, [])
+                for obj in objs:
+                    obj.question = p.question
+                for obj, pk in zip(objs, old_ids):
+                    obj.pk = pk
+                    to_update.append(obj)
+                new_children[model].extend(objs[len(old_ids):])
+                to_delete.extend(old_ids[len(objs):])
+
+            if to_update:
+                model.objects.bulk_update(to_update, fields, batch_size=self.batch_size)
+            for ids in chunked(to_delete):
+                model.objects.filter(id__in=ids).delete()
+            changed[model] = len(to_update)
+        return changed
@@ -0,0 +1,488 @@
+"""
+Streaming parser (and writer) for the \\begin{question} ... \\end{question}
+LaTeX format.
+
+The file is read line by line and every line is tokenized once. Brace depth is
+tracked across lines, so arguments may contain nested braces (\\frac{a}{b})
+and span several lines. Only the question currently being parsed is held in
+memory; records are yielded as soon as their \\end{question} is reached.
+
+See import_template.tex for the supported commands. format_question() is the
+inverse of the parser, and to_dict()/from_dict() give the same records as the
+JSON objects used by JSON Lines exports.
+"""
+import re
+from dataclasses import dataclass, field
+
+# Command name -> number of braced arguments it takes
+COMMANDS = {
+    'type': 1,
+    'chapter': 1,
+    'subtopic': 1,
+    'difficulty': 1,
+    'partial_marking': 1,
+    'text': 1,
+    'assertion': 1,
+    'reason': 1,
+    'option': 2,
+    'answer': 1,
+    'tolerance': 1,
+    'row': 2,
+    'col': 2,
+    'matrix_answer': 2,
+    'solution': 1,
+    'sol_image': 1,
+    'includegraphics': 1,
+}
+
+TOKEN_RE = re.compile(
+    r'(?P<begin>\\begin\s*\{question\})'
+    r'|(?P<end>\\end\s*\{question\})'
+    r'|(?P<command>\\[A-Za-z_]+)'
+    r'|(?P<escape>\\.)'
+    r'|(?P<open>\{)'
+    r'|(?P<close>\})'
+    r'|(?P<comment>%.*)'
+)
+ARGUMENT_RE = re.compile(
+    r'(?P<begin>\\begin\s*\{question\})'
+    r'|(?P<end>\\end\s*\{question\})'
+    r'|(?P<escape>\\[\\{}%])'
+    r'|(?P<open>\{)'
+    r'|(?P<close>\})'
+    r'|(?P<comment>%.*)'
+)
+BEGIN_RE = re.compile(r'(?P<begin>\\begin\s*\{question\})|(?P<comment>%.*)')
+
+IMAGE_RE = re.compile(r'\\includegraphics\s*(?:\[[^\]]*\])?\s*\{([^{}]*)\}')
+MATRIX_ANSWER_RE = re.compile(r'\((\w+)\)\s*-\s*([\w,]+)')
+
+
+@dataclass
+class ParsedChoice:
+    """An \\option, \\row or \\col entry."""
+    label: str
+    text: str
+    image: str = None
+    line: int = None
+
+
+@dataclass
+class ParsedSolution:
+    text: str = ''
+    image: str = None
+    line: int = None
+
+
+@dataclass
+class ParsedQuestion:
+    index: int                  # 0-based position of the block in its file
+    line: int                   # line of \begin{question}
+    question_type: str = None
+    chapter: str = None
+    subtopic: str = None
+    difficulty: str = None
+    partial_marking: bool = None
+    text: str = ''
+    image: str = None
+    assertion: str = ''
+    reason: str = ''
+    answer: str = ''
+    tolerance: str = None
+    options: list = field(default_factory=list)
+    rows: list = field(default_factory=list)
+    cols: list = field(default_factory=list)
+    matrix_answers: dict = field(default_factory=dict)
+    solutions: list = field(default_factory=list)
+    # (command, line) for commands the parser does not know
+    unknown: list = field(default_factory=list)
+    # (message, line) for malformed commands; the block should not be imported
+    errors: list = field(default_factory=list)
+    lines: dict = field(default_factory=dict)   # command -> first line it appeared on
+
+    @property
+    def answer_labels(self):
+        return [x.strip() for x in self.answer.split(',') if x.strip()]
+
+    @property
+    def matrix_correct(self):
+        """
+        Row label -> list of column labels, from \\matrix_answer or from an
+        answer written as (A)-p,q (B)-r.
+        """
+        if self.matrix_answers:
+            return self.matrix_answers
+        return {
+            row: [c for c in cols.split(',') if c]
+            for row, cols in MATRIX_ANSWER_RE.findall(self.answer)
+        }
+
+    @property
+    def numerical_answer(self):
+        try:
+            return float(self.answer)
+        except ValueError:
+            return None
+
+    @property
+    def numerical_tolerance(self):
+        try:
+            return float(self.tolerance) if self.tolerance else None
+        except ValueError:
+            return None
+
+
+def split_image(text):
+    """
+    Removes the first \\includegraphics from text.
+    Returns (text, image_path_or_None).
+    """
+    match = IMAGE_RE.search(text)
+    if not match:
+        return text.strip(), None
+    text = (text[:match.start()] + text[match.end():]).strip()
+    return text, match.group(1).strip()
+
+
+class _QuestionBuilder:
+    def __init__(self, index, line):
+        self.record = ParsedQuestion(index=index, line=line)
+        self.depth = 0
+        self.command = None     # top-level command collecting arguments
+        self.command_line = None
+        self.args = []
+        self.buffer = None      # pieces of the argument being captured
+        self.discard = False    # capturing a group that belongs to no command
+
+    def start_command(self, name, line):
+        self.finish_command()
+        self.command = name
+        self.command_line = line
+
+    def finish_command(self):
+        if self.command is None:
+            return
+        name, args, line = self.command, self.args, self.command_line
+        self.command = None
+        self.args = []
+        if name in COMMANDS:
+            self.apply(name, args, line)
+        else:
+            self.record.unknown.append((name, line))
+
+    def wants_argument(self):
+        return self.command is not None and len(self.args) < COMMANDS.get(self.command, 1)
+
+    def open_group(self):
+        self.depth = 1
+        self.buffer = []
+        self.discard = not self.wants_argument()
+
+    def close_group(self):
+        value = ''.join(self.buffer)
+        self.buffer = None
+        if self.discard:
+            self.discard = False
+            return
+        self.args.append(value)
+        if not self.wants_argument():
+            self.finish_command()
+
+    def top_level_text(self, text):
+        """Plain text between commands, e.g. the value of "\\type MCQ_SINGLE"."""
+        text = text.strip()
+        if not text or (text.startswith('[') and text.endswith(']')):
+            # Nothing, or an optional argument such as \\includegraphics[width=3cm]
+            return
+        if self.wants_argument() and not self.args and COMMANDS.get(self.command, 1) == 1:
+            self.args.append(text)
+        self.finish_command()
+
+    def close(self, error=None):
+        if error:
+            self.record.errors.append((error, self.command_line or self.record.line))
+            self.command = None
+        self.finish_command()
+        return self.record
+
+    def apply(self, name, args, line):
+        record = self.record
+        if len(args) < COMMANDS[name]:
+            record.errors.append((f'\\{name} expects {COMMANDS[name]} argument(s)', line))
+            return
+        record.lines.setdefault(name, line)
+        value = args[0].strip()
+
+        if name in ('type', 'chapter', 'subtopic', 'difficulty', 'answer', 'tolerance'):
+            setattr(record, 'question_type' if name == 'type' else name, value)
+        elif name == 'partial_marking':
+            record.partial_marking = value.lower() == 'true'
+        elif name == 'text':
+            record.text, image = split_image(args[0])
+            record.image = record.image or image
+        elif name in ('assertion', 'reason'):
+            setattr(record, name, value)
+        elif name in ('option', 'row', 'col'):
+            text, image = split_image(args[1])
+            target = {'option': record.options, 'row': record.rows, 'col': record.cols}[name]
+            target.append(ParsedChoice(label=value, text=text, image=image, line=line))
+        elif name == 'matrix_answer':
+            record.matrix_answers[value] = [c.strip() for c in args[1].split(',') if c.strip()]
+        elif name == 'solution':
+            text, image = split_image(args[0])
+            record.solutions.append(ParsedSolution(text=text, image=image, line=line))
+        elif name == 'sol_image':
+            if record.solutions and not record.solutions[-1].image:
+                record.solutions[-1].image = value
+            else:
+                record.solutions.append(ParsedSolution(image=value, line=line))
+        elif name == 'includegraphics':
+            # A bare image inside the block but outside \\text
+            record.image = record.image or value
+
+
+def parse_lines(lines):
+    """
+    Yields a ParsedQuestion for every question block in an iterable of lines.
+
+    Malformed blocks are still yielded, with their problems listed in
+    ParsedQuestion.errors, so that one bad block does not stop an import.
+    """
+    builder = None
+    index = 0
+
+    for line_no, line in enumerate(lines, 1):
+        pos = 0
+        while True:
+            # Outside a block only \begin{question} matters, and inside an
+            # argument only braces, comments and block delimiters do
+            if builder is None:
+                regex = BEGIN_RE
+            elif builder.buffer is not None:
+                regex = ARGUMENT_RE
+            else:
+                regex = TOKEN_RE
+            match = regex.search(line, pos)
+            if match is None:
+                break
+            literal = line[pos:match.start()]
+            pos = match.end()
+            kind = match.lastgroup
+            token = match.group()
+
+            if builder is None:
+                if kind == 'begin':
+                    builder = _QuestionBuilder(index, line_no)
+                continue
+
+            if builder.buffer is not None and kind not in ('begin', 'end'):
+                # Inside an argument: copy everything, tracking nesting
+                builder.buffer.append(literal)
+                if kind == 'open':
+                    builder.depth += 1
+                elif kind == 'close':
+                    builder.depth -= 1
+                    if builder.depth == 0:
+                        builder.close_group()
+                        continue
+                elif kind == 'comment':
+                    continue
+                builder.buffer.append(token)
+                continue
+
+            if builder.buffer is None:
+                builder.top_level_text(literal)
+
+            if kind in ('begin', 'end'):
+                error = None
+                if builder.buffer is not None:
+                    builder.buffer = None
+                    error = 'unbalanced braces'
+                elif kind == 'begin':
+                    error = 'missing \\end{question}'
+                yield builder.close(error)
+                index += 1
+                builder = _QuestionBuilder(index, line_no) if kind == 'begin' else None
+            elif kind == 'command':
+                builder.start_command(token[1:], line_no)
+            elif kind == 'open':
+                builder.open_group()
+            elif kind == 'close':
+                builder.record.errors.append(('unexpected }', line_no))
+
+        if builder is None:
+            continue
+        rest = line[pos:]
+        if builder.buffer is not None:
+            builder.buffer.append(rest)
+        else:
+            builder.top_level_text(rest)
+
+    if builder is not None:
+        if builder.buffer is not None:
+            builder.buffer = None
+            yield builder.close('unbalanced braces')
+        else:
+            yield builder.close('missing \\end{question}')
+
+
+def parse_file(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from parse_lines(f)
+
+
+def parse_string(content):
+    return parse_lines(content.splitlines(keepends=True))
+
+
+def check_argument(value, images_allowed=False):
+    """
+    Returns why value cannot be written as a braced argument, or None.
+
+    The parser treats an unescaped % as a comment and needs balanced braces;
+    an \\includegraphics in the text itself would be taken for the image.
+    """
+    depth = 0
+    for match in ARGUMENT_RE.finditer(value):
+        kind = match.lastgroup
+        if kind in ('begin', 'end'):
+            return 'contains \\begin{question} or \\end{question}'
+        if kind == 'comment':
+            return 'contains an unescaped %'
+        if kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            depth -= 1
+            if depth < 0:
+                break
+    if depth:
+        return 'has unbalanced braces'
+    if not images_allowed and IMAGE_RE.search(value):
+        return 'contains \\includegraphics'
+    return None
+
+
+def _with_image(text, image):
+    if not image:
+        return text
+    return f'{text} \\includegraphics{{{image}}}' if text else f'\\includegraphics{{{image}}}'
+
+
+def format_question(record):
+    """
+    Renders a ParsedQuestion as a \\begin{question} block that parses back to
+    the same record. Raises ValueError if some text cannot be represented.
+    """
+    lines = []
+
+    def command(name, *args, image=None):
+        for arg in args:
+            problem = check_argument(arg)
+            if problem:
+                raise ValueError(f'\\{name} {problem}')
+        args = args[:-1] + (_with_image(args[-1], image),)
+        lines.append(f'    \\{name}' + ''.join(f'{{{a}}}' for a in args))
+
+    if record.question_type:
+        command('type', record.question_type)
+    if record.chapter:
+        command('chapter', record.chapter)
+    if record.subtopic:
+        command('subtopic', record.subtopic)
+    if record.difficulty:
+        command('difficulty', record.difficulty)
+    if record.partial_marking is not None:
+        command('partial_marking', 'true' if record.partial_marking else 'false')
+    if record.text or record.image:
+        command('text', record.text or '', image=record.image)
+    if record.assertion:
+        command('assertion', record.assertion)
+    if record.reason:
+        command('reason', record.reason)
+    for choice in record.options:
+        command('option', choice.label, choice.text or '', image=choice.image)
+    for choice in record.rows:
+        command('row', choice.label, choice.text or '', image=choice.image)
+    for choice in record.cols:
+        command('col', choice.label, choice.text or '', image=choice.image)
+    for row, cols in record.matrix_answers.items():
+        command('matrix_answer', row, ','.join(cols))
+    if record.answer:
+        command('answer', record.answer)
+    if record.tolerance:
+        command('tolerance', record.tolerance)
+    for solution in record.solutions:
+        # \\sol_image alone would be merged into the previous block
+        command('solution', solution.text or '', image=solution.image)
+
+    return '\\begin{question}\n' + '\n'.join(lines) + '\n\\end{question}\n'
+
+
+def to_dict(record):
+    """
+    The content of a ParsedQuestion as a JSON-serializable dict.
+    """
+    choice = lambda c: {'label': c.label, 'text': c.text, 'image': c.image}
+    return {
+        'type': record.question_type,
+        'chapter': record.chapter,
+        'subtopic': record.subtopic,
+        'difficulty': record.difficulty,
+        'partial_marking': record.partial_marking,
+        'text': record.text,
+        'image': record.image,
+        'assertion': record.assertion,
+        'reason': record.reason,
+        'answer': record.answer,
+        'tolerance': record.tolerance,
+        'options': [choice(c) for c in record.options],
+        'rows': [choice(c) for c in record.rows],
+        'cols': [choice(c) for c in record.cols],
+        'matrix_answers': record.matrix_answers,
+        'solutions': [{'text': s.text, 'image': s.image} for s in record.solutions],
+    }
+
+
+def from_dict(data, index=0, line=None):
+    """
+    Inverse of to_dict. Missing keys take their defaults; values of the wrong
+    shape are reported in ParsedQuestion.errors rather than raised.
+    """
+    record = ParsedQuestion(index=index, line=line)
+    if not isinstance(data, dict):
+        record.errors.append(('expected a JSON object', line))
+        return record
+
+    def text(key):
+        value = data.get(key)
+        return '' if value is None else str(value)
+
+    def optional(key):
+        value = data.get(key)
+        return None if value in (None, '') else str(value)
+
+    try:
+        record.question_type = optional('type')
+        record.chapter = optional('chapter')
+        record.subtopic = optional('subtopic')
+        record.difficulty = optional('difficulty')
+        if data.get('partial_marking') is not None:
+            record.partial_marking = bool(data['partial_marking'])
+        record.text = text('text')
+        record.image = optional('image')
+        record.assertion = text('assertion')
+        record.reason = text('reason')
+        record.answer = text('answer')
+        record.tolerance = optional('tolerance')
+        for key, target in (('options', record.options), ('rows', record.rows), ('cols', record.cols)):
+            for c in data.get(key) or []:
+                target.append(ParsedChoice(label=str(c['label']), text=c.get('text') or '',
+                                           image=c.get('image') or None, line=line))
+        record.matrix_answers = {str(row): [str(c) for c in cols]
+                                 for row, cols in (data.get('matrix_answers') or {}).items()}
+        for s in data.get('solutions') or []:
+            record.solutions.append(ParsedSolution(text=s.get('text') or '', image=s.get('image') or None,
+                                                   line=line))
+    except (AttributeError, KeyError, TypeError) as e:
+        record.errors.append((f'malformed record: {e!r}', line))
+    return record
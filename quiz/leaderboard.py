@@ -0,0 +1,187 @@
+"""
+Per-quiz leaderboards: rank and percentile of a score, and the top k.
+
+A Leaderboard keeps each student's best completed score in a sorted list,
+so rank and percentile are a bisect and the top k is a slice. Leaderboards
+live in process memory:
+
+- built from the database the first time a quiz is looked up,
+- updated in place when an attempt completes in this process
+  (signals.attempt_completed),
+- synced with attempts completed by other processes at most every
+  SYNC_INTERVAL seconds, by an indexed query for recent completions.
+  Attempts the query may return again are remembered by id, so each is
+  counted once.
+
+Scores cannot be taken out of a leaderboard. Deleting attempts bumps the
+quiz's cache version (caching.py), which rebuilds the leaderboard of the
+process that deleted them; the others find out at their next sync, which
+also counts the quiz's completed attempts and rebuilds when the count
+differs from the attempts the leaderboard holds. That also catches an
+attempt committed too late for the sync query to see it.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import timedelta
+
+from . import metrics
+from .caching import quiz_version
+from .models import Attempt
+
+SYNC_INTERVAL = 2.0
+# completed_at is set just before the attempt is saved; an attempt committed
+# later than this after it would be missed by the sync query
+SYNC_OVERLAP = timedelta(seconds=30)
+MAX_LEADERBOARDS = 500
+
+_leaderboards = OrderedDict()
+_lock = threading.Lock()
+
+
+class Leaderboard:
+    def __init__(self, quiz_id, version):
+        self.quiz_id = quiz_id
+        self.version = version
+        # (-score, completed_at, user_id): best first, earlier first on ties
+        self.entries = []
+        self.best = {}
+        # Completed attempts counted in, and attempt id -> completed_at of
+        # those the next sync query may return again
+        self.attempts = 0
+        self.recent = {}
+        self.synced_through = None
+        self.synced_at = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, user_id, score, completed_at):
+        """
+        Records a completed attempt; returns True if it is the user's best.
+        """
+        entry = (-score, completed_at, user_id)
+        current = self.best.get(user_id)
+        if current is not None:
+            if current <= entry:
+                return False
+            del self.entries[bisect_left(self.entries, current)]
+        insort(self.entries, entry)
+        self.best[user_id] = entry
+        return True
+
+    def add_attempt(self, attempt_id, user_id, score, completed_at):
+        """
+        add() for a completed attempt, counting it once however often it
+        is seen.
+        """
+        if attempt_id in self.recent:
+            return
+        self.recent[attempt_id] = completed_at
+        self.attempts += 1
+        self.add(user_id, score, completed_at)
+
+    def best_score(self, user_id):
+        entry = self.best.get(user_id)
+        return None if entry is None else -entry[0]
+
+    def rank(self, score):
+        """
+        1 + the number of students whose best score beats score.
+        """
+        return bisect_left(self.entries, (-score,)) + 1
+
+    def percentile(self, score):
+        """
+        Share of students (in %) whose best score is at most score.
+        """
+        if not self.entries:
+            return None
+        return 100.0 * (len(self.entries) - bisect_left(self.entries, (-score,))) / len(self.entries)
+
+    def top(self, k):
+        """
+        [(user_id, score), ...] of the k best students.
+        """
+        return [(user_id, -neg_score) for neg_score, _, user_id in self.entries[:k]]
+
+    def completed(self):
+        return Attempt.objects.filter(quiz_id=self.quiz_id, completed_at__isnull=False)
+
+    def build(self):
+        """
+        Loads every completed attempt, sorting once instead of inserting.
+        """
+        best = {}
+        completed_ats = {}
+        self.synced_through = None
+        rows = self.completed().values_list('id', 'user_id', 'score', 'completed_at').iterator()
+        for attempt_id, user_id, score, completed_at in rows:
+            entry = (-score, completed_at, user_id)
+            if user_id not in best or entry < best[user_id]:
+                best[user_id] = entry
+            completed_ats[attempt_id] = completed_at
+            if self.synced_through is None or completed_at > self.synced_through:
+                self.synced_through = completed_at
+        self.best = best
+        self.entries = sorted(best.values())
+        self.attempts = len(completed_ats)
+        self.recent = completed_ats
+        self._forget_old()
+        self.synced_at = time.monotonic()
+
+    def _forget_old(self):
+        if self.synced_through is None:
+            self.recent = {}
+            return
+        horizon = self.synced_through - SYNC_OVERLAP
+        self.recent = {attempt_id: at for attempt_id, at in self.recent.items() if at > horizon}
+
+    def sync(self):
+        if self.synced_through is None:
+            self.build()
+            return
+        completed = self.completed()
+        rows = completed.filter(completed_at__gt=self.synced_through - SYNC_OVERLAP).values_list(
+            'id', 'user_id', 'score', 'completed_at')
+        for attempt_id, user_id, score, completed_at in rows:
+            self.add_attempt(attempt_id, user_id, score, completed_at)
+            self.synced_through = max(self.synced_through, completed_at)
+        if completed.count() != self.attempts:
+            # Attempts were deleted, or one was committed too late to be seen
+            self.build()
+            return
+        self._forget_old()
+        self.synced_at = time.monotonic()
+
+
+def get_leaderboard(quiz_id):
+    """
+    The up-to-date Leaderboard of a quiz.
+    """
+    version = quiz_version(quiz_id)
+    with _lock:
+        board = _leaderboards.get(quiz_id)
+        hit = board is not None and board.version == version
+        if not hit:
+            board = _leaderboards[quiz_id] = Leaderboard(quiz_id, version)
+        _leaderboards.move_to_end(quiz_id)
+        while len(_leaderboards) > MAX_LEADERBOARDS:
+            _leaderboards.popitem(last=False)
+    metrics.cache_lookup('leaderboard', hit)
+    with board.lock:
+        if board.synced_at is None or time.monotonic() - board.synced_at >= SYNC_INTERVAL:
+            board.sync()
+    return board
+
+
+def record_attempt(attempt):
+    """
+    Adds a just-completed attempt to this process's leaderboard, if loaded.
+    """
+    board = _leaderboards.get(attempt.quiz_id)
+    if board is not None:
+        with board.lock:
+            board.add_attempt(attempt.id, attempt.user_id, attempt.score, attempt.completed_at)
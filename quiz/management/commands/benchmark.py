@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from quiz import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Time grading, submit, result, question bank, test generation and LaTeX import at several sizes '
+        'on a throwaway test database, and compare wall time and query counts with the stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run (all by default)')
+        parser.add_argument('--quick', action='store_true', help='Only the two smallest sizes of each')
+        parser.add_argument('--repeat', type=int, default=5, help='Repetitions per size (median is kept)')
+        parser.add_argument('--budget', type=float, default=10.0,
+                            help='Stop repeating a size once it has taken this many seconds')
+        parser.add_argument('--baseline', type=str, default=str(benchmarks.BASELINE_PATH))
+        parser.add_argument('--tolerance', type=float, default=2.0,
+                            help='A time this many times the baseline is a regression')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write these results to the baseline instead of comparing')
+        parser.add_argument('--json', type=str, help='Also write the results as JSON here')
+
+    def handle(self, *args, **options):
+        baseline = benchmarks.load_baseline(options['baseline'])
+
+        def report(result):
+            expected = baseline.get(result.key)
+            against = (f'   (baseline {expected["seconds"] * 1000:9.1f} ms {expected["queries"]:6d} queries)'
+                       if expected else '')
+            self.stdout.write(f'{result.key:<30}{result.seconds * 1000:10.1f} ms {result.queries:6d} queries'
+                              f' x{result.repeats}{against}')
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False):
+                results = benchmarks.run(options['names'], quick=options['quick'], repeat=options['repeat'],
+                                         budget=options['budget'], on_result=report)
+        except KeyError as e:
+            raise CommandError(e.args[0])
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(f'Benchmark failed: {e}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(benchmarks.as_json(results), f, indent=2)
+
+        if options['save_baseline']:
+            benchmarks.save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'Saved {len(results)} results to {options["baseline"]}'))
+            return
+
+        regressions = benchmarks.compare(results, baseline, options['tolerance'])
+        for result, message in regressions:
+            self.stderr.write(self.style.ERROR(f'{result.key}: {message}'))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+        compared = sum(1 for result in results if result.key in baseline)
+        self.stdout.write(self.style.SUCCESS(f'No regressions ({compared} of {len(results)} results had a baseline)'))
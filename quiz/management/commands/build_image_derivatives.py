@@ -0,0 +1,37 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz import derivatives
+from quiz.models import Passage, Question, Option, MatrixRow, MatrixCol, SolutionBlock
+from quiz.storage import get_image_storage
+
+IMAGE_MODELS = (Passage, Question, Option, MatrixRow, MatrixCol, SolutionBlock)
+
+
+class Command(BaseCommand):
+    help = 'Build the resized WebP/JPEG variants used in srcset for stored images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes resizing images (1 = no pool)')
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild variants that already exist')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in IMAGE_MODELS:
+            names.update(model.objects.exclude(image='').exclude(image__isnull=True)
+                         .values_list('image', flat=True).distinct())
+        self.stdout.write(f'{len(names)} stored images, building variants with {options["workers"]} worker(s)...')
+
+        started = time.perf_counter()
+        built, failed = derivatives.build(
+            sorted(names), get_image_storage(), workers=options['workers'], force=options['force'],
+            on_error=lambda message: self.stderr.write(self.style.WARNING(message)),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Built variants for {built} images in {time.perf_counter() - started:.2f}s'
+            + (f', {failed} failed' if failed else '')
+        ))
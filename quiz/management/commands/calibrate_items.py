@@ -0,0 +1,128 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from quiz.calibration import RASCH, TWO_PL, load_response_matrix, fit, difficulty_label
+from quiz.models import Question, Response
+
+
+class Command(BaseCommand):
+    help = 'Calibrate question difficulty/discrimination (Rasch or 2PL) from graded responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=[RASCH, TWO_PL], default=RASCH)
+        parser.add_argument('--min-responses', type=int, default=30,
+                            help='Skip questions with fewer graded responses than this')
+        parser.add_argument('--max-iter', type=int, default=100)
+        parser.add_argument('--tol', type=float, default=1e-4)
+        parser.add_argument('--incremental', action='store_true',
+                            help='Warm-start from stored parameters and only refit questions '
+                                 'answered since the last calibration')
+        parser.add_argument('--update-labels', action='store_true',
+                            help='Also overwrite the difficulty label from the calibrated value')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        model = options['model']
+        started = time.perf_counter()
+
+        if options['incremental']:
+            cutoff = Question.objects.aggregate(last=Max('irt_calibrated_at'))['last']
+            if cutoff and not Response.objects.filter(attempt__completed_at__gt=cutoff).exists():
+                self.stdout.write(self.style.SUCCESS('No new responses since the last calibration'))
+                return
+
+        matrix = load_response_matrix()
+        if matrix.n_responses == 0:
+            raise CommandError('No graded responses found')
+        loaded = time.perf_counter()
+        self.stdout.write(
+            f'Loaded {matrix.n_responses} graded responses '
+            f'({len(matrix.user_ids)} students x {len(matrix.question_ids)} questions) '
+            f'in {loaded - started:.1f}s'
+        )
+
+        init_b = init_a = fixed = None
+        if options['incremental']:
+            init_b, init_a, fixed = self.incremental_state(matrix.question_ids)
+            self.stdout.write(f'Incremental refit: {int((~fixed).sum())} questions to refit, '
+                              f'{int(fixed.sum())} anchored')
+            if fixed.all():
+                self.stdout.write(self.style.SUCCESS('Nothing to refit'))
+                return
+
+        result = fit(matrix, model=model, max_iter=options['max_iter'], tol=options['tol'],
+                     init_b=init_b, init_a=init_a, fixed=fixed)
+        fitted = time.perf_counter()
+        status = 'converged' if result.converged else 'did not converge'
+        self.stdout.write(f'Fit {model} in {fitted - loaded:.1f}s ({result.iterations} iterations, {status})')
+
+        write = result.estimable & (result.n_responses >= options['min_responses'])
+        if fixed is not None:
+            write &= ~fixed
+
+        now = timezone.now()
+        params = {
+            int(qid): (float(b), float(a))
+            for qid, b, a in zip(result.question_ids[write], result.difficulty[write], result.discrimination[write])
+        }
+        fields = ['irt_difficulty', 'irt_discrimination', 'irt_calibrated_at']
+        if options['update_labels']:
+            fields.append('difficulty')
+
+        updated = 0
+        ids = list(params)
+        for i in range(0, len(ids), options['batch_size']):
+            batch = list(Question.objects.filter(id__in=ids[i:i + options['batch_size']]).only('id', 'difficulty'))
+            for question in batch:
+                b, a = params[question.id]
+                question.irt_difficulty = b
+                question.irt_discrimination = a if model == TWO_PL else None
+                question.irt_calibrated_at = now
+                if options['update_labels']:
+                    question.difficulty = difficulty_label(b)
+            updated += Question.objects.bulk_update(batch, fields)
+
+        skipped = int((~write).sum()) - (int(fixed.sum()) if fixed is not None else 0)
+        self.stdout.write(self.style.SUCCESS(
+            f'Calibrated {updated} questions in {time.perf_counter() - started:.1f}s '
+            f'({skipped} skipped: too few responses or all-correct/all-wrong)'
+        ))
+
+    def incremental_state(self, question_ids):
+        """
+        Returns (init_b, init_a, fixed) aligned with question_ids.
+
+        Questions that already have parameters and no responses from attempts
+        completed after the last calibration are held fixed as anchors.
+        """
+        n = len(question_ids)
+        init_b = np.full(n, np.nan)
+        init_a = np.full(n, np.nan)
+        fixed = np.zeros(n, dtype=bool)
+        index = {int(qid): i for i, qid in enumerate(question_ids)}
+
+        cutoff = Question.objects.aggregate(last=Max('irt_calibrated_at'))['last']
+        if cutoff is None:
+            return init_b, init_a, fixed
+
+        stored = Question.objects.filter(irt_difficulty__isnull=False).values_list(
+            'id', 'irt_difficulty', 'irt_discrimination'
+        )
+        for qid, b, a in stored.iterator():
+            i = index.get(qid)
+            if i is None:
+                continue
+            init_b[i] = b
+            init_a[i] = a if a is not None else np.nan
+            fixed[i] = True
+
+        touched = Response.objects.filter(attempt__completed_at__gt=cutoff).values_list('question_id', flat=True).distinct()
+        for qid in touched.iterator():
+            i = index.get(qid)
+            if i is not None:
+                fixed[i] = False
+        return init_b, init_a, fixed
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.bundles import BundleWriter
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Export quizzes with their questions, passages and images as a portable zip bundle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int)
+        parser.add_argument('--all', action='store_true', help='Export every quiz')
+        parser.add_argument('-o', '--output', type=str, required=True,
+                            help='Bundle file to write, or - for stdout')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Questions fetched (with their children) per query')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            quizzes = Quiz.objects.order_by('id')
+        elif options['quiz_ids']:
+            quizzes = Quiz.objects.filter(id__in=options['quiz_ids']).order_by('id')
+            missing = set(options['quiz_ids']) - set(quizzes.values_list('id', flat=True))
+            if missing:
+                raise CommandError(f'Quiz not found: {", ".join(map(str, sorted(missing)))}')
+        else:
+            raise CommandError('Give quiz ids or --all')
+
+        started = time.perf_counter()
+        output = options['output']
+        if output == '-':
+            manifest = BundleWriter(sys.stdout.buffer, chunk_size=options['chunk_size']).write(quizzes)
+            return
+        with open(output, 'wb') as f:
+            manifest = BundleWriter(f, chunk_size=options['chunk_size']).write(quizzes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {manifest["quizzes"]} quizzes, {manifest["passages"]} passages, '
+            f'{manifest["questions"]} questions and {manifest["media"]} images to {output} '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz.exporter import FORMATS, QuestionExporter, export_queryset
+from quiz.models import Question
+
+
+class Command(BaseCommand):
+    help = 'Export questions as LaTeX or JSON Lines that import_questions can read back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', type=str,
+                            help='File to write (default: stdout)')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Output format (default: from the output extension, else tex)')
+        parser.add_argument('--chapter', action='append', default=[],
+                            choices=[c for c, _ in Question.CHAPTER_CHOICES], help='Repeatable')
+        parser.add_argument('--type', action='append', default=[], dest='types',
+                            choices=Question.Type.values, help='Repeatable')
+        parser.add_argument('--difficulty', action='append', default=[],
+                            choices=[d for d, _ in Question.DIFFICULTY_CHOICES], help='Repeatable')
+        parser.add_argument('--include-retired', action='store_true')
+        parser.add_argument('--media-dir', type=str,
+                            help='Copy images here and reference the copies instead of MEDIA_ROOT')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Questions fetched (with their children) per query')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format']
+        if not fmt:
+            fmt = 'jsonl' if output and output.endswith('.jsonl') else 'tex'
+
+        questions = Question.objects.all()
+        if options['chapter']:
+            questions = questions.filter(chapter__in=options['chapter'])
+        if options['types']:
+            questions = questions.filter(question_type__in=options['types'])
+        if options['difficulty']:
+            questions = questions.filter(difficulty__in=options['difficulty'])
+        if not options['include_retired']:
+            questions = questions.filter(is_retired=False)
+
+        started = time.perf_counter()
+        out = open(output, 'w', encoding='utf-8') if output else sys.stdout
+        # Without an output file, image paths are written as absolute paths
+        out_dir = os.path.dirname(os.path.abspath(output)) if output else None
+        skipped = 0
+        try:
+            exporter = QuestionExporter(out, fmt, out_dir, media_dir=options['media_dir'])
+            for question in export_queryset(questions).iterator(chunk_size=options['chunk_size']):
+                try:
+                    exporter.write(question)
+                except ValueError as e:
+                    skipped += 1
+                    self.stderr.write(self.style.WARNING(f'Skipped {e}'))
+        finally:
+            if output:
+                out.close()
+
+        if output:
+            self.stdout.write(self.style.SUCCESS(
+                f'Exported {exporter.questions} questions and {exporter.images} images to {output} '
+                f'in {time.perf_counter() - started:.2f}s'
+            ))
+        if skipped:
+            self.stderr.write(self.style.WARNING(f'{skipped} questions could not be exported'))
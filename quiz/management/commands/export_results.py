@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz import results_export
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Export the attempts or responses of a quiz as CSV or Parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('--kind', choices=results_export.KINDS, default=results_export.ATTEMPTS,
+                            help='One row per attempt, or one row per response')
+        parser.add_argument('--format', choices=results_export.FORMATS, default=None,
+                            help='Defaults to the output file extension, else csv')
+        parser.add_argument('-o', '--output', type=str, default='-',
+                            help='File to write, or - for stdout (default)')
+
+    def handle(self, *args, **options):
+        if not Quiz.objects.filter(pk=options['quiz_id']).exists():
+            raise CommandError(f'Quiz {options["quiz_id"]} does not exist')
+        output = options['output']
+        fmt = options['format']
+        if fmt is None:
+            ext = os.path.splitext(output)[1].lstrip('.').lower()
+            fmt = ext if ext in results_export.FORMATS else results_export.CSV
+
+        try:
+            chunks = results_export.stream(options['kind'], fmt, options['quiz_id'])
+        except results_export.ExportError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        if output == '-':
+            if fmt == results_export.CSV:
+                for chunk in chunks:
+                    sys.stdout.write(chunk)
+            else:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+            return
+
+        size = 0
+        if fmt == results_export.CSV:
+            with open(output, 'w', newline='', encoding='utf-8') as f:
+                for chunk in chunks:
+                    size += f.write(chunk)
+        else:
+            with open(output, 'wb') as f:
+                for chunk in chunks:
+                    size += f.write(chunk)
+        self.stderr.write(self.style.SUCCESS(
+            f'Wrote {options["kind"]} of quiz {options["quiz_id"]} to {output} '
+            f'({size} {"characters" if fmt == results_export.CSV else "bytes"}) '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
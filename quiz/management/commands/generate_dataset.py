@@ -0,0 +1,41 @@
+import dataclasses
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.synthetic import DatasetSizes, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic question bank, quizzes, groups, students, attempts and responses '
+        'for benchmarks, load tests and staging'
+    )
+
+    def add_arguments(self, parser):
+        defaults = DatasetSizes()
+        for size in dataclasses.fields(DatasetSizes):
+            parser.add_argument(f'--{size.name.replace("_", "-")}', type=size.type,
+                                default=getattr(defaults, size.name))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', type=str, default='synthetic-',
+                            help='Prefix of the generated usernames, group names and quiz titles')
+        parser.add_argument('--password', type=str, default='synthetic',
+                            help='Password of every generated student')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        if get_user_model().objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f'Users named {options["prefix"]}* already exist; pick another --prefix')
+        sizes = DatasetSizes(**{size.name: options[size.name] for size in dataclasses.fields(DatasetSizes)})
+        self.stdout.write(f'Generating with seed {options["seed"]}: ' + ', '.join(
+            f'{name}={value}' for name, value in dataclasses.asdict(sizes).items()))
+
+        started = time.perf_counter()
+        counts = generate(sizes, seed=options['seed'], prefix=options['prefix'], password=options['password'],
+                          batch_size=options['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            'Created ' + ', '.join(f'{n} {name}' for name, n in counts.items()) +
+            f' in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,53 @@
+import os
+import time
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from quiz import derivatives
+from quiz.bundles import BundleError, BundleReader
+from quiz.storage import get_image_storage
+
+
+class Command(BaseCommand):
+    help = 'Import a quiz bundle written by export_bundle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bundle', type=str)
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Records written per bulk insert')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Processes building the resized image variants')
+        parser.add_argument('--no-derivatives', action='store_true',
+                            help='Do not build the resized image variants')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        reader = BundleReader(
+            options['bundle'],
+            batch_size=options['batch_size'],
+            on_warning=lambda message: self.stderr.write(self.style.WARNING(message)),
+        )
+        try:
+            # All or nothing; images written before a failure are harmless,
+            # their names are derived from their content
+            with transaction.atomic():
+                counts = reader.load()
+        except (BundleError, OSError) as e:
+            raise CommandError(str(e))
+        except zipfile.BadZipFile as e:
+            raise CommandError(f'{options["bundle"]}: {e}')
+
+        if reader.stored and not options['no_derivatives']:
+            derivatives.build(
+                reader.stored.values(), get_image_storage(), workers=options['workers'],
+                on_error=lambda message: self.stderr.write(self.style.WARNING(message)),
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {counts["quizzes"]} quizzes, {counts["passages"]} passages, '
+            f'{counts["questions"]} questions ({counts["options"]} options, {counts["matrix_rows"]} matrix rows, '
+            f'{counts["matrix_cols"]} matrix columns, {counts["solution_blocks"]} solution blocks) '
+            f'and {counts["media"]} new images in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,117 @@
+import argparse
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from quiz.models import Attempt, Quiz
+from quiz.simulation import percentile
+
+USERNAME_PREFIX = 'loadtest-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate many students autosaving answers to a quiz at once through the '
+        'single-question view, and report latency and database lock errors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--saves', type=int, default=20, help='Answers saved per student')
+        parser.add_argument('--think', type=float, default=0.05,
+                            help='Mean seconds between a student\'s saves')
+        parser.add_argument('--serialize-writes', action=argparse.BooleanOptionalAction, default=None,
+                            help='Override QUIZ_SERIALIZE_WRITES for the run')
+        parser.add_argument('--keep', action='store_true', help='Keep the attempts made by the run')
+
+    def handle(self, *args, **options):
+        quiz = Quiz.objects.filter(pk=options['quiz_id']).first()
+        if quiz is None:
+            raise CommandError(f'Quiz {options["quiz_id"]} does not exist')
+        questions = list(quiz.questions.order_by('quizquestion__order', 'id').prefetch_related('options'))
+        if not questions:
+            raise CommandError(f'Quiz {quiz.id} has no questions')
+        if connection.vendor == 'sqlite':
+            mode = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+            self.stdout.write(f'SQLite journal_mode={mode}')
+
+        User = get_user_model()
+        students = []
+        for i in range(options['students']):
+            user, _ = User.objects.get_or_create(username=f'{USERNAME_PREFIX}{i}')
+            students.append(user)
+        quiz.assigned_students.add(*students)
+        Attempt.objects.filter(user__in=students, quiz=quiz, completed_at__isnull=True).delete()
+
+        latencies = []
+        errors = Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(len(students))
+
+        def student(user):
+            client = Client()
+            client.force_login(user)
+            rng = random.Random(user.id)
+            start.wait()
+            try:
+                for _ in range(options['saves']):
+                    time.sleep(rng.expovariate(1 / options['think']) if options['think'] else 0)
+                    index = rng.randrange(len(questions)) + 1
+                    question = questions[index - 1]
+                    options_ids = [str(o.id) for o in question.options.all()]
+                    answer = [rng.choice(options_ids)] if options_ids else [str(rng.randint(0, 99))]
+                    began = time.perf_counter()
+                    try:
+                        response = client.post(
+                            reverse('take_quiz_single', args=(quiz.id, index)),
+                            {'action': 'save_next', f'question_{question.id}': answer},
+                        )
+                        outcome = None if response.status_code in (200, 302) else f'HTTP {response.status_code}'
+                    except Exception as e:
+                        outcome = f'{type(e).__name__}: {e}'
+                    with lock:
+                        latencies.append(time.perf_counter() - began)
+                        if outcome:
+                            errors[outcome] += 1
+            finally:
+                close_old_connections()
+
+        serialize = options['serialize_writes']
+        if serialize is None:
+            serialize = getattr(settings, 'QUIZ_SERIALIZE_WRITES', False)
+        self.stdout.write(f'{len(students)} students x {options["saves"]} saves, '
+                          f'serialized writes {"on" if serialize else "off"}')
+        with override_settings(QUIZ_SERIALIZE_WRITES=serialize):
+            began = time.perf_counter()
+            threads = [threading.Thread(target=student, args=(user,)) for user in students]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - began
+
+        if not options['keep']:
+            Attempt.objects.filter(user__in=students, quiz=quiz).delete()
+
+        latencies.sort()
+        p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        self.stdout.write(
+            f'{len(latencies)} saves in {elapsed:.1f}s ({len(latencies) / elapsed:.0f}/s); '
+            f'latency ms p50 {p50:.0f}, p95 {p95:.0f}, p99 {p99:.0f}, '
+            f'max {latencies[-1] * 1000:.0f}, mean {statistics.fmean(latencies) * 1000:.0f}'
+        )
+        locked = sum(n for error, n in errors.items() if 'locked' in error)
+        for error, n in errors.most_common():
+            self.stdout.write(self.style.ERROR(f'{n} x {error}'))
+        style = self.style.ERROR if locked else self.style.SUCCESS
+        self.stdout.write(style(f'{locked} "database is locked" errors, {sum(errors.values())} errors in all'))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from quiz.mastery import AttemptGrader
+from quiz.models import Attempt, ChapterMastery
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-student chapter mastery table from completed attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only rebuild this user id (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Attempts graded and written per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        attempts = Attempt.objects.filter(completed_at__isnull=False)
+        rows = ChapterMastery.objects.all()
+        if options['users']:
+            attempts = attempts.filter(user_id__in=options['users'])
+            rows = rows.filter(user_id__in=options['users'])
+
+        # Attempts completed while this runs add themselves after the
+        # delete; take the list first so they are not counted twice
+        with transaction.atomic():
+            todo = list(attempts.order_by('id').values_list('id', 'user_id', 'quiz_id'))
+            deleted, _ = rows.delete()
+        self.stdout.write(f'Cleared {deleted} rows; rebuilding from {len(todo)} attempts')
+
+        grader = AttemptGrader()
+        size = options['chunk_size']
+        for i in range(0, len(todo), size):
+            deltas = grader.deltas(todo[i:i + size])
+            with transaction.atomic():
+                deltas.apply()
+            self.stdout.write(f'  {min(i + size, len(todo))}/{len(todo)} attempts')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt chapter mastery from {len(todo)} attempts in {time.perf_counter() - started:.1f}s'
+        ))
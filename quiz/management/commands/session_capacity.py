@@ -0,0 +1,201 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from quiz.models import Attempt, Quiz
+from quiz.simulation import Recorder, form_answer, percentile, view_name
+
+USERNAME_PREFIX = 'capacity-'
+
+
+class SyncSession:
+    """
+    The exam page as it works without the async views: a save posts the
+    form to take_quiz_single and reloads the page, and the page is the only
+    way to learn the remaining time and the palette. Requests run on the
+    command's worker threads, like a WSGI process with that many threads.
+    """
+
+    def __init__(self, user, quiz, pool):
+        self.quiz = quiz
+        self.pool = pool
+        self.client = Client()
+        self.client.force_login(user)
+        self.index = 1
+
+    async def request(self, method, path, data=None):
+        send = self.client.post if method == 'POST' else self.client.get
+        response = await asyncio.get_running_loop().run_in_executor(self.pool, partial(send, path, data))
+        return response.status_code, response.get('Location')
+
+    def save(self, index, question, answer):
+        self.index = index
+        return [('POST', reverse('take_quiz_single', args=(self.quiz.id, index)), dict(answer, action='save_next'))]
+
+    def heartbeat(self):
+        return [('GET', reverse('take_quiz_single', args=(self.quiz.id, self.index)), None)]
+
+
+class AsyncSession:
+    """
+    The exam page with the async views: a save is an autosave followed by a
+    palette refresh, and the timer asks heartbeat. Requests go through the
+    ASGI handler on the event loop.
+    """
+
+    def __init__(self, user, attempt):
+        self.user = user
+        self.attempt = attempt
+        self.client = AsyncClient()
+
+    async def login(self):
+        await self.client.aforce_login(self.user)
+
+    async def request(self, method, path, data=None):
+        response = await (self.client.post(path, data) if method == 'POST' else self.client.get(path))
+        return response.status_code, response.get('Location')
+
+    def save(self, index, question, answer):
+        return [
+            ('POST', reverse('autosave', args=(self.attempt.id,)), dict(answer, question=question.id)),
+            ('GET', reverse('palette', args=(self.attempt.id,)), None),
+        ]
+
+    def heartbeat(self):
+        return [('GET', reverse('heartbeat', args=(self.attempt.id,)), None)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare how many concurrent exam sessions one process can hold with the async autosave, '
+        'heartbeat and palette views against the sync exam page, at growing session counts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('--sessions', type=int, nargs='+', default=[50, 100, 200, 400],
+                            help='Concurrent sessions at each level')
+        parser.add_argument('--duration', type=float, default=15.0, help='Seconds each level runs')
+        parser.add_argument('--autosave', type=float, default=5.0,
+                            help='Mean seconds between a session\'s saves (exponentially distributed)')
+        parser.add_argument('--heartbeat', type=float, default=15.0, help='Seconds between a session\'s heartbeats')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads of the sync process')
+        parser.add_argument('--slo', type=float, default=250.0,
+                            help='p95 latency in ms under which a level counts as held')
+        parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        quiz = Quiz.objects.filter(pk=options['quiz_id']).first()
+        if quiz is None:
+            raise CommandError(f'Quiz {options["quiz_id"]} does not exist')
+        questions = list(quiz.questions.order_by('quizquestion__order', 'id').prefetch_related(
+            'options', 'matrix_rows', 'matrix_cols'))
+        if not questions:
+            raise CommandError(f'Quiz {quiz.id} has no questions')
+
+        User = get_user_model()
+        names = [f'{USERNAME_PREFIX}{i}' for i in range(max(options['sessions']))]
+        existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+        User.objects.bulk_create([User(username=name) for name in names if name not in existing])
+        users = list(User.objects.filter(username__in=names).order_by('id'))
+        quiz.assigned_students.add(*users)
+
+        modes = ['sync', 'async'] if options['mode'] == 'both' else [options['mode']]
+        self.stdout.write(f'{len(questions)} questions; a save every {options["autosave"]}s and a heartbeat every '
+                          f'{options["heartbeat"]}s per session, {options["duration"]}s per level, '
+                          f'sync with {options["threads"]} threads, p95 target {options["slo"]:.0f} ms')
+        self.stdout.write(f'{"mode":<7}{"sessions":>9}{"requests":>10}{"per s":>8}{"p50 ms":>9}{"p95 ms":>9}'
+                          f'{"p99 ms":>9}{"errors":>8}')
+        held = {mode: 0 for mode in modes}
+        try:
+            for count in sorted(options['sessions']):
+                for mode in modes:
+                    sessions_users = users[:count]
+                    Attempt.objects.filter(user__in=sessions_users, quiz=quiz).delete()
+                    attempts = Attempt.objects.bulk_create([Attempt(user=user, quiz=quiz) for user in sessions_users])
+                    recorder, elapsed = self.run_level(mode, quiz, questions, sessions_users, attempts, options)
+                    latencies = sorted(v for values in recorder.latencies.values() for v in values)
+                    errors = sum(recorder.errors.values())
+                    p50, p95, p99 = (percentile(latencies, p) * 1000 if latencies else 0 for p in (50, 95, 99))
+                    ok = latencies and not errors and p95 <= options['slo']
+                    if ok:
+                        held[mode] = max(held[mode], count)
+                    style = self.style.SUCCESS if ok else self.style.ERROR
+                    self.stdout.write(style(
+                        f'{mode:<7}{count:>9}{len(latencies):>10}{len(latencies) / elapsed:>8.0f}{p50:>9.0f}'
+                        f'{p95:>9.0f}{p99:>9.0f}{errors:>8}'
+                    ))
+                    for (view, error), n in recorder.errors.most_common(3):
+                        self.stdout.write(self.style.ERROR(f'  {n} x {view}: {error}'))
+        finally:
+            Attempt.objects.filter(user__in=users, quiz=quiz).delete()
+
+        for mode in modes:
+            self.stdout.write(f'{mode}: held up to {held[mode]} sessions within p95 {options["slo"]:.0f} ms')
+
+    def run_level(self, mode, quiz, questions, users, attempts, options):
+        recorder = Recorder()
+        pool = ThreadPoolExecutor(options['threads']) if mode == 'sync' else None
+        if mode == 'sync':
+            sessions = [SyncSession(user, quiz, pool) for user in users]
+        else:
+            sessions = [AsyncSession(user, attempt) for user, attempt in zip(users, attempts)]
+
+        async def main():
+            if mode == 'async':
+                await asyncio.gather(*(session.login() for session in sessions))
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + options['duration']
+            await asyncio.gather(*(
+                self.run_session(session, questions, recorder, random.Random(options['seed'] * 1000003 + i),
+                                 deadline, options)
+                for i, session in enumerate(sessions)
+            ))
+
+        started = time.perf_counter()
+        try:
+            asyncio.run(main())
+        finally:
+            if pool is not None:
+                # Each worker thread opened its own connection
+                for _ in range(options['threads']):
+                    pool.submit(connections.close_all)
+                pool.shutdown()
+        return recorder, time.perf_counter() - started
+
+    async def run_session(self, session, questions, recorder, rng, deadline, options):
+        loop = asyncio.get_running_loop()
+        next_save = loop.time() + rng.expovariate(1 / options['autosave'])
+        next_beat = loop.time() + rng.uniform(0, options['heartbeat'])
+        while min(next_save, next_beat) < deadline:
+            await asyncio.sleep(max(0.0, min(next_save, next_beat) - loop.time()))
+            if next_save <= next_beat:
+                index = rng.randrange(len(questions)) + 1
+                question = questions[index - 1]
+                steps = session.save(index, question, form_answer(question, rng, 0.6))
+                next_save = loop.time() + rng.expovariate(1 / options['autosave'])
+            else:
+                steps = session.heartbeat()
+                next_beat += options['heartbeat']
+            for method, path, data in steps:
+                started = time.perf_counter()
+                try:
+                    status, location = await session.request(method, path, data)
+                    error = None if status in (200, 302) else f'HTTP {status}'
+                except Exception as e:
+                    location, error = None, f'{type(e).__name__}: {e}'
+                recorder.record(f'{method} {view_name(path)}', time.perf_counter() - started, error)
+                if error:
+                    break
+                if location:
+                    # The sync page reloads after a save, like the browser
+                    steps.append(('GET', location, None))
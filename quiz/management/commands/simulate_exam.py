@@ -0,0 +1,104 @@
+import random
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from quiz.models import Attempt, Quiz
+from quiz.simulation import HttpTransport, Recorder, Student, TestClientTransport
+
+USERNAME_PREFIX = 'sim-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate N students taking a quiz end to end (take_quiz_single, submit_quiz, result) '
+        'and report latency percentiles per view, throughput and errors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('--students', type=int, default=50)
+        parser.add_argument('--think', type=float, default=3.0,
+                            help='Mean seconds spent on each question (exponentially distributed)')
+        parser.add_argument('--ramp', type=float, default=10.0,
+                            help='Seconds over which the students start')
+        parser.add_argument('--skill', type=float, default=0.6, help='Chance of answering a question correctly')
+        parser.add_argument('--url', type=str, default=None,
+                            help='Base URL of a running server; by default requests go through the test client')
+        parser.add_argument('--password', type=str, default='simulated-student',
+                            help='Password given to the simulated students, for --url')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the attempts made by the run')
+
+    def handle(self, *args, **options):
+        quiz = Quiz.objects.filter(pk=options['quiz_id']).first()
+        if quiz is None:
+            raise CommandError(f'Quiz {options["quiz_id"]} does not exist')
+        questions = list(quiz.questions.order_by('quizquestion__order', 'id').prefetch_related(
+            'options', 'matrix_rows', 'matrix_cols'))
+        if not questions:
+            raise CommandError(f'Quiz {quiz.id} has no questions')
+
+        User = get_user_model()
+        names = [f'{USERNAME_PREFIX}{i}' for i in range(options['students'])]
+        existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+        # One hash for everyone: hashing per user would take minutes
+        password = make_password(options['password'])
+        User.objects.bulk_create([User(username=name, password=password) for name in names if name not in existing])
+        User.objects.filter(username__in=names).update(password=password)
+        students = list(User.objects.filter(username__in=names))
+        quiz.assigned_students.add(*students)
+        Attempt.objects.filter(user__in=students, quiz=quiz, completed_at__isnull=True).delete()
+
+        recorder = Recorder()
+        finished = []
+        ramp = options['ramp'] / max(1, len(students))
+
+        def run(number, user):
+            rng = random.Random(options['seed'] * 1000003 + user.id)
+            time.sleep(number * ramp)
+            try:
+                if options['url']:
+                    transport = HttpTransport(options['url'], user.username, options['password'])
+                else:
+                    transport = TestClientTransport(user)
+                student = Student(transport, quiz, questions, recorder, rng,
+                                  think=options['think'], skill=options['skill'])
+                if student.take():
+                    finished.append(user.id)
+            except Exception as e:
+                recorder.record('login', 0.0, f'{type(e).__name__}: {e}')
+            finally:
+                close_old_connections()
+
+        target = options['url'] or 'the test client'
+        self.stdout.write(f'{len(students)} students, {len(questions)} questions, think {options["think"]}s, '
+                          f'ramp {options["ramp"]}s, via {target}')
+        started = time.perf_counter()
+        threads = [threading.Thread(target=run, args=(number, user)) for number, user in enumerate(students)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if not options['keep'] and not options['url']:
+            Attempt.objects.filter(user__in=students, quiz=quiz).delete()
+
+        summary = recorder.summary()
+        requests = sum(row[1] for row in summary)
+        self.stdout.write(f'{"view":<28}{"requests":>9}{"errors":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}')
+        for view, count, errors, p50, p95, p99, slowest in summary:
+            self.stdout.write(f'{view:<28}{count:>9}{errors:>8}{p50 * 1000:>9.0f}{p95 * 1000:>9.0f}'
+                              f'{p99 * 1000:>9.0f}{slowest * 1000:>9.0f}')
+        for (view, error), n in recorder.errors.most_common(10):
+            self.stdout.write(self.style.ERROR(f'{n} x {view}: {error}'))
+        style = self.style.ERROR if recorder.errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{len(finished)}/{len(students)} exams completed in {elapsed:.1f}s; '
+            f'{requests} requests, {requests / elapsed:.1f}/s, {sum(recorder.errors.values())} errors'
+        ))
@@ -0,0 +1,140 @@
+"""
+Per-student chapter mastery: ChapterMastery totals by (chapter, difficulty).
+
+Rows are only ever incremented. calculate_final_score adds each attempt in
+the transaction that completes it; rebuild_mastery clears the table and
+adds every completed attempt again in chunks. Deleting a completed attempt
+rebuilds its student's rows (rebuild_user).
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from .grading import chunked, grade, load_answer_keys
+from .models import Attempt, ChapterMastery, Question, QuizQuestion, Response
+
+CHAPTER_NAMES = dict(Question.CHAPTER_CHOICES)
+
+
+class MasteryDeltas:
+    """
+    Increments to apply, keyed by (user_id, chapter, difficulty).
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+    def __bool__(self):
+        return bool(self.totals)
+
+    def add(self, user_id, chapter, difficulty, answer_data, marks, is_correct):
+        if not answer_data:
+            return
+        entry = self.totals.setdefault((user_id, chapter or '', difficulty), [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += bool(is_correct)
+        entry[2] += marks
+
+    def apply(self):
+        """
+        Adds the totals to ChapterMastery. Call inside a transaction: missing
+        rows are created empty first, so the increments always run against
+        locked existing rows whatever other writers are doing.
+        """
+        if not self.totals:
+            return
+        ChapterMastery.objects.bulk_create(
+            [ChapterMastery(user_id=user_id, chapter=chapter, difficulty=difficulty)
+             for user_id, chapter, difficulty in self.totals],
+            ignore_conflicts=True,
+        )
+        rows = []
+        for user_ids in chunked({user_id for user_id, _, _ in self.totals}):
+            for row in ChapterMastery.objects.select_for_update().filter(user_id__in=user_ids):
+                delta = self.totals.get((row.user_id, row.chapter, row.difficulty))
+                if delta is not None:
+                    row.attempted += delta[0]
+                    row.correct += delta[1]
+                    row.marks += delta[2]
+                    rows.append(row)
+        ChapterMastery.objects.bulk_update(rows, ['attempted', 'correct', 'marks'])
+
+
+class AttemptGrader:
+    """
+    Grades completed attempts into MasteryDeltas the way calculate_final_score
+    does, keeping answer keys, chapters and marks across calls.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.questions = {}
+        self.marks = {}
+
+    def deltas(self, attempts):
+        """
+        attempts are (attempt_id, user_id, quiz_id) tuples.
+        """
+        owners = {attempt_id: (user_id, quiz_id) for attempt_id, user_id, quiz_id in attempts}
+        quiz_ids = {quiz_id for _, quiz_id in owners.values()} - {quiz_id for quiz_id, _ in self.marks}
+        for quiz_id, question_id, q_marks, q_neg in QuizQuestion.objects.filter(
+                quiz_id__in=quiz_ids).values_list('quiz_id', 'question_id', 'marks', 'negative_marks'):
+            self.marks[quiz_id, question_id] = (q_marks, q_neg)
+
+        responses = list(Response.objects.filter(attempt_id__in=owners).values_list(
+            'attempt_id', 'question_id', 'answer_data'))
+        new_ids = {question_id for _, question_id, _ in responses} - self.keys.keys()
+        self.keys.update(load_answer_keys(new_ids))
+        self.questions.update(
+            (qid, (chapter, difficulty)) for qid, chapter, difficulty in
+            Question.objects.filter(id__in=new_ids).values_list('id', 'chapter', 'difficulty')
+        )
+
+        deltas = MasteryDeltas()
+        for attempt_id, question_id, answer_data in responses:
+            user_id, quiz_id = owners[attempt_id]
+            # Only questions still in the quiz count, as in calculate_final_score
+            if (quiz_id, question_id) not in self.marks or question_id not in self.keys:
+                continue
+            awarded, is_correct = grade(self.keys[question_id], answer_data, *self.marks[quiz_id, question_id])
+            deltas.add(user_id, *self.questions[question_id], answer_data, awarded, is_correct)
+        return deltas
+
+
+def rebuild_user(user_id):
+    """
+    Replaces one student's rows with the totals of their completed attempts.
+    """
+    with transaction.atomic():
+        attempts = list(Attempt.objects.filter(user_id=user_id, completed_at__isnull=False)
+                        .values_list('id', 'user_id', 'quiz_id'))
+        ChapterMastery.objects.filter(user_id=user_id).delete()
+        AttemptGrader().deltas(attempts).apply()
+
+
+@dataclass
+class ChapterSummary:
+    chapter: str
+    name: str
+    attempted: int = 0
+    correct: int = 0
+    marks: float = 0.0
+
+    @property
+    def accuracy(self):
+        return 100.0 * self.correct / self.attempted if self.attempted else None
+
+
+def chapter_summary(user):
+    """
+    The user's totals per chapter (difficulties summed), weakest first.
+    """
+    chapters = {}
+    for chapter, attempted, correct, marks in ChapterMastery.objects.filter(user=user).values_list(
+            'chapter', 'attempted', 'correct', 'marks'):
+        summary = chapters.setdefault(chapter, ChapterSummary(chapter, CHAPTER_NAMES.get(chapter, 'No chapter')))
+        summary.attempted += attempted
+        summary.correct += correct
+        summary.marks += marks
+    return sorted((s for s in chapters.values() if s.attempted),
+                  key=lambda s: (s.accuracy, -s.attempted))
@@ -0,0 +1,272 @@
+"""
+Prometheus metrics at /metrics, in the text exposition format, without a
+client library or any other service.
+
+Each process keeps its counters, gauges and histograms in memory. With
+QUIZ_METRICS_DIR set (needed once the server runs several worker
+processes), a daemon thread started on first use writes them every
+FLUSH_INTERVAL seconds to <dir>/<pid>.json, and /metrics adds up the files
+of every process, so it does not matter which worker answers the scrape.
+Counters and histograms of exited workers keep counting, since Prometheus
+expects them never to go down; their gauges (requests in flight) are
+dropped. The directory should be emptied when the server starts. Without
+it, /metrics reports the process that answers.
+
+Open attempts are counted in the database at scrape time, so they are exact
+whatever the workers. The rest are meant for rate() in queries:
+
+- submits per minute: rate(quiz_attempts_submitted_total[5m]) * 60
+- cache hit ratio: rate(quiz_cache_lookups_total{result="hit"}[5m])
+  / rate(quiz_cache_lookups_total[5m]), per cache
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Attempt, Quiz
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SQL_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# name: (type, help, histogram buckets)
+FAMILIES = {
+    'quiz_http_request_duration_seconds': (
+        'histogram', 'Time to answer a request, by URL name and method', LATENCY_BUCKETS),
+    'quiz_http_responses_total': ('counter', 'Responses by URL name and status code', None),
+    'quiz_http_requests_in_flight': ('gauge', 'Requests being answered', None),
+    'quiz_db_queries_per_request': (
+        'histogram', 'Database queries run by a request, by URL name', QUERY_COUNT_BUCKETS),
+    'quiz_db_query_seconds_per_request': (
+        'histogram', 'Time spent in database queries by a request, by URL name', SQL_TIME_BUCKETS),
+    'quiz_cache_lookups_total': ('counter', 'Lookups of cached aggregates by cache and hit or miss', None),
+    'quiz_attempts_submitted_total': ('counter', 'Attempts submitted and graded', None),
+    'quiz_open_attempts': ('gauge', 'Unsubmitted attempts still within their time limit, by quiz', None),
+}
+
+# Label value for requests that matched no URL, so that stray paths do not
+# each become a series
+UNMATCHED = '<unmatched>'
+
+_values = {}
+_lock = threading.Lock()
+_thread = None
+_pid = None
+
+
+def enabled():
+    return getattr(settings, 'QUIZ_METRICS', True)
+
+
+def _directory():
+    return getattr(settings, 'QUIZ_METRICS_DIR', '') or None
+
+
+def _series(name, labels):
+    """
+    The mutable value of a series: a float for counters and gauges, and
+    [bucket counts..., sum, count] for histograms.
+    """
+    global _pid
+    if _pid != os.getpid():
+        # A forked worker starts from zero rather than its parent's values
+        _values.clear()
+        _pid = os.getpid()
+    key = (name, tuple(sorted(labels.items())))
+    series = _values.get(key)
+    if series is None:
+        kind, _, buckets = FAMILIES[name]
+        series = _values[key] = [0] * (len(buckets) + 2) if kind == 'histogram' else [0]
+    return series
+
+
+def inc(name, amount=1, **labels):
+    if not enabled():
+        return
+    with _lock:
+        _series(name, labels)[0] += amount
+    if _directory():
+        _ensure_thread()
+
+
+def observe(name, value, **labels):
+    if not enabled():
+        return
+    buckets = FAMILIES[name][2]
+    with _lock:
+        series = _series(name, labels)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+    if _directory():
+        _ensure_thread()
+
+
+def cache_lookup(cache, hit):
+    inc('quiz_cache_lookups_total', cache=cache, result='hit' if hit else 'miss')
+
+
+def _snapshot():
+    with _lock:
+        if _pid != os.getpid():
+            return []
+        return [[name, dict(labels), list(series)] for (name, labels), series in _values.items()]
+
+
+def flush():
+    """
+    Writes this process's values to QUIZ_METRICS_DIR, replacing its file.
+    """
+    directory = _directory()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def _run():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Could not write metrics')
+
+
+def _ensure_thread():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock:
+        # Started lazily so that each forked worker gets its own
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='metrics', daemon=True)
+            _thread.start()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Could not write metrics')
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect():
+    """
+    {(name, labels): value} added up over this process and the files of the
+    others.
+    """
+    snapshots = [_snapshot()]
+    directory = _directory()
+    if directory and os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            pid, ext = os.path.splitext(filename)
+            if ext != '.json' or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    values = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not _alive(int(pid)):
+                values = [value for value in values if FAMILIES.get(value[0], ('gauge',))[0] != 'gauge']
+            snapshots.append(values)
+
+    totals = {}
+    for values in snapshots:
+        for name, labels, series in values:
+            if name not in FAMILIES:
+                continue
+            key = (name, tuple(sorted(labels.items())))
+            total = totals.setdefault(key, [0] * len(series))
+            if len(total) == len(series):
+                for i, value in enumerate(series):
+                    total[i] += value
+    return totals
+
+
+def _open_attempts():
+    """
+    {quiz_id: unsubmitted attempts started within the quiz's time limit}.
+    """
+    now = timezone.now()
+    longest = Quiz.objects.aggregate(longest=Max('time_limit_minutes'))['longest']
+    if not longest:
+        return {}
+    counts = {}
+    attempts = Attempt.objects.filter(completed_at__isnull=True, started_at__gte=now - timedelta(minutes=longest))
+    for quiz_id, time_limit, started_at in attempts.values_list('quiz_id', 'quiz__time_limit_minutes', 'started_at'):
+        if started_at >= now - timedelta(minutes=time_limit):
+            counts[quiz_id] = counts.get(quiz_id, 0) + 1
+    return counts
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """
+    Every metric in the Prometheus text exposition format.
+    """
+    totals = _collect()
+    for quiz_id, count in _open_attempts().items():
+        totals[('quiz_open_attempts', (('quiz', str(quiz_id)),))] = [count]
+
+    lines = []
+    for name, (kind, help_text, buckets) in FAMILIES.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (series_name, labels), series in sorted(totals.items()):
+            if series_name != name:
+                continue
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(series[0])}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {series[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(series[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {series[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,150 @@
+"""
+Request instrumentation: Prometheus metrics (metrics.py), the opt-in
+query stats (querystats.py) and on-demand profiling (profiling.py).
+
+Each middleware works both ways round: under ASGI a sync-only middleware
+would make Django run every request, async views included, through the one
+thread that sync_to_async uses for the ORM.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics, profiling, querystats
+
+logger = logging.getLogger('quiz.querystats')
+
+
+class _Call:
+    response = None
+
+
+class _AroundMiddleware:
+    """
+    A middleware whose around(request) context manager wraps the rest of
+    the chain, sync or async; it sets call.response before leaving.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        with self.around(request) as call:
+            call.response = self.get_response(request)
+        return call.response
+
+    async def _acall(self, request):
+        with self.around(request) as call:
+            call.response = await self.get_response(request)
+        return call.response
+
+
+class MetricsMiddleware(_AroundMiddleware):
+    """
+    Times every request and counts its queries for /metrics, labelled by URL
+    name. Listed first so that the time covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        if not metrics.enabled():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def around(self, request):
+        call = _Call()
+        recorder = querystats.QueryRecorder(fingerprints=False)
+        metrics.inc('quiz_http_requests_in_flight')
+        started = time.perf_counter()
+        try:
+            with recorder.record():
+                yield call
+        finally:
+            metrics.inc('quiz_http_requests_in_flight', -1)
+        seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else metrics.UNMATCHED
+        metrics.observe('quiz_http_request_duration_seconds', seconds, view=view, method=request.method)
+        metrics.inc('quiz_http_responses_total', view=view, status=call.response.status_code)
+        metrics.observe('quiz_db_queries_per_request', recorder.count, view=view)
+        metrics.observe('quiz_db_query_seconds_per_request', recorder.seconds, view=view)
+
+
+class QueryStatsMiddleware(_AroundMiddleware):
+    """
+    Counts the queries of every request (QUIZ_QUERY_STATS), adds them to the
+    per-view totals and logs the requests over the thresholds with their
+    repeated statements. Not loaded at all when the setting is off.
+    """
+
+    def __init__(self, get_response):
+        if not querystats.enabled():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def around(self, request):
+        call = _Call()
+        recorder = querystats.QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            yield call
+        seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else metrics.UNMATCHED
+        max_queries, max_sql_ms = querystats.thresholds()
+        over = recorder.count > max_queries or recorder.seconds * 1000 > max_sql_ms
+        querystats.add_request(view, recorder, seconds, over)
+        if over:
+            repeated = ''.join(f'\n  {n} x {sql}' for sql, n in recorder.repeated()[:querystats.TOP_REPEATED])
+            logger.warning('%s %s (%s): %d queries, %.0f ms SQL, %.0f ms total%s', request.method, request.path,
+                           view, recorder.count, recorder.seconds * 1000, seconds * 1000,
+                           f'; repeated:{repeated}' if repeated else '')
+
+
+def _is_staff(user):
+    return user.is_staff or user.is_superuser
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the flagged requests of staff users. Listed last, so that the
+    profile is of the view rather than of the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        if not profiling.flagged(request) or not _is_staff(request.user):
+            return self.get_response(request)
+        response, name = profiling.profile(request, request.user, self.get_response)
+        response[profiling.HEADER] = name or 'busy'
+        return response
+
+    async def _acall(self, request):
+        if not profiling.flagged(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not _is_staff(user):
+            return await self.get_response(request)
+        response, name = await profiling.aprofile(request, user, self.get_response)
+        response[profiling.HEADER] = name or 'busy'
+        return response
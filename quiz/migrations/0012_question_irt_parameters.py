@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0011_quiz_is_public"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="irt_calibrated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="irt_difficulty",
+            field=models.FloatField(
+                blank=True, help_text="Calibrated IRT difficulty (b)", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="irt_discrimination",
+            field=models.FloatField(
+                blank=True, help_text="Calibrated IRT discrimination (a)", null=True
+            ),
+        ),
+    ]
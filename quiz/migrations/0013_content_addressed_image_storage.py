@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:00
+
+import quiz.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0012_question_irt_parameters"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="matrixcol",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=quiz.storage.get_image_storage,
+                upload_to="matrix_cols/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="matrixrow",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=quiz.storage.get_image_storage,
+                upload_to="matrix_rows/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="option",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=quiz.storage.get_image_storage,
+                upload_to="options/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="passage",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=quiz.storage.get_image_storage,
+                upload_to="passages/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=quiz.storage.get_image_storage,
+                upload_to="questions/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="solutionblock",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=quiz.storage.get_image_storage,
+                upload_to="solutions/",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0013_content_addressed_image_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="SHA-256 of the normalized imported content",
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="is_retired",
+            field=models.BooleanField(
+                default=False,
+                help_text="Removed from its source file; hidden from the question bank and new tests",
+            ),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="source_key",
+            field=models.CharField(
+                blank=True,
+                help_text="<source file>#<block index> of the imported question",
+                max_length=255,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0014_question_source_key_content_hash"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(
+                fields=["quiz", "completed_at"], name="quiz_attemp_quiz_id_a1988d_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0015_attempt_quiz_completed_at_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChapterMastery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "chapter",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("VECTORS", "Vectors"),
+                            ("KINEMATICS_1D", "Kinematics - 1D"),
+                            ("KINEMATICS_2D", "Kinematics - 2D"),
+                            ("NEWTONS_LAWS", "Newton's Laws of Motion"),
+                            ("FRICTION", "Friction"),
+                            ("CIRCULAR_MOTION", "Circular Motion"),
+                            ("WORK_POWER_ENERGY", "Work, Power and Energy"),
+                            (
+                                "COM_MOMENTUM",
+                                "Center of Mass and Conservation of Linear Momentum",
+                            ),
+                            ("ROTATIONAL_MOTION", "Rotational Motion"),
+                            ("GRAVITATION", "Gravitation"),
+                            ("FLUID_DYNAMICS", "Fluid Dynamics"),
+                            (
+                                "MECHANICAL_PROPERTIES",
+                                "Mechanical Properties of Matter",
+                            ),
+                            ("SHM", "Simple Harmonic Motion"),
+                            ("WAVE_MOTION", "Wave Motion"),
+                            ("HEAT_THERMODYNAMICS", "Heat and Thermodynamics"),
+                            ("ELECTROSTATICS", "Electrostatics"),
+                            ("CURRENT_ELECTRICITY", "Current Electricity"),
+                            ("CAPACITANCE", "Capacitance"),
+                            ("MAGNETISM", "Magnetism"),
+                            ("EMI", "Electromagnetic Induction"),
+                            ("AC", "Alternating Current"),
+                            ("GEOMETRICAL_OPTICS", "Geometrical Optics"),
+                            ("WAVE_OPTICS", "Wave Optics"),
+                            ("MODERN_PHYSICS", "Modern Physics"),
+                        ],
+                        help_text="Blank for questions without a chapter",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "difficulty",
+                    models.CharField(
+                        choices=[
+                            ("VERY_EASY", "Very Easy"),
+                            ("EASY", "Easy"),
+                            ("MODERATE", "Moderate"),
+                            ("DIFFICULT", "Difficult"),
+                            ("VERY_DIFFICULT", "Very Difficult"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "attempted",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Questions answered in completed attempts"
+                    ),
+                ),
+                ("correct", models.PositiveIntegerField(default=0)),
+                (
+                    "marks",
+                    models.FloatField(
+                        default=0.0,
+                        help_text="Marks awarded, negative marking included",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chapter_mastery",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "chapter", "difficulty"),
+                        name="unique_chapter_mastery",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0016_chapter_mastery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="response",
+            name="time_spent",
+            field=models.FloatField(
+                default=0.0,
+                help_text="Seconds spent on the question, summed from its QuestionVisits",
+            ),
+        ),
+        migrations.CreateModel(
+            name="QuestionVisit",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("entered_at", models.DateTimeField()),
+                ("left_at", models.DateTimeField()),
+                (
+                    "seconds",
+                    models.FloatField(help_text="left_at - entered_at, capped"),
+                ),
+                (
+                    "attempt",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visits",
+                        to="quiz.attempt",
+                    ),
+                ),
+                (
+                    "question",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="quiz.question"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["attempt", "question"],
+                        name="quiz_questi_attempt_6e35d4_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0017_question_visit_time_spent"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(
+                condition=models.Q(("completed_at__isnull", True)),
+                fields=["started_at"],
+                name="quiz_attempt_open_idx",
+            ),
+        ),
+    ]
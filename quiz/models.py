@@ -1,10 +1,11 @@
 from django.db import models
 from django.conf import settings
+from .storage import get_image_storage
 
 class Passage(models.Model):
     title = models.CharField(max_length=200, blank=True)
     text = models.TextField(help_text="Content of the passage (LaTeX supported)")
-    image = models.ImageField(upload_to='passages/', blank=True, null=True)
+    image = models.ImageField(upload_to='passages/', storage=get_image_storage, blank=True, null=True)
 
     def __str__(self):
         return self.title or self.text[:50]
@@ -57,7 +58,7 @@ class Question(models.Model):
     text = models.TextField(help_text="Question text (LaTeX supported)", blank=True)
     assertion = models.TextField(blank=True, null=True, help_text="Assertion text (for Assertion-Reason questions)")
     reason = models.TextField(blank=True, null=True, help_text="Reason text (for Assertion-Reason questions)")
-    image = models.ImageField(upload_to='questions/', blank=True, null=True)
+    image = models.ImageField(upload_to='questions/', storage=get_image_storage, blank=True, null=True)
     question_type = models.CharField(max_length=20, choices=Type.choices)
     allow_partial_marking = models.BooleanField(default=True, help_text="For MCQ Multi: If true, partial marks are awarded. If false, only full marks or negative marks.")
     
@@ -65,7 +66,12 @@ class Question(models.Model):
     chapter = models.CharField(max_length=50, choices=CHAPTER_CHOICES, blank=True, null=True)
     subtopic = models.CharField(max_length=200, blank=True, null=True)
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES, default='MODERATE')
-    
+
+    # Item parameters calibrated from student responses (see calibrate_items)
+    irt_difficulty = models.FloatField(blank=True, null=True, help_text="Calibrated IRT difficulty (b)")
+    irt_discrimination = models.FloatField(blank=True, null=True, help_text="Calibrated IRT discrimination (a)")
+    irt_calibrated_at = models.DateTimeField(blank=True, null=True)
+
     # For Numerical
     numerical_answer = models.FloatField(blank=True, null=True)
     numerical_tolerance = models.FloatField(default=0.0, help_text="Allowed range (+/-)")
@@ -82,6 +88,11 @@ class Question(models.Model):
     # }
     matrix_config = models.JSONField(blank=True, null=True, help_text="DEPRECATED: Use MatrixRow/MatrixCol models instead")
 
+    # Set by the LaTeX importer so that re-importing a file updates questions in place
+    source_key = models.CharField(max_length=255, unique=True, blank=True, null=True, help_text="<source file>#<block index> of the imported question")
+    content_hash = models.CharField(max_length=64, blank=True, null=True, help_text="SHA-256 of the normalized imported content")
+    is_retired = models.BooleanField(default=False, help_text="Removed from its source file; hidden from the question bank and new tests")
+
     def __str__(self):
         return f"{self.get_question_type_display()}: {self.text[:50]}"
 
@@ -89,7 +100,7 @@ class MatrixRow(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='matrix_rows')
     label = models.CharField(max_length=10, help_text="e.g. A, B, C")
     text = models.CharField(max_length=1000, blank=True)
-    image = models.ImageField(upload_to='matrix_rows/', blank=True, null=True)
+    image = models.ImageField(upload_to='matrix_rows/', storage=get_image_storage, blank=True, null=True)
     # Comma separated correct matches for this row (e.g. "p,q") - mostly for MATRIX type
     matches = models.CharField(max_length=50, blank=True, help_text="Comma-separated IDs of correct columns (e.g. p,q)")
 
@@ -100,7 +111,7 @@ class MatrixCol(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='matrix_cols')
     label = models.CharField(max_length=10, help_text="e.g. p, q, r")
     text = models.CharField(max_length=1000, blank=True)
-    image = models.ImageField(upload_to='matrix_cols/', blank=True, null=True)
+    image = models.ImageField(upload_to='matrix_cols/', storage=get_image_storage, blank=True, null=True)
 
     def __str__(self):
         return f"{self.label}: {self.text}"
@@ -108,7 +119,7 @@ class MatrixCol(models.Model):
 class Option(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='options')
     text = models.CharField(max_length=1000, blank=True)
-    image = models.ImageField(upload_to='options/', blank=True, null=True)
+    image = models.ImageField(upload_to='options/', storage=get_image_storage, blank=True, null=True)
     is_correct = models.BooleanField(default=False)
 
     def __str__(self):
@@ -135,6 +146,16 @@ class Attempt(models.Model):
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Leaderboard sync reads a quiz's recently completed attempts
+            models.Index(fields=['quiz', 'completed_at']),
+            # /metrics counts the open attempts of running exams; only those
+            # are in the index
+            models.Index(fields=['started_at'], condition=models.Q(completed_at__isnull=True),
+                         name='quiz_attempt_open_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.quiz.title}"
 
@@ -151,10 +172,41 @@ class Response(models.Model):
     # Store answer as JSON to handle multiple options, numerical values, or matrix matches
     answer_data = models.JSONField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=QuestionStatus.choices, default=QuestionStatus.NOT_VISITED)
+    time_spent = models.FloatField(default=0.0, help_text="Seconds spent on the question, summed from its QuestionVisits")
 
     class Meta:
         unique_together = ('attempt', 'question')
 
+# One stretch of time a student had a question on screen in take_quiz_single.
+# Append-only; written in batches by quiz.telemetry
+class QuestionVisit(models.Model):
+    attempt = models.ForeignKey(Attempt, on_delete=models.CASCADE, related_name='visits')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    entered_at = models.DateTimeField()
+    left_at = models.DateTimeField()
+    seconds = models.FloatField(help_text="left_at - entered_at, capped")
+
+    class Meta:
+        indexes = [models.Index(fields=['attempt', 'question'])]
+
+# Running totals of a student's graded answers per chapter and difficulty,
+# maintained by calculate_final_score and rebuilt by rebuild_mastery
+class ChapterMastery(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chapter_mastery')
+    chapter = models.CharField(max_length=50, choices=Question.CHAPTER_CHOICES, blank=True, help_text="Blank for questions without a chapter")
+    difficulty = models.CharField(max_length=20, choices=Question.DIFFICULTY_CHOICES)
+    attempted = models.PositiveIntegerField(default=0, help_text="Questions answered in completed attempts")
+    correct = models.PositiveIntegerField(default=0)
+    marks = models.FloatField(default=0.0, help_text="Marks awarded, negative marking included")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chapter', 'difficulty'], name='unique_chapter_mastery'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.chapter or 'No chapter'} ({self.difficulty})"
+
 class QuizQuestion(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
@@ -171,7 +223,7 @@ class QuizQuestion(models.Model):
 class SolutionBlock(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='solution_blocks')
     text = models.TextField(blank=True, help_text="Text content (LaTeX supported)")
-    image = models.ImageField(upload_to='solutions/', blank=True, null=True)
+    image = models.ImageField(upload_to='solutions/', storage=get_image_storage, blank=True, null=True)
     order = models.PositiveIntegerField(default=0)
 
     class Meta:
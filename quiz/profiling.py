@@ -0,0 +1,239 @@
+"""
+On-demand profiling of single requests, for staff.
+
+A request with the header "X-Quiz-Profile: 1" or "_profile=1" in its query
+string, made by a staff user, runs under cProfile while a sampler thread
+records the request thread's stack every SAMPLE_INTERVAL seconds. Three
+files go to QUIZ_PROFILE_DIR, named after the time and the view:
+
+- <name>.pstats, for pstats, snakeviz and the like,
+- <name>.collapsed, one "frame;frame;frame count" line per stack, for
+  flamegraph.pl and speedscope,
+- <name>.json, what was requested and how long it took.
+
+Only the newest QUIZ_PROFILE_KEEP profiles are kept. One request is profiled
+at a time per process; another flagged request meanwhile runs normally.
+Other requests pay for one header and one query string lookup.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+
+HEADER = 'X-Quiz-Profile'
+QUERY_FLAG = '_profile'
+SAMPLE_INTERVAL = 0.001
+EXTENSIONS = ('.pstats', '.collapsed', '.json')
+NAME_RE = re.compile(r'^[\w.-]+$')
+
+_lock = threading.Lock()
+
+
+def directory():
+    return getattr(settings, 'QUIZ_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def keep():
+    return getattr(settings, 'QUIZ_PROFILE_KEEP', 50)
+
+
+def flagged(request):
+    """
+    Whether the request asks to be profiled, before looking at who made it.
+    """
+    if request.headers.get(HEADER, '') == '1':
+        return True
+    return QUERY_FLAG in request.META.get('QUERY_STRING', '') and request.GET.get(QUERY_FLAG) == '1'
+
+
+def _frame_name(frame):
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+
+
+class Sampler:
+    """
+    Counts the stacks of one thread, sampled from another thread.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                stack = ';'.join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def __enter__(self):
+        # The sampler only runs when it gets the GIL, by default every 5 ms
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items()))
+
+
+@contextmanager
+def _profiling():
+    profiler = cProfile.Profile()
+    with Sampler(threading.get_ident()) as sampler:
+        profiler.enable()
+        try:
+            yield profiler, sampler
+        finally:
+            profiler.disable()
+
+
+def _save_request(request, user, response, profiler, sampler, seconds):
+    match = request.resolver_match
+    return save(profiler, sampler, {
+        'view': match.view_name if match else 'unmatched',
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'user': user.get_username(),
+        'seconds': seconds,
+        'samples': sum(sampler.stacks.values()),
+    })
+
+
+def profile(request, user, get_response):
+    """
+    Runs get_response(request) profiled and saves the profile; returns the
+    response and the profile's name, or None for the name if another
+    request is being profiled.
+    """
+    if not _lock.acquire(blocking=False):
+        return get_response(request), None
+    try:
+        started = time.perf_counter()
+        with _profiling() as (profiler, sampler):
+            response = get_response(request)
+        seconds = time.perf_counter() - started
+        return response, _save_request(request, user, response, profiler, sampler, seconds)
+    finally:
+        _lock.release()
+
+
+async def aprofile(request, user, get_response):
+    """
+    profile() for async requests. The event loop's thread is profiled, so
+    other requests it serves meanwhile show up too, and queries run by
+    sync_to_async in other threads only as the time spent waiting for them.
+    """
+    if not _lock.acquire(blocking=False):
+        return await get_response(request), None
+    try:
+        started = time.perf_counter()
+        with _profiling() as (profiler, sampler):
+            response = await get_response(request)
+        seconds = time.perf_counter() - started
+        return response, _save_request(request, user, response, profiler, sampler, seconds)
+    finally:
+        _lock.release()
+
+
+def save(profiler, sampler, info):
+    path = directory()
+    os.makedirs(path, exist_ok=True)
+    now = datetime.now()
+    slug = re.sub(r'[^\w-]+', '-', info['view']).strip('-') or 'view'
+    name = f'{now:%Y%m%d-%H%M%S-%f}-{slug}'
+    info = dict(info, name=name, created=now.isoformat(timespec='seconds'))
+    profiler.dump_stats(os.path.join(path, name + '.pstats'))
+    with open(os.path.join(path, name + '.collapsed'), 'w') as f:
+        f.write(sampler.collapsed())
+    with open(os.path.join(path, name + '.json'), 'w') as f:
+        json.dump(info, f)
+    _rotate(path)
+    return name
+
+
+def _rotate(path):
+    names = sorted(filename[:-len('.json')] for filename in os.listdir(path) if filename.endswith('.json'))
+    for name in names[:max(0, len(names) - keep())]:
+        for extension in EXTENSIONS:
+            try:
+                os.remove(os.path.join(path, name + extension))
+            except FileNotFoundError:
+                pass
+
+
+@dataclass
+class StoredProfile:
+    name: str
+    view: str
+    method: str
+    path: str
+    status: int
+    user: str
+    seconds: float
+    samples: int
+    created: str
+
+
+def stored_profiles():
+    """
+    The saved profiles, newest first.
+    """
+    path = directory()
+    if not os.path.isdir(path):
+        return []
+    profiles = []
+    for filename in sorted(os.listdir(path), reverse=True):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(path, filename)) as f:
+                profiles.append(StoredProfile(**json.load(f)))
+        except (OSError, ValueError, TypeError):
+            continue
+    return profiles
+
+
+def file_path(name, extension):
+    """
+    The path of a saved profile's file, or None if there is no such file.
+    """
+    if not NAME_RE.match(name) or extension not in EXTENSIONS:
+        return None
+    path = os.path.join(directory(), name + extension)
+    return path if os.path.isfile(path) else None
+
+
+def top_functions(name, sort='cumulative', limit=40):
+    """
+    The pstats report of a saved profile, sorted by sort.
+    """
+    path = file_path(name, '.pstats')
+    if path is None:
+        return None
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,171 @@
+"""
+Query counting for requests and code blocks.
+
+QueryRecorder is a connection.execute_wrapper that counts queries, adds up
+their time and groups them by fingerprint (the SQL with literals and
+IN lists collapsed), so that the same statement run once per row (N+1)
+shows up as one fingerprint with a large count.
+
+QueryStatsMiddleware (quiz/middleware.py) records every request this way
+when QUIZ_QUERY_STATS is on, keeps per-view totals in this process for the
+staff page and logs requests over the thresholds. query_budget() fails a
+block of code, typically in a test, that runs more queries than declared.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections
+
+# A fingerprint run at least this many times in one request is reported
+REPEAT_THRESHOLD = 5
+# Fingerprints kept per view for the staff page
+TOP_REPEATED = 5
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    The statement with literals replaced by ? and IN (...) lists collapsed.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """
+    Counts and times queries; with fingerprints=False it skips grouping
+    them, which is all the metrics middleware needs.
+    """
+
+    def __init__(self, fingerprints=True):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter() if fingerprints else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            if self.fingerprints is not None:
+                self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        """
+        [(fingerprint, count), ...] run at least threshold times, most first.
+        """
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n >= threshold]
+
+    @contextmanager
+    def record(self, using=None):
+        """
+        Records the queries of the block on one connection, or on all of them.
+        """
+        with ExitStack() as stack:
+            for connection in [connections[using]] if using else connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+@dataclass
+class ViewStats:
+    requests: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    sql_seconds: float = 0.0
+    seconds: float = 0.0
+    over_threshold: int = 0
+    repeated: Counter = field(default_factory=Counter)
+
+    @property
+    def mean_queries(self):
+        return self.queries / self.requests if self.requests else 0.0
+
+    @property
+    def mean_sql_ms(self):
+        return 1000 * self.sql_seconds / self.requests if self.requests else 0.0
+
+    @property
+    def mean_ms(self):
+        return 1000 * self.seconds / self.requests if self.requests else 0.0
+
+    def top_repeated(self):
+        return self.repeated.most_common(TOP_REPEATED)
+
+
+_views = {}
+_lock = threading.Lock()
+
+
+def add_request(view, recorder, seconds, over_threshold):
+    with _lock:
+        stats = _views.setdefault(view, ViewStats())
+        stats.requests += 1
+        stats.queries += recorder.count
+        stats.max_queries = max(stats.max_queries, recorder.count)
+        stats.sql_seconds += recorder.seconds
+        stats.seconds += seconds
+        stats.over_threshold += over_threshold
+        for sql, n in recorder.repeated():
+            stats.repeated[sql] = max(stats.repeated[sql], n)
+
+
+def view_stats():
+    """
+    [(view, ViewStats), ...] for this process, most queries per request first.
+    """
+    with _lock:
+        return sorted(_views.items(), key=lambda item: -item[1].mean_queries)
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+def enabled():
+    return getattr(settings, 'QUIZ_QUERY_STATS', False)
+
+
+def thresholds():
+    """
+    (queries, SQL milliseconds) above which a request is logged.
+    """
+    return (getattr(settings, 'QUIZ_QUERY_STATS_MAX_QUERIES', 50),
+            getattr(settings, 'QUIZ_QUERY_STATS_MAX_SQL_MS', 250))
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(budget, using=None):
+    """
+    Fails the block if it runs more than budget queries, listing the
+    repeated statements, e.g. in a test:
+
+        with query_budget(15):
+            self.client.post(url, data)
+    """
+    recorder = QueryRecorder()
+    with recorder.record(using):
+        yield recorder
+    if recorder.count > budget:
+        repeated = ''.join(f'\n  {n} x {sql}' for sql, n in recorder.repeated(2)[:TOP_REPEATED])
+        raise QueryBudgetExceeded(f'{recorder.count} queries, budget {budget}' +
+                                  (f'; repeated:{repeated}' if repeated else ''))
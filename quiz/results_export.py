@@ -0,0 +1,212 @@
+"""
+Quiz results as flat rows for spreadsheets: one row per attempt, or one row
+per response with the answer flattened and graded.
+
+Rows are generated from .iterator() querysets and encoded in small pieces,
+so an export starts sending immediately and uses the same memory whatever
+its size. CSV needs nothing else; Parquet needs pyarrow, which is optional.
+"""
+import csv
+
+from django.db.models import BooleanField, ExpressionWrapper, Q
+
+from .exporter import option_label
+from .grading import load_answer_keys, grade
+from .models import Attempt, Option, QuizQuestion, Response
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+ATTEMPTS = 'attempts'
+RESPONSES = 'responses'
+KINDS = (ATTEMPTS, RESPONSES)
+CSV = 'csv'
+PARQUET = 'parquet'
+FORMATS = (CSV, PARQUET)
+CONTENT_TYPES = {CSV: 'text/csv; charset=utf-8', PARQUET: 'application/vnd.apache.parquet'}
+
+ITERATOR_CHUNK_SIZE = 2000
+PARQUET_BATCH_SIZE = 10000
+
+ATTEMPT_COLUMNS = [
+    ('attempt_id', 'int64'), ('user_id', 'int64'), ('username', 'string'),
+    ('started_at', 'timestamp'), ('completed_at', 'timestamp'),
+    ('duration_seconds', 'float64'), ('score', 'float64'),
+]
+RESPONSE_COLUMNS = [
+    ('attempt_id', 'int64'), ('username', 'string'), ('question_number', 'int64'),
+    ('question_id', 'int64'), ('question_type', 'string'), ('chapter', 'string'),
+    ('status', 'string'), ('answer', 'string'), ('marks', 'float64'), ('is_correct', 'bool'),
+    ('time_spent', 'float64'),
+]
+
+
+class ExportError(Exception):
+    pass
+
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise ExportError(f'Unknown format {fmt!r}; expected one of {", ".join(FORMATS)}')
+    if fmt == PARQUET and pyarrow is None:
+        raise ExportError('Parquet export needs pyarrow (pip install pyarrow)')
+
+
+def columns(kind):
+    return ATTEMPT_COLUMNS if kind == ATTEMPTS else RESPONSE_COLUMNS
+
+
+def attempt_rows(quiz_id):
+    attempts = Attempt.objects.filter(quiz_id=quiz_id).order_by('id').values_list(
+        'id', 'user_id', 'user__username', 'started_at', 'completed_at', 'score'
+    )
+    for attempt_id, user_id, username, started_at, completed_at, score in attempts.iterator(ITERATOR_CHUNK_SIZE):
+        duration = (completed_at - started_at).total_seconds() if completed_at else None
+        yield (attempt_id, user_id, username, started_at, completed_at, duration,
+               score if completed_at else None)
+
+
+def flatten_answer(answer_data, labels):
+    """
+    A readable string for answer_data: option labels for option questions
+    ("A;C"), the value for numerical ones, "A:p,q;B:r" for matrix answers.
+    """
+    if not answer_data:
+        return ''
+    if isinstance(answer_data, dict):
+        return ';'.join(f'{row}:{",".join(str(c) for c in cols) if isinstance(cols, list) else cols}'
+                        for row, cols in sorted(answer_data.items()))
+    if isinstance(answer_data, list):
+        return ';'.join(labels.get(str(value), str(value)) for value in answer_data)
+    return str(answer_data)
+
+
+def response_rows(quiz_id):
+    quiz_questions = list(QuizQuestion.objects.filter(quiz_id=quiz_id).select_related('question')
+                          .order_by('order', 'question_id'))
+    questions = {qq.question_id: (number, qq) for number, qq in enumerate(quiz_questions, 1)}
+    keys = load_answer_keys(questions)
+    labels = {}
+    position = {}
+    for question_id, option_id in Option.objects.filter(question_id__in=questions).order_by(
+            'question_id', 'id').values_list('question_id', 'id'):
+        labels[str(option_id)] = option_label(position.get(question_id, 0))
+        position[question_id] = position.get(question_id, 0) + 1
+
+    responses = Response.objects.filter(attempt__quiz_id=quiz_id, question_id__in=questions).order_by(
+        'attempt_id', 'question_id'
+    ).annotate(
+        # A flag rather than the timestamp, which is slow to convert per row
+        completed=ExpressionWrapper(Q(attempt__completed_at__isnull=False), output_field=BooleanField())
+    ).values_list('attempt_id', 'attempt__user__username', 'question_id', 'status', 'answer_data', 'completed',
+                  'time_spent')
+    for attempt_id, username, question_id, status, answer_data, completed, time_spent in responses.iterator(
+            ITERATOR_CHUNK_SIZE):
+        number, qq = questions[question_id]
+        question = qq.question
+        marks = is_correct = None
+        if completed:
+            marks, is_correct = grade(keys[question_id], answer_data, qq.marks, qq.negative_marks)
+        yield (attempt_id, username, number, question_id, question.question_type, question.chapter or '',
+               status, flatten_answer(answer_data, labels), marks, is_correct, time_spent)
+
+
+def rows(kind, quiz_id):
+    return attempt_rows(quiz_id) if kind == ATTEMPTS else response_rows(quiz_id)
+
+
+class _Echo:
+    """
+    File-like object for csv.writer that hands back what it is given.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(kind, quiz_id):
+    """
+    Yields the export as CSV text, one line at a time.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in columns(kind)])
+    for row in rows(kind, quiz_id):
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+class _Chunks:
+    """
+    Write-only sink that collects what pyarrow writes until it is drained.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_type(name):
+    return {
+        'int64': pyarrow.int64(), 'float64': pyarrow.float64(), 'string': pyarrow.string(),
+        'bool': pyarrow.bool_(), 'timestamp': pyarrow.timestamp('us', tz='UTC'),
+    }[name]
+
+
+def stream_parquet(kind, quiz_id, batch_size=PARQUET_BATCH_SIZE):
+    """
+    Yields the export as Parquet bytes, one row group per batch_size rows.
+    """
+    check_format(PARQUET)
+    spec = columns(kind)
+    schema = pyarrow.schema([(name, _arrow_type(type_name)) for name, type_name in spec])
+    sink = _Chunks()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+
+    def write(batch):
+        writer.write_batch(pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, type=schema.field(i).type) for i, values in enumerate(zip(*batch))],
+            schema=schema,
+        ))
+
+    batch = []
+    for row in rows(kind, quiz_id):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            write(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def stream(kind, fmt, quiz_id):
+    check_format(fmt)
+    if kind not in KINDS:
+        raise ExportError(f'Unknown export {kind!r}; expected one of {", ".join(KINDS)}')
+    if fmt == CSV:
+        return stream_csv(kind, quiz_id)
+    return stream_parquet(kind, quiz_id)
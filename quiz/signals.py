@@ -1,6 +1,13 @@
-from django.db.models.signals import m2m_changed
-from django.dispatch import receiver
-from .models import Quiz, QuizQuestion
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+from . import analytics, cohorts, derivatives, leaderboard, mastery, metrics
+from .caching import bump_group_version, bump_quiz_version
+from .models import Passage, Question, Option, MatrixRow, MatrixCol, SolutionBlock, Quiz, QuizQuestion, Attempt
+
+# Sent with attempt= once a graded attempt's transaction has committed
+attempt_completed = Signal()
 
 @receiver(m2m_changed, sender=Quiz.passages.through)
 def add_passage_questions_to_quiz(sender, instance, action, reverse, model, pk_set, **kwargs):
@@ -29,3 +36,52 @@ def add_passage_questions_to_quiz(sender, instance, action, reverse, model, pk_s
             for passage in passages:
                 questions = passage.questions.all()
                 QuizQuestion.objects.filter(quiz=instance, question__in=questions).delete()
+
+
+def build_image_derivatives(sender, instance, **kwargs):
+    """
+    Builds the srcset variants of an uploaded image once the row is committed.
+    Bulk imports bypass this and call derivatives.build() themselves.
+    """
+    image = instance.image
+    if image:
+        transaction.on_commit(lambda: derivatives.schedule([image.name], image.storage))
+
+for model in (Passage, Question, Option, MatrixRow, MatrixCol, SolutionBlock):
+    post_save.connect(build_image_derivatives, sender=model, dispatch_uid=f'image_derivatives_{model.__name__}')
+
+
+@receiver(attempt_completed)
+def update_quiz_aggregates(sender, attempt, **kwargs):
+    analytics.record_attempt(attempt)
+    leaderboard.record_attempt(attempt)
+    cohorts.invalidate_attempt(attempt)
+    metrics.inc('quiz_attempts_submitted_total')
+
+
+@receiver(post_delete, sender=Attempt)
+def invalidate_quiz_aggregates(sender, instance, **kwargs):
+    """
+    Aggregates are only ever added to, so removing an attempt rebuilds them:
+    the quiz's through its version, the student's chapter mastery right away
+    (in the deleting transaction) if the attempt had counted.
+    """
+    bump_quiz_version(instance.quiz_id)
+    if instance.completed_at is not None:
+        mastery.rebuild_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def invalidate_group_aggregates(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Cohort reports are per group, so any change of membership rebuilds them.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # instance is the Group
+        bump_group_version(instance.pk)
+    else:
+        group_ids = instance.groups.values_list('id', flat=True) if action == 'pre_clear' else pk_set
+        for group_id in group_ids:
+            bump_group_version(group_id)
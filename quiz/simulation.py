@@ -0,0 +1,204 @@
+"""
+Virtual students for capacity planning.
+
+Each student opens a quiz in take_quiz_single, answers the questions one at
+a time with think time in between, submits everything through submit_quiz
+and opens the result page, following redirects like a browser. Requests
+go through the Django test client in this process, or over HTTP to a
+running server. Latency is recorded per view so the slow one stands out.
+"""
+import http.cookiejar
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+from django.test import Client
+from django.urls import Resolver404, resolve, reverse
+
+from .models import Question
+
+MATRIX_TYPES = (Question.Type.MATRIX, Question.Type.MATRIX_SINGLE)
+
+
+def percentile(values, p):
+    """
+    The p-th percentile (0-100) of an already sorted list, nearest rank.
+    """
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+class Recorder:
+    """
+    Thread-safe latencies and errors, keyed by "METHOD view_name".
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+
+    def record(self, view, seconds, error=None):
+        with self.lock:
+            self.latencies[view].append(seconds)
+            if error:
+                self.errors[(view, error)] += 1
+
+    def summary(self):
+        """
+        [(view, requests, errors, p50, p95, p99, max), ...] in seconds,
+        slowest p95 first.
+        """
+        rows = []
+        for view, values in self.latencies.items():
+            values = sorted(values)
+            errors = sum(n for (v, _), n in self.errors.items() if v == view)
+            rows.append((view, len(values), errors, percentile(values, 50), percentile(values, 95),
+                         percentile(values, 99), values[-1]))
+        return sorted(rows, key=lambda row: -row[4])
+
+
+class TestClientTransport:
+    """
+    Requests through django.test.Client, logged in with force_login.
+    """
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        response = self.client.post(path, data) if method == 'POST' else self.client.get(path)
+        return response.status_code, response.get('Location')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """
+    Requests over HTTP to a running server, logged in through the login form.
+    """
+
+    def __init__(self, base_url, username, password, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+        login = reverse('login')
+        self.request('GET', login)
+        status, _ = self.request('POST', login, {'username': username, 'password': password})
+        if status != 302:
+            raise RuntimeError(f'Could not log in as {username} (HTTP {status})')
+
+    def _csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request(self, method, path, data=None):
+        body = None
+        if method == 'POST':
+            data = dict(data or {}, csrfmiddlewaretoken=self._csrf_token())
+            body = urllib.parse.urlencode(data, doseq=True).encode()
+        url = path if urllib.parse.urlsplit(path).scheme else self.base_url + path
+        request = urllib.request.Request(url, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('Location')
+
+
+def view_name(path):
+    try:
+        return resolve(urllib.parse.urlsplit(path).path).url_name or path
+    except Resolver404:
+        return path
+
+
+def form_answer(question, rng, skill):
+    """
+    POST fields answering question, correctly with probability skill.
+    question is prefetched with options and matrix rows and columns.
+    """
+    field = f'question_{question.id}'
+    correct = rng.random() < skill
+    if question.question_type in MATRIX_TYPES:
+        columns = [col.label for col in question.matrix_cols.all()] or ['p']
+        answer = {}
+        for row in question.matrix_rows.all():
+            matches = [x.strip() for x in (row.matches or '').split(',') if x.strip()]
+            answer[f'{field}_row_{row.label}'] = matches if correct and matches else [rng.choice(columns)]
+        return answer
+    if question.question_type == Question.Type.NUMERICAL:
+        if correct and question.numerical_answer is not None:
+            return {field: [str(question.numerical_answer)]}
+        return {field: [str(rng.randint(0, 100))]}
+    options = list(question.options.all())
+    if not options:
+        return {}
+    right = [str(o.id) for o in options if o.is_correct]
+    if correct and right:
+        return {field: right}
+    if question.question_type == Question.Type.MCQ_MULTI:
+        return {field: [str(o.id) for o in rng.sample(options, rng.randint(1, len(options)))]}
+    return {field: [str(rng.choice(options).id)]}
+
+
+class Student:
+    def __init__(self, transport, quiz, questions, recorder, rng, think=3.0, skill=0.6, skip=0.1):
+        self.transport = transport
+        self.quiz = quiz
+        self.questions = questions
+        self.recorder = recorder
+        self.rng = rng
+        self.think = think
+        self.skill = skill
+        self.skip = skip
+
+    def request(self, method, path, data=None, expect=(200, 302)):
+        """
+        Sends one request and follows its redirect; returns False on error.
+        """
+        started = time.perf_counter()
+        try:
+            status, location = self.transport.request(method, path, data)
+            error = None if status in expect else f'HTTP {status}'
+        except Exception as e:
+            location, error = None, f'{type(e).__name__}: {e}'
+        self.recorder.record(f'{method} {view_name(path)}', time.perf_counter() - started, error)
+        if error:
+            return False
+        if location:
+            return self.request('GET', location, expect=(200,))
+        return True
+
+    def pause(self):
+        if self.think:
+            time.sleep(self.rng.expovariate(1 / self.think))
+
+    def take(self):
+        """
+        Takes the whole quiz; returns True if every request succeeded.
+        """
+        if not self.request('GET', reverse('take_quiz_single', args=(self.quiz.id, 1)), expect=(200,)):
+            return False
+        answers = {}
+        for index, question in enumerate(self.questions, 1):
+            self.pause()
+            path = reverse('take_quiz_single', args=(self.quiz.id, index))
+            if self.rng.random() < self.skip:
+                ok = self.request('POST', path, {'action': 'mark_next'})
+            else:
+                answer = form_answer(question, self.rng, self.skill)
+                answers.update(answer)
+                ok = self.request('POST', path, dict(answer, action='save_next'))
+            if not ok:
+                return False
+        self.pause()
+        return self.request('POST', reverse('submit_quiz', args=(self.quiz.id,)), answers)
@@ -0,0 +1,101 @@
+"""
+Content-addressed storage for question images.
+
+Files are stored under <upload_to>/<first two hex chars>/<sha256><ext>, so
+identical bytes are written once no matter how often they are uploaded or
+re-imported, and a name never changes meaning. That makes the files safe to
+cache forever: serve_media adds an immutable Cache-Control header to them.
+In production the web server serving MEDIA_ROOT should do the same for
+paths matching HASHED_NAME_RE or HASHED_DERIVATIVE_RE.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.views.static import serve
+
+HASHED_NAME_RE = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}\.[A-Za-z0-9]+$')
+# Resized variants and manifests of hashed images (see quiz.derivatives)
+HASHED_DERIVATIVE_RE = re.compile(r'^derivatives/(?:.*/)?([0-9a-f]{2})/\1[0-9a-f]{62}(?:-\d+w)?\.[A-Za-z0-9]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    @staticmethod
+    def hashed_name(name, digest):
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        ext = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], f'{digest}{ext}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        sha = hashlib.sha256()
+        for chunk in content.chunks():
+            sha.update(chunk)
+        content.seek(0)
+
+        name = self.hashed_name(name, sha.hexdigest())
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # The name is derived from the content, so an existing file with the
+        # same name already holds the same bytes
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file and rename, so concurrent saves of the
+        # same content never expose a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    return image_storage
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    django.views.static.serve, plus long-lived caching for hashed names.
+    """
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if HASHED_NAME_RE.search(path) or HASHED_DERIVATIVE_RE.search(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
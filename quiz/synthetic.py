@@ -0,0 +1,295 @@
+"""
+Realistic synthetic data at scale, for benchmarks, load tests and staging.
+
+generate() builds a question bank covering every question type and chapter
+(with options, matrix rows and columns, passages and solutions), quizzes
+assigned to groups of students, and attempts whose responses depend on the
+student's ability and the question's difficulty. Scores are graded with
+grading.grade and chapter mastery totals are kept in step, so every
+aggregate in the app has something meaningful to show.
+
+Everything is inserted with bulk_create in batches, and only one batch of
+attempts and responses is held in memory at a time.
+"""
+import math
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import bump_quiz_version
+from .grading import grade, load_answer_keys
+from .mastery import MasteryDeltas
+from .models import (
+    Attempt, ChapterMastery, MatrixCol, MatrixRow, Option, Passage, Question, Quiz, QuizQuestion, Response, SolutionBlock,
+)
+
+CHAPTERS = [code for code, _ in Question.CHAPTER_CHOICES]
+DIFFICULTIES = [code for code, _ in Question.DIFFICULTY_CHOICES]
+# Roughly the mix of a JEE paper
+TYPE_WEIGHTS = {
+    Question.Type.MCQ_SINGLE: 45, Question.Type.MCQ_MULTI: 20, Question.Type.NUMERICAL: 15,
+    Question.Type.MATRIX: 5, Question.Type.MATRIX_SINGLE: 3, Question.Type.TRUE_FALSE: 5,
+    Question.Type.ASSERTION_REASON: 7,
+}
+# Offset of each difficulty on the ability scale
+DIFFICULTY_OFFSETS = dict(zip(DIFFICULTIES, (-2.0, -1.0, 0.0, 1.0, 2.0)))
+MATRIX_TYPES = (Question.Type.MATRIX, Question.Type.MATRIX_SINGLE)
+ROW_LABELS = 'ABCD'
+COL_LABELS = 'pqrst'
+QUESTIONS_PER_PASSAGE = 3
+
+
+@dataclass
+class DatasetSizes:
+    questions: int = 2000
+    passages: int = 30
+    quizzes: int = 20
+    questions_per_quiz: int = 90
+    groups: int = 10
+    users: int = 1000
+    attempts_per_user: int = 3
+    # Share of attempts that are submitted; the rest are left in progress
+    completed: float = 0.9
+    # Share of questions a student answers, of those answered a share is
+    # also marked for review
+    answered: float = 0.85
+    marked: float = 0.1
+
+
+def question_types(rng, n):
+    """
+    n question types: every type once, then drawn by TYPE_WEIGHTS.
+    """
+    types = list(TYPE_WEIGHTS)
+    return (types + rng.choices(types, list(TYPE_WEIGHTS.values()), k=max(0, n - len(types))))[:n]
+
+
+def create_questions(count, rng, passages=(), batch_size=5000):
+    """
+    Creates count questions with options (or matrix rows and columns) and
+    solutions. The first questions cover every chapter and, when passages
+    are given, QUESTIONS_PER_PASSAGE questions are attached to each.
+    """
+    passages = list(passages)
+    questions = []
+    for i, q_type in enumerate(question_types(rng, count)):
+        question = Question(
+            question_type=q_type,
+            text=f'Synthetic question {i}: find $x$ when $x^2 = {i}$',
+            chapter=CHAPTERS[i] if i < len(CHAPTERS) else rng.choice(CHAPTERS),
+            subtopic=f'Subtopic {rng.randint(1, 5)}',
+            difficulty=rng.choice(DIFFICULTIES),
+            allow_partial_marking=rng.random() < 0.8,
+        )
+        if i < len(passages) * QUESTIONS_PER_PASSAGE:
+            question.passage = passages[i // QUESTIONS_PER_PASSAGE]
+        if q_type == Question.Type.NUMERICAL:
+            question.numerical_answer = float(rng.randint(0, 100))
+            question.numerical_tolerance = 0.5
+        elif q_type == Question.Type.ASSERTION_REASON:
+            question.assertion = f'Assertion {i}'
+            question.reason = f'Reason {i}'
+        questions.append(question)
+    questions = Question.objects.bulk_create(questions, batch_size=batch_size)
+
+    options, rows, cols, solutions = [], [], [], []
+    for question in questions:
+        q_type = question.question_type
+        if q_type in MATRIX_TYPES:
+            for label in ROW_LABELS:
+                count = 1 if q_type == Question.Type.MATRIX_SINGLE else rng.randint(1, 2)
+                matches = ','.join(sorted(rng.sample(COL_LABELS, count)))
+                rows.append(MatrixRow(question=question, label=label, text=f'Row {label}', matches=matches))
+            cols.extend(MatrixCol(question=question, label=label, text=f'Column {label}') for label in COL_LABELS)
+        elif q_type != Question.Type.NUMERICAL:
+            count = 2 if q_type == Question.Type.TRUE_FALSE else 4
+            correct = set(rng.sample(range(count), 2 if q_type == Question.Type.MCQ_MULTI else 1))
+            options.extend(Option(question=question, text=f'Option {k}', is_correct=k in correct)
+                           for k in range(count))
+        solutions.extend(SolutionBlock(question=question, text=f'Step {k + 1}.', order=k)
+                         for k in range(rng.randint(1, 2)))
+    Option.objects.bulk_create(options, batch_size=batch_size)
+    MatrixRow.objects.bulk_create(rows, batch_size=batch_size)
+    MatrixCol.objects.bulk_create(cols, batch_size=batch_size)
+    SolutionBlock.objects.bulk_create(solutions, batch_size=batch_size)
+    return questions
+
+
+class _Answerer:
+    """
+    Picks answers for a quiz's questions: right with a probability from the
+    student's ability and the question's difficulty, else a plausible wrong one.
+    """
+
+    def __init__(self, question_ids):
+        self.questions = {q.id: q for q in Question.objects.filter(id__in=question_ids)}
+        self.options = {}
+        for question_id, option_id, is_correct in Option.objects.filter(
+                question_id__in=question_ids).order_by('id').values_list('question_id', 'id', 'is_correct'):
+            self.options.setdefault(question_id, []).append((str(option_id), is_correct))
+        self.rows = {}
+        for question_id, label, matches in MatrixRow.objects.filter(
+                question_id__in=question_ids).values_list('question_id', 'label', 'matches'):
+            self.rows.setdefault(question_id, []).append((label, matches.split(',')))
+
+    def answer(self, question_id, ability, rng):
+        question = self.questions[question_id]
+        p = 1 / (1 + math.exp(DIFFICULTY_OFFSETS.get(question.difficulty, 0.0) - ability))
+        right = rng.random() < p
+        if question.question_type == Question.Type.NUMERICAL:
+            return [str(question.numerical_answer if right else rng.randint(0, 100))]
+        if question_id in self.rows:
+            return {label: matches if right else [rng.choice(COL_LABELS)] for label, matches in self.rows[question_id]}
+        options = self.options.get(question_id)
+        if not options:
+            return None
+        if right:
+            return [option_id for option_id, is_correct in options if is_correct]
+        return [rng.choice(options)[0]]
+
+
+def _create_attempts(attempts, batch_size):
+    """
+    bulk_create lets auto_now_add overwrite started_at (on the instances too);
+    the generated times are put back with one executemany rather than a
+    bulk_update CASE.
+    """
+    started = [attempt.started_at for attempt in attempts]
+    Attempt.objects.bulk_create(attempts, batch_size=batch_size)
+    table = connection.ops.quote_name(Attempt._meta.db_table)
+    column = connection.ops.quote_name(Attempt._meta.get_field('started_at').column)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {table} SET {column} = %s WHERE id = %s',
+            [(connection.ops.adapt_datetimefield_value(at), a.id) for a, at in zip(attempts, started)],
+        )
+    for attempt, at in zip(attempts, started):
+        attempt.started_at = at
+
+
+def generate(sizes=None, seed=0, prefix='synthetic-', password='synthetic', batch_size=5000, log=None):
+    """
+    Generates a dataset; returns the number of rows created per model.
+    """
+    sizes = sizes or DatasetSizes()
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    counts = {}
+    User = get_user_model()
+
+    with transaction.atomic():
+        passages = Passage.objects.bulk_create([
+            Passage(title=f'Passage {i}', text=f'A synthetic comprehension passage ({i}).')
+            for i in range(sizes.passages)
+        ])
+        passages = passages[:sizes.questions // QUESTIONS_PER_PASSAGE]
+        questions = create_questions(sizes.questions, rng, passages, batch_size)
+        question_ids = [q.id for q in questions]
+        counts.update(passages=len(passages), questions=len(questions))
+        log(f'{len(questions)} questions, {len(passages)} passages')
+
+        groups = [Group.objects.create(name=f'{prefix}batch-{i}') for i in range(sizes.groups)]
+        quizzes = Quiz.objects.bulk_create([
+            Quiz(title=f'{prefix}test-{i}', description='Synthetic mock test',
+                 time_limit_minutes=180, is_public=not groups)
+            for i in range(sizes.quizzes)
+        ])
+        per_quiz = min(sizes.questions_per_quiz, len(question_ids))
+        quiz_questions = {}
+        rows = []
+        for quiz in quizzes:
+            quiz_questions[quiz.id] = rng.sample(question_ids, per_quiz)
+            rows.extend(QuizQuestion(quiz=quiz, question_id=question_id, order=order, marks=4.0, negative_marks=1.0)
+                        for order, question_id in enumerate(quiz_questions[quiz.id], 1))
+        QuizQuestion.objects.bulk_create(rows, batch_size=batch_size)
+        group_quizzes = {group.id: [] for group in groups}
+        through = Quiz.assigned_groups.through
+        assignments = []
+        for i, quiz in enumerate(quizzes):
+            # Each quiz goes to a couple of groups, so groups share some tests
+            for group in {groups[i % len(groups)], rng.choice(groups)} if groups else ():
+                assignments.append(through(quiz_id=quiz.id, group_id=group.id))
+                group_quizzes[group.id].append(quiz.id)
+        through.objects.bulk_create(assignments)
+        counts.update(quizzes=len(quizzes), groups=len(groups))
+
+        password_hash = make_password(password)
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}{i}', password=password_hash) for i in range(sizes.users)
+        ], batch_size=batch_size)
+        membership = User.groups.through
+        user_group = {}
+        if groups:
+            for user in users:
+                user_group[user.id] = rng.choice(groups).id
+            membership.objects.bulk_create([
+                membership(user_id=user_id, group_id=group_id) for user_id, group_id in user_group.items()
+            ], batch_size=batch_size)
+        counts['users'] = len(users)
+        log(f'{len(quizzes)} quizzes, {len(groups)} groups, {len(users)} users')
+
+    answerer = _Answerer(question_ids)
+    keys = load_answer_keys(question_ids)
+    now = timezone.now()
+    all_quizzes = [quiz.id for quiz in quizzes]
+    # The students are new, so their mastery rows are inserted once at the end
+    deltas = MasteryDeltas()
+    counts.update(attempts=0, responses=0)
+    # Whole students per batch, so no more than about batch_size responses
+    # (and their attempts) are in memory at once
+    students_per_batch = max(1, batch_size // max(1, per_quiz * sizes.attempts_per_user))
+    for start in range(0, len(users), students_per_batch):
+        attempts, responses = [], []
+        for user in users[start:start + students_per_batch]:
+            ability = rng.gauss(0, 1)
+            available = group_quizzes.get(user_group.get(user.id)) or all_quizzes
+            for quiz_id in rng.sample(available, min(sizes.attempts_per_user, len(available))):
+                started_at = now - timedelta(days=rng.uniform(0, 60))
+                attempt = Attempt(user=user, quiz_id=quiz_id, started_at=started_at)
+                completed = rng.random() < sizes.completed
+                reached = quiz_questions[quiz_id]
+                if completed:
+                    attempt.completed_at = started_at + timedelta(minutes=rng.uniform(30, 180))
+                else:
+                    # Only some of an in-progress attempt's questions are reached
+                    reached = reached[:rng.randint(0, len(reached))]
+                for question_id in reached:
+                    answer = answerer.answer(question_id, ability, rng) if rng.random() < sizes.answered else None
+                    if answer is None:
+                        status = Response.QuestionStatus.NOT_ANSWERED
+                    elif rng.random() < sizes.marked:
+                        status = Response.QuestionStatus.ANSWERED_MARKED
+                    else:
+                        status = Response.QuestionStatus.ANSWERED
+                    responses.append(Response(attempt=attempt, question_id=question_id, answer_data=answer,
+                                              status=status, time_spent=round(rng.lognormvariate(4, 0.6), 1)))
+                    if completed:
+                        marks, is_correct = grade(keys[question_id], answer, 4.0, 1.0)
+                        attempt.score += marks
+                        question = answerer.questions[question_id]
+                        deltas.add(user.id, question.chapter, question.difficulty, answer, marks, is_correct)
+                attempts.append(attempt)
+        with transaction.atomic():
+            _create_attempts(attempts, batch_size)
+            Response.objects.bulk_create(responses, batch_size=batch_size)
+        counts['attempts'] += len(attempts)
+        counts['responses'] += len(responses)
+        log(f'  {min(start + students_per_batch, len(users))}/{len(users)} students, '
+            f'{counts["responses"]} responses')
+
+    ChapterMastery.objects.bulk_create([
+        ChapterMastery(user_id=user_id, chapter=chapter, difficulty=difficulty,
+                       attempted=attempted, correct=correct, marks=marks)
+        for (user_id, chapter, difficulty), (attempted, correct, marks) in deltas.totals.items()
+    ], batch_size=batch_size)
+    counts['chapter mastery rows'] = len(deltas.totals)
+
+    for quiz_id in all_quizzes:
+        bump_quiz_version(quiz_id)
+    return counts
@@ -0,0 +1,184 @@
+"""
+Time-on-task telemetry for take_quiz_single.
+
+The page queues one visit (question, entered, left) per stretch of time a
+question is on screen and sends the queue with navigator.sendBeacon when
+the page is hidden. record_visits() only validates the events and appends
+them to an in-process buffer, so the request does no database write.
+
+A daemon thread started on first use flushes the buffer every
+FLUSH_INTERVAL seconds, or sooner once FLUSH_SIZE visits are waiting. A
+flush bulk-creates the QuestionVisit rows and recomputes
+Response.time_spent of the affected attempts from them in one UPDATE.
+Recomputing rather than adding keeps it correct with several processes
+flushing at once. What is still buffered when the process exits is flushed
+by an atexit hook; a crash loses at most one interval of telemetry. A
+batch that fails to write goes back to the front of the buffer and is
+retried with the next flush, still within MAX_BUFFERED.
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .grading import chunked
+from .models import Attempt, Question, QuestionVisit, Response
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 2.0
+FLUSH_SIZE = 500
+# Beyond this the oldest visits are dropped rather than growing without bound
+MAX_BUFFERED = 50000
+MAX_EVENTS_PER_REQUEST = 200
+# A visit longer than this (a tab left open overnight) is capped
+MAX_VISIT_SECONDS = 3 * 60 * 60
+
+_buffer = []
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_thread = None
+dropped = 0
+
+
+class TelemetryError(ValueError):
+    pass
+
+
+def _timestamp(value):
+    try:
+        return datetime.fromtimestamp(float(value) / 1000, tz=timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise TelemetryError(f'bad timestamp {value!r}')
+
+
+def parse_events(events, question_ids):
+    """
+    QuestionVisit field values for a beacon's events; question_ids are the
+    questions of the attempt's quiz. Raises TelemetryError for bad input.
+    """
+    if not isinstance(events, list) or len(events) > MAX_EVENTS_PER_REQUEST:
+        raise TelemetryError('events must be a list of at most %d visits' % MAX_EVENTS_PER_REQUEST)
+    visits = []
+    for event in events:
+        if not isinstance(event, dict):
+            raise TelemetryError('each event must be an object')
+        try:
+            question_id = int(event.get('q'))
+        except (TypeError, ValueError):
+            raise TelemetryError(f'bad question {event.get("q")!r}')
+        if question_id not in question_ids:
+            raise TelemetryError(f'question {question_id} is not in this quiz')
+        entered_at, left_at = _timestamp(event.get('enter')), _timestamp(event.get('leave'))
+        if left_at < entered_at:
+            raise TelemetryError('visit leaves before it enters')
+        seconds = min((left_at - entered_at).total_seconds(), MAX_VISIT_SECONDS)
+        visits.append((question_id, entered_at, left_at, seconds))
+    return visits
+
+
+def _trim():
+    """
+    Drops the oldest visits beyond MAX_BUFFERED; called with _lock held.
+    """
+    global dropped
+    overflow = len(_buffer) - MAX_BUFFERED
+    if overflow > 0:
+        del _buffer[:overflow]
+        dropped += overflow
+
+
+def record_visits(attempt_id, visits):
+    """
+    Queues parsed visits of an attempt for the next flush.
+    """
+    with _lock:
+        _buffer.extend((attempt_id, *visit) for visit in visits)
+        _trim()
+        waiting = len(_buffer)
+    _ensure_thread()
+    if waiting >= FLUSH_SIZE:
+        _wakeup.set()
+
+
+def flush():
+    """
+    Writes everything buffered so far; returns the number of visits written.
+    """
+    with _lock:
+        batch = _buffer[:]
+        del _buffer[:]
+    if not batch:
+        return 0
+    try:
+        with transaction.atomic():
+            QuestionVisit.objects.bulk_create([
+                QuestionVisit(attempt_id=attempt_id, question_id=question_id,
+                              entered_at=entered_at, left_at=left_at, seconds=seconds)
+                for attempt_id, question_id, entered_at, left_at, seconds in batch
+            ], batch_size=FLUSH_SIZE)
+            total = QuestionVisit.objects.filter(
+                attempt_id=OuterRef('attempt_id'), question_id=OuterRef('question_id')
+            ).values('attempt_id', 'question_id').annotate(total=Sum('seconds')).values('total')
+            for attempt_ids in chunked({visit[0] for visit in batch}):
+                Response.objects.filter(attempt_id__in=attempt_ids).update(
+                    time_spent=Coalesce(Subquery(total), 0.0)
+                )
+    except Exception as e:
+        logger.exception('Could not write %d question visits; retrying with the next flush', len(batch))
+        _requeue(batch, e)
+        return 0
+    return len(batch)
+
+
+def _requeue(batch, error):
+    """
+    Puts a batch that failed to write back in front of what was buffered
+    since. Visits of attempts or questions deleted in the meantime can never
+    be written, so they are dropped rather than failing every later flush.
+    """
+    global dropped
+    lost = 0
+    if isinstance(error, IntegrityError):
+        try:
+            attempts, questions = set(), set()
+            for attempt_ids in chunked({visit[0] for visit in batch}):
+                attempts.update(Attempt.objects.filter(id__in=attempt_ids).values_list('id', flat=True))
+            for question_ids in chunked({visit[1] for visit in batch}):
+                questions.update(Question.objects.filter(id__in=question_ids).values_list('id', flat=True))
+        except Exception:
+            logger.exception('Could not check the attempts and questions of %d question visits', len(batch))
+        else:
+            kept = [visit for visit in batch if visit[0] in attempts and visit[1] in questions]
+            lost = len(batch) - len(kept)
+            batch = kept
+    with _lock:
+        dropped += lost
+        _buffer[:0] = batch
+        _trim()
+
+
+def _run():
+    while True:
+        _wakeup.wait(FLUSH_INTERVAL)
+        _wakeup.clear()
+        close_old_connections()
+        flush()
+
+
+def _ensure_thread():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock:
+        # Started lazily so that each forked worker gets its own
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='telemetry-flush', daemon=True)
+            _thread.start()
+
+
+atexit.register(flush)
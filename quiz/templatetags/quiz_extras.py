@@ -1,4 +1,7 @@
 from django import template
+from django.utils.html import format_html, format_html_join
+
+from quiz.derivatives import DERIVATIVE_FORMATS, variants_for
 
 register = template.Library()
 
@@ -7,3 +10,34 @@ def dict_get(dictionary, key):
     if not dictionary:
         return None
     return dictionary.get(str(key))
+
+def _srcset(image, variants):
+    return ', '.join(f'{image.storage.url(name)} {width}w' for width, name in variants)
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', loading='lazy', alt='', **attrs):
+    """
+    <img> for a stored image, wrapped in a <picture> offering the WebP and
+    JPEG variants from quiz.derivatives once they exist. Extra keyword
+    arguments (class, style, ...) become attributes of the <img>.
+
+    Usage: {% responsive_image question.image sizes="(max-width: 768px) 100vw, 768px" style="..." %}
+    """
+    if not image:
+        return ''
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    manifest = variants_for(image)
+    if not manifest:
+        return format_html('<img src="{}" alt="{}" loading="{}" decoding="async"{}>',
+                           image.url, alt, loading, extra)
+
+    variants = manifest['variants']
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, _srcset(image, variants[fmt]), sizes)
+         for fmt, (_, mime, _) in DERIVATIVE_FORMATS.items() if fmt != 'jpeg' and variants.get(fmt)),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="{}" decoding="async"{}></picture>',
+        sources, image.url, _srcset(image, variants.get('jpeg', [])), sizes, alt, loading, extra,
+    )
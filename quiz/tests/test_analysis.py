@@ -0,0 +1,88 @@
+import json
+from io import StringIO
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from quiz import analytics
+from quiz.models import Attempt, Option, Question, Quiz, QuizQuestion, Response
+from quiz.views import calculate_final_score
+
+
+class ItemAnalysisTests(TestCase):
+    """
+    Two single-answer questions (A correct) answered by four students:
+    [q1, q2] = [A, A], [A, B], [B, A], [B, B].
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.quiz = Quiz.objects.create(title='Analysed', time_limit_minutes=30)
+        cls.questions, cls.options = [], []
+        for i in range(2):
+            question = Question.objects.create(text=f'Q{i}', question_type=Question.Type.MCQ_SINGLE)
+            QuizQuestion.objects.create(quiz=cls.quiz, question=question, order=i, marks=4.0, negative_marks=1.0)
+            cls.questions.append(question)
+            cls.options.append([Option.objects.create(question=question, text=label, is_correct=label == 'A')
+                                for label in 'AB'])
+        cls.choices = [(0, 0), (0, 1), (1, 0), (1, 1)]
+        for i, choice in enumerate(cls.choices):
+            attempt = Attempt.objects.create(quiz=cls.quiz, user=User.objects.create_user(f'student{i}'))
+            Response.objects.bulk_create([
+                Response(attempt=attempt, question=question, answer_data=[str(cls.options[q][choice[q]].id)])
+                for q, question in enumerate(cls.questions)
+            ])
+            calculate_final_score(attempt)
+        # Unfinished attempts are left out
+        Attempt.objects.create(quiz=cls.quiz, user=User.objects.create_user('late'))
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_statistics(self):
+        analysis = analytics.analyze_quiz(self.quiz.id)
+        # +4 for a right answer, -1 for a wrong one
+        scores = np.array([8.0, 3.0, 3.0, -2.0])
+        self.assertEqual(analysis.attempts, 4)
+        self.assertAlmostEqual(analysis.mean_score, scores.mean())
+        self.assertAlmostEqual(analysis.score_sd, scores.std())
+        for q, item in enumerate(analysis.items):
+            correct = np.array([c[q] == 0 for c in self.choices], dtype=float)
+            self.assertEqual(item.p_value, 0.5)
+            self.assertAlmostEqual(item.point_biserial, np.corrcoef(correct, scores)[0, 1])
+            self.assertEqual([(o.label, o.count, o.is_correct) for o in item.options],
+                             [('A', 2, True), ('B', 2, False)])
+            self.assertAlmostEqual(item.average_marks, (2 * 4 - 2 * 1) / 4)
+
+    def test_cached_table_follows_new_attempts(self):
+        self.assertEqual(analytics.get_answer_table(self.quiz.id).attempts, 4)
+        attempt = Attempt.objects.create(quiz=self.quiz, user=get_user_model().objects.create_user('another'))
+        Response.objects.create(attempt=attempt, question=self.questions[0],
+                                answer_data=[str(self.options[0][0].id)])
+        with self.captureOnCommitCallbacks(execute=True):
+            calculate_final_score(attempt)
+        self.assertEqual(analytics.get_answer_table(self.quiz.id).attempts, 5)
+        self.assertEqual(analytics.analyze_quiz(self.quiz.id).items[0].p_value, 0.6)
+
+    def test_view(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('item_analysis', args=(self.quiz.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['analysis'].attempts, 4)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('item_analysis', str(self.quiz.id), '--json', stdout=out)
+        data = json.loads(out.getvalue())
+        self.assertEqual(data['attempts'], 4)
+        # Written whole, not a line per token
+        self.assertEqual(out.getvalue(), json.dumps(data, indent=2) + '\n')
+        out = StringIO()
+        call_command('item_analysis', str(self.quiz.id), stdout=out)
+        self.assertIn('4 completed attempts', out.getvalue())
@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from quiz import benchmarks
+
+
+class BenchmarkTests(TransactionTestCase):
+    # Each case flushes the database
+
+    def test_run(self):
+        results = benchmarks.run(['calculate_final_score'], quick=True, repeat=1)
+        self.assertEqual([result.key for result in results],
+                         ['calculate_final_score[10]', 'calculate_final_score[100]'])
+        self.assertTrue(all(result.queries > 0 for result in results))
+
+        baseline = {result.key: {'seconds': result.seconds, 'queries': result.queries} for result in results}
+        self.assertEqual(benchmarks.compare(results, baseline), [])
+
+    def test_unknown_benchmark(self):
+        with self.assertRaises(KeyError):
+            benchmarks.run(['nope'])
+
+
+class BaselineTests(SimpleTestCase):
+
+    def test_compare(self):
+        results = [benchmarks.Result('submit', 10, 0.5, 20, 5), benchmarks.Result('submit', 100, 0.011, 20, 5),
+                   benchmarks.Result('result', 10, 0.1, 9, 5)]
+        baseline = {'submit[10]': {'seconds': 0.1, 'queries': 19}, 'submit[100]': {'seconds': 0.001, 'queries': 20}}
+        messages = [(result.key, message) for result, message in benchmarks.compare(results, baseline, tolerance=2)]
+        # submit[100] is 11x slower, but by less than MIN_SLOWDOWN_SECONDS
+        self.assertEqual(messages, [('submit[10]', '20 queries, baseline 19'),
+                                    ('submit[10]', '500.0 ms, baseline 100.0 ms (5.0x)')])
+
+    def test_save_baseline_keeps_other_entries(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'baseline.json')
+            with open(path, 'w') as f:
+                json.dump({'result[10]': {'seconds': 0.1, 'queries': 9}}, f)
+            benchmarks.save_baseline([benchmarks.Result('submit', 10, 0.25, 20, 5)], path)
+            self.assertEqual(benchmarks.load_baseline(path), {
+                'result[10]': {'seconds': 0.1, 'queries': 9},
+                'submit[10]': {'seconds': 0.25, 'queries': 20},
+            })
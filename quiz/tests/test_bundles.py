@@ -0,0 +1,52 @@
+import json
+import os
+import zipfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from quiz.bundles import BUNDLE_FORMAT, BundleError, BundleReader
+from quiz.models import Option, Question, Quiz, QuizQuestion
+from quiz.tests.test_import import ImportFilesMixin
+
+
+class BundleTests(ImportFilesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.run_import()
+        self.quiz = Quiz.objects.create(title='Bundled', time_limit_minutes=30)
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=self.quiz, question=question, order=i, marks=3.0)
+            for i, question in enumerate(Question.objects.order_by('id'), 1)
+        ])
+        self.path = os.path.join(self.source, 'bundle.zip')
+
+    def test_export_and_import(self):
+        call_command('export_bundle', str(self.quiz.id), '-o', self.path, stdout=StringIO())
+        with zipfile.ZipFile(self.path) as zf:
+            manifest = json.loads(zf.read('manifest.json'))
+            media = [name for name in zf.namelist() if name.startswith('media/')]
+        self.assertEqual(manifest['format'], BUNDLE_FORMAT)
+        self.assertEqual((manifest['quizzes'], manifest['questions']), (1, 3))
+        # Two image files with the same bytes travel once
+        self.assertEqual(len(media), 1)
+
+        call_command('import_bundle', self.path, stdout=StringIO())
+        copy = Quiz.objects.exclude(pk=self.quiz.pk).get(title='Bundled')
+        self.assertEqual(copy.time_limit_minutes, 30)
+        self.assertEqual(list(QuizQuestion.objects.filter(quiz=copy).values_list('question__text', 'marks')),
+                         list(QuizQuestion.objects.filter(quiz=self.quiz).values_list('question__text', 'marks')))
+        self.assertEqual(Question.objects.count(), 6)
+        original = Option.objects.filter(question__quizquestion__quiz=self.quiz).exclude(image='').get()
+        imported = Option.objects.filter(question__quizquestion__quiz=copy).exclude(image='').get()
+        self.assertEqual(imported.image.name, original.image.name)
+
+    def test_rejects_other_zips(self):
+        with zipfile.ZipFile(self.path, 'w') as zf:
+            zf.writestr('manifest.json', json.dumps({'format': 'something else'}))
+        with self.assertRaises(BundleError):
+            BundleReader(self.path).load()
+        with self.assertRaises(CommandError):
+            call_command('import_bundle', self.path, stdout=StringIO())
@@ -0,0 +1,107 @@
+from io import StringIO
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from quiz.calibration import RASCH, TWO_PL, ResponseMatrix, difficulty_label, fit, load_response_matrix
+from quiz.models import Attempt, Option, Question, Quiz, Response
+
+
+def simulated_matrix(n_persons=500, difficulties=np.linspace(-2, 2, 20), seed=0):
+    rng = np.random.default_rng(seed)
+    theta = rng.normal(0, 1, n_persons)
+    b = np.asarray(difficulties)
+    person, item = np.meshgrid(np.arange(n_persons), np.arange(len(b)), indexing='ij')
+    person, item = person.ravel(), item.ravel()
+    p = 1 / (1 + np.exp(-(theta[person] - b[item])))
+    y = (rng.random(len(p)) < p).astype(np.float64)
+    return ResponseMatrix(person=person.astype(np.int32), item=item.astype(np.int32), y=y,
+                          user_ids=np.arange(n_persons), question_ids=np.arange(len(b)) + 100), b
+
+
+class FitTests(SimpleTestCase):
+
+    def test_rasch_recovers_difficulties(self):
+        matrix, b = simulated_matrix()
+        result = fit(matrix, model=RASCH)
+        self.assertTrue(result.converged)
+        self.assertTrue(result.estimable.all())
+        self.assertGreater(np.corrcoef(result.difficulty, b)[0, 1], 0.98)
+        # Joint maximum likelihood overstates the spread a little with few items
+        self.assertLess(np.abs(result.difficulty - result.difficulty.mean() - b).max(), 0.5)
+
+    def test_two_pl(self):
+        matrix, b = simulated_matrix()
+        result = fit(matrix, model=TWO_PL)
+        self.assertGreater(np.corrcoef(result.difficulty, b)[0, 1], 0.95)
+        self.assertTrue((result.discrimination > 0).all())
+
+    def test_items_everyone_got_right_are_not_estimable(self):
+        matrix, _ = simulated_matrix(n_persons=50)
+        matrix.y[matrix.item == 0] = 1.0
+        result = fit(matrix)
+        self.assertFalse(result.estimable[0])
+        self.assertTrue(result.estimable[1:].all())
+
+    def test_anchored_items_keep_their_values(self):
+        matrix, b = simulated_matrix()
+        fixed = np.zeros(len(b), dtype=bool)
+        fixed[[0, -1]] = True
+        result = fit(matrix, init_b=b.copy(), fixed=fixed)
+        self.assertEqual(result.difficulty[0], b[0])
+        self.assertEqual(result.difficulty[-1], b[-1])
+
+    def test_difficulty_label(self):
+        self.assertEqual(difficulty_label(-3.0), 'VERY_EASY')
+        self.assertEqual(difficulty_label(0.0), 'MODERATE')
+        self.assertEqual(difficulty_label(4.0), 'VERY_DIFFICULT')
+
+
+class CalibrateItemsCommandTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Four questions of rising difficulty: student i gets question j
+        # right unless i is a multiple of j + 2
+        quiz = Quiz.objects.create(title='Calibration')
+        questions = []
+        for j in range(4):
+            question = Question.objects.create(text=f'Q{j}', question_type=Question.Type.MCQ_SINGLE)
+            right = Option.objects.create(question=question, text='right', is_correct=True)
+            wrong = Option.objects.create(question=question, text='wrong')
+            questions.append((question, right, wrong))
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'student{i}') for i in range(40))
+        attempts = Attempt.objects.bulk_create(
+            Attempt(user=user, quiz=quiz, completed_at=timezone.now()) for user in users)
+        Response.objects.bulk_create(
+            Response(attempt=attempt, question=question,
+                     answer_data=[str((wrong if i % (j + 2) == 0 else right).id)])
+            for i, attempt in enumerate(attempts) for j, (question, right, wrong) in enumerate(questions)
+        )
+
+    def test_load_response_matrix(self):
+        matrix = load_response_matrix()
+        self.assertEqual(matrix.n_responses, 160)
+        self.assertEqual((len(matrix.user_ids), len(matrix.question_ids)), (40, 4))
+        # Question 0 is missed by the 20 even students
+        self.assertEqual(matrix.y[matrix.item == 0].sum(), 20)
+
+    def test_writes_parameters(self):
+        out = StringIO()
+        call_command('calibrate_items', '--min-responses', '10', '--update-labels', stdout=out)
+        self.assertIn('Calibrated', out.getvalue())
+        calibrated = list(Question.objects.filter(irt_difficulty__isnull=False).order_by('text'))
+        self.assertEqual(len(calibrated), 4)
+        # Question 0 is missed most often, so it comes out hardest
+        difficulties = [question.irt_difficulty for question in calibrated]
+        self.assertEqual(difficulties, sorted(difficulties, reverse=True))
+        for question in calibrated:
+            self.assertEqual(question.difficulty, difficulty_label(question.irt_difficulty))
+
+        out = StringIO()
+        call_command('calibrate_items', '--incremental', stdout=out)
+        self.assertIn('No new responses', out.getvalue())
@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from quiz import cohorts
+from quiz.models import Attempt, Option, Question, Quiz, QuizQuestion, Response
+from quiz.views import calculate_final_score
+
+
+class CohortReportTests(TestCase):
+    """
+    A group of three students and a quiz of two single-answer questions
+    (option A correct) from different chapters.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.quiz = Quiz.objects.create(title='Cohort quiz')
+        cls.options = []
+        for i, chapter in enumerate(['KINEMATICS_1D', 'NLM']):
+            question = Question.objects.create(text=f'Q{i}', question_type=Question.Type.MCQ_SINGLE, chapter=chapter)
+            QuizQuestion.objects.create(quiz=cls.quiz, question=question, order=i)
+            cls.options.append([Option.objects.create(question=question, text=label, is_correct=label == 'A')
+                                for label in 'AB'])
+        cls.group = Group.objects.create(name='Batch A')
+        cls.users = [User.objects.create_user(f'student{i}') for i in range(3)]
+        cls.group.user_set.add(*cls.users)
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def complete(self, user, choices=(0, 1)):
+        attempt = Attempt.objects.create(quiz=self.quiz, user=user)
+        Response.objects.bulk_create([
+            Response(attempt=attempt, question=options[0].question, answer_data=[str(options[choice].id)])
+            for options, choice in zip(self.options, choices)
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            calculate_final_score(attempt)
+        return attempt
+
+    def test_report(self):
+        self.complete(self.users[0])
+        self.complete(self.users[1], (0, 0))
+        report = cohorts.get_report(self.group.id, self.quiz.id)
+        self.assertEqual((report.members, report.completed, report.attempts), (3, 2, 2))
+        self.assertAlmostEqual(report.completion_rate, 200 / 3)
+        self.assertEqual((report.score_min, report.score_max, report.max_marks), (3.0, 8.0, 8.0))
+        self.assertEqual(sum(n for _, _, n in report.histogram), 2)
+        # Weakest chapter first
+        self.assertEqual([(c.chapter, c.attempted, c.correct) for c in report.chapters],
+                         [('NLM', 2, 1), ('KINEMATICS_1D', 2, 2)])
+
+    def test_cached_report_is_reused(self):
+        self.complete(self.users[0])
+        report = cohorts.get_report(self.group.id, self.quiz.id)
+        self.assertEqual(cohorts.get_report(self.group.id, self.quiz.id).computed_at, report.computed_at)
+
+    def test_completed_attempt_drops_the_report(self):
+        self.complete(self.users[0])
+        self.assertEqual(cohorts.get_report(self.group.id, self.quiz.id).completed, 1)
+        self.complete(self.users[1])
+        self.assertEqual(cohorts.get_report(self.group.id, self.quiz.id).completed, 2)
+
+    def test_membership_change_drops_the_report(self):
+        self.assertEqual(cohorts.get_report(self.group.id, self.quiz.id).members, 3)
+        self.group.user_set.remove(self.users[0])
+        self.assertEqual(cohorts.get_report(self.group.id, self.quiz.id).members, 2)
+
+    def plant(self, report):
+        """
+        Puts report back in the cache as if this process had missed the
+        signals that would have dropped it.
+        """
+        cache.set(cohorts.cohort_cache_key(cohorts.CACHE_NAME, self.group.id, self.quiz.id), report)
+
+    def test_deleted_attempt_rebuilds_the_report(self):
+        first = self.complete(self.users[0])
+        self.complete(self.users[1])
+        stale = cohorts.get_report(self.group.id, self.quiz.id)
+        first.delete()
+        self.plant(stale)
+        report = cohorts.get_report(self.group.id, self.quiz.id)
+        self.assertEqual((report.completed, report.attempts), (1, 1))
+
+    def test_attempt_completed_elsewhere_rebuilds_the_report(self):
+        first = self.complete(self.users[0])
+        stale = cohorts.get_report(self.group.id, self.quiz.id)
+        # Same number of completed attempts, but a newer one
+        first.delete()
+        self.complete(self.users[1], (0, 0))
+        self.plant(stale)
+        report = cohorts.get_report(self.group.id, self.quiz.id)
+        self.assertNotEqual(report.computed_at, stale.computed_at)
+        self.assertEqual(report.score_max, 8.0)
+
+    def test_membership_change_elsewhere_rebuilds_the_report(self):
+        stale = cohorts.get_report(self.group.id, self.quiz.id)
+        # A queryset delete sends no m2m_changed
+        Group.user_set.through.objects.filter(group=self.group, user=self.users[0]).delete()
+        self.plant(stale)
+        self.assertEqual(cohorts.get_report(self.group.id, self.quiz.id).members, 2)
+
+    def test_view(self):
+        self.complete(self.users[0])
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('cohort_dashboard'), {'group': self.group.id, 'quiz': self.quiz.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report'].completed, 1)
+        self.assertIsNone(self.client.get(reverse('cohort_dashboard')).context['report'])
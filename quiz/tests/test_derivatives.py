@@ -0,0 +1,63 @@
+import os
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import ImageFieldFile
+from django.test import SimpleTestCase
+from PIL import Image
+
+from quiz import derivatives
+from quiz.models import Question
+from quiz.storage import ContentAddressedStorage
+from quiz.templatetags.quiz_extras import responsive_image
+from quiz.tests.utils import TemporaryMediaMixin, png_bytes
+
+
+class DerivativeTests(TemporaryMediaMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.dict(derivatives._manifests, clear=True))
+        self.storage = ContentAddressedStorage()
+        self.name = self.storage.save('questions/diagram.png', ContentFile(png_bytes(size=(700, 350))))
+
+    def image(self):
+        return ImageFieldFile(None, Question._meta.get_field('image'), self.name)
+
+    def test_build_writes_variants_and_manifest(self):
+        self.assertIsNone(derivatives.variants_for(self.image()))
+        self.assertEqual(derivatives.build([self.name, self.name, ''], self.storage), (1, 0))
+
+        manifest = derivatives.variants_for(self.image())
+        self.assertEqual((manifest['width'], manifest['height']), (700, 350))
+        for fmt, (ext, _, _) in derivatives.DERIVATIVE_FORMATS.items():
+            variants = manifest['variants'][fmt]
+            self.assertEqual([width for width, _ in variants], [320, 640, 700])
+            for width, name in variants:
+                self.assertTrue(name.endswith(f'-{width}w.{ext}'))
+                with Image.open(self.storage.path(name)) as variant:
+                    self.assertEqual(variant.size, (width, width // 2))
+        # Built once; force rebuilds
+        self.assertEqual(derivatives.build([self.name], self.storage), (0, 0))
+        self.assertEqual(derivatives.build([self.name], self.storage, force=True), (1, 0))
+
+    def test_build_reports_broken_images(self):
+        broken = self.storage.save('questions/broken.png', ContentFile(b'not a png'))
+        errors = []
+        self.assertEqual(derivatives.build([broken, self.name], self.storage, on_error=errors.append), (1, 1))
+        self.assertIn(broken, errors[0])
+        self.assertFalse(os.path.exists(self.storage.path(derivatives.manifest_name(broken))))
+
+    def test_responsive_image(self):
+        self.assertEqual(responsive_image(None), '')
+        html = responsive_image(self.image(), alt='Diagram', style='width: 50%')
+        self.assertTrue(html.startswith('<img '))
+        self.assertIn('style="width: 50%"', html)
+
+        derivatives.build([self.name], self.storage)
+        html = responsive_image(self.image(), sizes='768px', alt='Diagram')
+        self.assertTrue(html.startswith('<picture><source type="image/webp"'))
+        self.assertIn('-320w.webp 320w', html)
+        self.assertIn('-700w.jpg 700w', html)
+        self.assertIn('sizes="768px"', html)
+        self.assertIn('alt="Diagram"', html)
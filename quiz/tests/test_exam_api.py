@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz.models import Attempt, Option, Question, Quiz, QuizQuestion, Response
+
+
+@override_settings(QUIZ_SERIALIZE_WRITES=False)
+class ExamApiTests(TestCase):
+    # The writer thread would not see the test's transaction, so saves run
+    # through sync_to_async here
+
+    def setUp(self):
+        self.quiz = Quiz.objects.create(title='Autosaved', time_limit_minutes=30)
+        self.questions = []
+        for i in range(3):
+            question = Question.objects.create(text=f'Q{i}', question_type=Question.Type.MCQ_SINGLE)
+            Option.objects.bulk_create([Option(question=question, text=label, is_correct=label == 'A')
+                                        for label in 'AB'])
+            self.questions.append(question)
+        self.questions.append(Question.objects.create(text='N', question_type=Question.Type.NUMERICAL,
+                                                      numerical_answer=42.0))
+        QuizQuestion.objects.bulk_create([QuizQuestion(quiz=self.quiz, question=question, order=i)
+                                          for i, question in enumerate(self.questions, 1)])
+        # Not in the quiz
+        Question.objects.create(text='Elsewhere', question_type=Question.Type.NUMERICAL)
+        User = get_user_model()
+        self.user = User.objects.create_user('student')
+        self.other = User.objects.create_user('other')
+        self.attempt = Attempt.objects.create(quiz=self.quiz, user=self.user)
+
+    async def test_autosave(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('autosave', args=(self.attempt.id,))
+        question = self.questions[-1]
+        response = await self.async_client.post(url, {'question': question.id, f'question_{question.id}': '42'})
+        self.assertEqual(response.json(), {'question': question.id, 'status': Response.QuestionStatus.ANSWERED})
+        saved = await Response.objects.aget(attempt=self.attempt, question=question)
+        self.assertEqual(saved.answer_data, ['42'])
+
+        response = await self.async_client.post(url, {'question': question.id, 'marked': '1'})
+        self.assertEqual(response.json()['status'], Response.QuestionStatus.MARKED_FOR_REVIEW)
+        saved = await Response.objects.aget(attempt=self.attempt, question=question)
+        self.assertIsNone(saved.answer_data)
+
+        other = await Question.objects.aget(text='Elsewhere')
+        for data in ({'question': 'x'}, {'question': other.id}):
+            self.assertEqual((await self.async_client.post(url, data)).status_code, 400)
+        self.assertEqual((await self.async_client.get(url)).status_code, 405)
+
+    async def test_autosave_after_time_is_up(self):
+        await Attempt.objects.filter(pk=self.attempt.pk).aupdate(
+            started_at=timezone.now() - timedelta(minutes=self.quiz.time_limit_minutes + 1))
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(reverse('autosave', args=(self.attempt.id,)),
+                                                {'question': self.questions[0].id})
+        self.assertEqual(response.status_code, 409)
+
+    async def test_heartbeat(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('heartbeat', args=(self.attempt.id,))
+        data = (await self.async_client.get(url)).json()
+        self.assertFalse(data['completed'])
+        self.assertGreater(data['remaining_seconds'], (self.quiz.time_limit_minutes - 1) * 60)
+
+        await Attempt.objects.filter(pk=self.attempt.pk).aupdate(completed_at=timezone.now())
+        data = (await self.async_client.get(url)).json()
+        self.assertEqual(data, {'completed': True, 'remaining_seconds': 0,
+                                'result_url': reverse('result', args=(self.attempt.id,))})
+
+    async def test_palette(self):
+        await Response.objects.acreate(attempt=self.attempt, question=self.questions[1], answer_data=['1'],
+                                       status=Response.QuestionStatus.ANSWERED_MARKED)
+        await self.async_client.aforce_login(self.user)
+        data = (await self.async_client.get(reverse('palette', args=(self.attempt.id,)))).json()
+        not_visited = Response.QuestionStatus.NOT_VISITED
+        self.assertEqual(data['statuses'], [not_visited, Response.QuestionStatus.ANSWERED_MARKED,
+                                            not_visited, not_visited])
+        self.assertEqual(data['counts'][not_visited], 3)
+
+    async def test_other_students_attempts(self):
+        await self.async_client.aforce_login(self.other)
+        for name in ('heartbeat', 'palette'):
+            response = await self.async_client.get(reverse(name, args=(self.attempt.id,)))
+            self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post(reverse('autosave', args=(self.attempt.id,)),
+                                                {'question': self.questions[0].id})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from quiz.exporter import QuestionExporter, export_queryset, option_label
+from quiz.latex_parser import to_dict
+from quiz.models import Question
+from quiz.tests.test_import import ImportFilesMixin
+
+
+def bank_records():
+    """
+    The bank as parsed records, keyed by question text, with image paths
+    reduced to whether there is one (they differ between the export and the
+    original files).
+    """
+    exporter = QuestionExporter(StringIO(), 'jsonl', tempfile.gettempdir())
+    records = {}
+    for question in export_queryset():
+        data = to_dict(exporter.to_record(question))
+        data['image'] = bool(data['image'])
+        for key in ('options', 'rows', 'cols'):
+            for choice in data[key]:
+                choice['image'] = bool(choice['image'])
+        records[question.text] = data
+    return records
+
+
+class ExportQuestionsTests(ImportFilesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.out_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+
+    def round_trip(self, filename):
+        self.run_import()
+        before = bank_records()
+        output = os.path.join(self.out_dir, filename)
+        call_command('export_questions', '-o', output, '--media-dir', os.path.join(self.out_dir, 'media'),
+                     stdout=StringIO())
+        Question.objects.all().delete()
+        call_command('import_questions', output, '--workers', '1', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(bank_records(), before)
+        return output
+
+    def test_latex_round_trip(self):
+        output = self.round_trip('bank.tex')
+        with open(output) as f:
+            self.assertIn('\\includegraphics{media/', f.read())
+
+    def test_jsonl_round_trip(self):
+        output = self.round_trip('bank.jsonl')
+        with open(output) as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 3)
+
+    def test_retired_questions_are_left_out(self):
+        self.run_import()
+        Question.objects.filter(text='Third').update(is_retired=True)
+        output = os.path.join(self.out_dir, 'bank.jsonl')
+        call_command('export_questions', '-o', output, stdout=StringIO())
+        with open(output) as f:
+            self.assertEqual([json.loads(line)['text'] for line in f], ['First', 'Second'])
+
+    def test_option_labels(self):
+        self.assertEqual([option_label(i) for i in (0, 25, 26, 27)], ['A', 'Z', 'AA', 'AB'])
@@ -0,0 +1,286 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from quiz import import_sources
+from quiz.derivatives import DERIVATIVE_FORMATS, variants_for
+from quiz.import_sources import content_hash, expand_sources, iter_parsed_files, iter_source_parts
+from quiz.import_validation import validate_record
+from quiz.importer import BulkQuestionWriter
+from quiz.latex_parser import parse_string, to_dict
+from quiz.models import MatrixRow, Option, Question
+from quiz.storage import HASHED_NAME_RE
+from quiz.tests.utils import TemporaryMediaMixin, write_png
+
+QUESTIONS = r'''
+\begin{question}
+\type{MCQ_SINGLE}
+\chapter{KINEMATICS_1D}
+\difficulty{EASY}
+\text{First \includegraphics{red.png}}
+\option{A}{a}
+\option{B}{b \includegraphics{copy.png}}
+\answer{B}
+\solution{Because.}
+\end{question}
+
+\begin{question}
+\type{MATRIX}
+\chapter{KINEMATICS_1D}
+\difficulty{MODERATE}
+\text{Second}
+\row{A}{r1}
+\row{B}{r2}
+\col{p}{c1}
+\col{q}{c2}
+\matrix_answer{A}{p}
+\matrix_answer{B}{p,q}
+\end{question}
+
+\begin{question}
+\type{NUMERICAL}
+\chapter{KINEMATICS_1D}
+\difficulty{DIFFICULT}
+\text{Third}
+\answer{9.8}
+\tolerance{0.1}
+\end{question}
+'''
+
+
+class BulkQuestionWriterTests(TemporaryMediaMixin, TestCase):
+
+    def test_writes_questions_and_children(self):
+        writer = BulkQuestionWriter(batch_size=2)
+        for record in parse_string(QUESTIONS.replace(' \\includegraphics{red.png}', '')
+                                   .replace(' \\includegraphics{copy.png}', '')):
+            writer.add(record, '')
+        stats = writer.close()
+        self.assertEqual((stats.questions, stats.options, stats.matrix_rows, stats.matrix_cols,
+                          stats.solution_blocks), (3, 2, 2, 2, 1))
+        mcq = Question.objects.get(text='First')
+        self.assertEqual(list(mcq.options.values_list('text', 'is_correct')), [('a', False), ('b', True)])
+        matrix = Question.objects.get(text='Second')
+        self.assertEqual(matrix.matrix_config['correct'], {'A': ['p'], 'B': ['p', 'q']})
+        self.assertEqual(MatrixRow.objects.get(question=matrix, label='B').matches, 'p,q')
+        self.assertEqual(Question.objects.get(text='Third').numerical_answer, 9.8)
+
+
+class ImportFilesMixin(TemporaryMediaMixin):
+
+    def setUp(self):
+        super().setUp()
+        self.source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+        write_png(os.path.join(self.source, 'red.png'), 'red')
+        # Same bytes under another name
+        write_png(os.path.join(self.source, 'copy.png'), 'red')
+        self.write('questions.tex', QUESTIONS)
+
+    def write(self, name, content):
+        path = os.path.join(self.source, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, *args, workers=1, derivatives=False):
+        if not derivatives:
+            args += ('--no-derivatives',)
+        out, err = StringIO(), StringIO()
+        call_command('import_questions', self.source, '--source-root', self.source, '--workers', str(workers),
+                     *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+
+class ImportQuestionsCommandTests(ImportFilesMixin, TestCase):
+
+    def test_import(self):
+        self.write('broken.tex', '\\begin{question}\\type{MCQ_SINGLE}\\end{question}\n')
+        out, err = self.run_import('--batch-size', '2')
+        self.assertIn('Successfully imported 3 questions (3 new', out)
+        self.assertIn('1 questions could not be imported', out)
+        self.assertIn('question text is missing', err)
+        question = Question.objects.get(text='First')
+        self.assertTrue(os.path.exists(question.image.path))
+        self.assertEqual(question.source_key, 'questions.tex#0')
+
+    def test_images_are_stored_by_content(self):
+        self.run_import()
+        question = Question.objects.get(text='First')
+        option = Option.objects.get(question=question, text='b')
+        self.assertRegex(question.image.name, HASHED_NAME_RE)
+        self.assertEqual(question.image.name.rsplit('/', 1)[1], option.image.name.rsplit('/', 1)[1])
+        # A second import finds the files already stored
+        self.run_import()
+        self.assertEqual(len(os.listdir(os.path.dirname(question.image.path))), 1)
+
+    def test_import_builds_derivatives(self):
+        self.run_import(derivatives=True)
+        manifest = variants_for(Question.objects.get(text='First').image)
+        self.assertEqual(set(manifest['variants']), set(DERIVATIVE_FORMATS))
+
+    def test_reimport_is_idempotent(self):
+        self.run_import()
+        option_ids = list(Option.objects.order_by('id').values_list('id', flat=True))
+        out, _ = self.run_import()
+        self.assertIn('0 new, 0 updated, 3 unchanged', out)
+
+        self.write('questions.tex', QUESTIONS.replace('\\answer{B}', '\\answer{A}'))
+        out, _ = self.run_import()
+        self.assertIn('0 new, 1 updated, 2 unchanged', out)
+        # Saved answers keep pointing at the same options
+        self.assertEqual(list(Option.objects.order_by('id').values_list('id', flat=True)), option_ids)
+        self.assertTrue(Option.objects.get(text='a').is_correct)
+
+    def test_retire_missing(self):
+        self.run_import()
+        self.write('questions.tex', QUESTIONS.split('\\begin{question}\n\\type{NUMERICAL}')[0])
+        out, _ = self.run_import('--retire-missing')
+        self.assertIn('1 retired', out)
+        self.assertTrue(Question.objects.get(text='Third').is_retired)
+
+    def keys(self):
+        return dict(Question.objects.filter(is_retired=False).values_list('text', 'source_key'))
+
+    def test_inserted_block_moves_the_questions_after_it(self):
+        self.run_import()
+        ids = dict(Question.objects.values_list('text', 'id'))
+        first, rest = QUESTIONS.split('\n\n', 1)
+        self.write('questions.tex', first + '\n\\begin{question}\\type{NUMERICAL}\\text{New}\\answer{1}'
+                                            '\\end{question}\n\n' + rest)
+        # One small batch: the row a moved question leaves is taken in the next
+        out, _ = self.run_import('--retire-missing', '--batch-size', '2')
+        self.assertIn('1 new, 0 updated, 3 unchanged, 2 moved, 0 retired', out)
+        self.assertEqual(Question.objects.count(), 4)
+        self.assertEqual({text: ids.get(text) for text in self.keys()}, {**ids, 'New': None})
+        self.assertEqual(self.keys(), {
+            'First': 'questions.tex#0', 'New': 'questions.tex#1', 'Second': 'questions.tex#2',
+            'Third': 'questions.tex#3',
+        })
+
+    def test_removed_block_retires_only_that_question(self):
+        self.run_import()
+        second = Question.objects.get(text='Second')
+        self.write('questions.tex', QUESTIONS.replace(
+            QUESTIONS[QUESTIONS.index('\\begin{question}\n\\type{MATRIX}'):QUESTIONS.index('\\begin{question}\n\\type{NUMERICAL}')], ''))
+        out, _ = self.run_import('--retire-missing')
+        self.assertIn('0 new, 0 updated, 2 unchanged, 1 moved, 1 retired', out)
+        self.assertEqual(self.keys()['Third'], 'questions.tex#1')
+        second.refresh_from_db()
+        self.assertTrue(second.is_retired)
+        # Restoring the block brings the question back rather than a copy
+        self.write('questions.tex', QUESTIONS)
+        out, _ = self.run_import('--retire-missing')
+        self.assertIn('0 new, 1 updated', out)
+        self.assertEqual(self.keys()['Second'], 'questions.tex#1')
+        self.assertEqual(Question.objects.count(), 3)
+
+    def test_dry_run_writes_nothing(self):
+        self.write('bad.tex', '\\begin{question}\\type{MCQ_SINGLE}\\text{x}\\option{A}{a}\\answer{C}'
+                              '\\includegraphics{gone.png}\\end{question}\n')
+        report_path = os.path.join(self.source, 'report.json')
+        with self.assertRaises(CommandError):
+            self.run_import('--dry-run', '--report', report_path)
+        self.assertFalse(Question.objects.exists())
+        with open(report_path) as f:
+            report = json.load(f)
+        self.assertEqual(report['summary']['questions'], 4)
+        self.assertEqual(report['summary']['rejected'], 1)
+        messages = [issue['message'] for issue in report['issues'] if issue['file'].endswith('bad.tex')]
+        self.assertTrue(any('does not match any option' in m for m in messages))
+        self.assertTrue(any('gone.png not found' in m for m in messages))
+
+    def test_records_are_validated_once(self):
+        with mock.patch('quiz.management.commands.import_questions.validate_record',
+                        wraps=validate_record) as validate:
+            self.run_import()
+        self.assertEqual(validate.call_count, 3)
+
+    def test_dry_run_report_on_stdout(self):
+        out, err = self.run_import('--dry-run')
+        self.assertEqual(json.loads(out)['summary']['valid'], 3)
+        # One JSON document, written whole
+        self.assertEqual(out, json.dumps(json.loads(out), indent=2) + '\n')
+        self.assertIn('nothing was written', err)
+
+    def test_large_files_are_streamed_in_parts(self):
+        self.write('more.jsonl', ''.join(
+            json.dumps(to_dict(record)) + '\n'
+            for record in parse_string(QUESTIONS.replace('First', 'Fourth').replace('Second', 'Fifth'))
+        ))
+        with mock.patch.object(import_sources, 'RECORD_BATCH', 2):
+            parts = list(iter_parsed_files(expand_sources([self.source])))
+            self.assertEqual([(os.path.basename(p.path), len(p.records), p.last) for p in parts], [
+                ('more.jsonl', 2, False), ('more.jsonl', 1, True),
+                ('questions.tex', 2, False), ('questions.tex', 1, True),
+            ])
+            # Keys seen in every part of a file count, not just the last part's
+            out, _ = self.run_import('--retire-missing')
+        self.assertIn('6 questions (6 new', out)
+        self.assertEqual(Question.objects.filter(is_retired=False).count(), 6)
+
+    def test_process_pool(self):
+        self.write('sub/more.tex', QUESTIONS.replace('First', 'Fourth'))
+        out, _ = self.run_import(workers=2)
+        self.assertIn('Successfully imported 6 questions (6 new', out)
+        self.assertEqual(Question.objects.get(text='Fourth').source_key, 'sub/more.tex#0')
+
+    def test_no_sources(self):
+        with self.assertRaises(CommandError):
+            call_command('import_questions', os.path.join(self.source, '*.none'), stdout=StringIO())
+
+
+class ImportSourcesTests(SimpleTestCase):
+
+    def test_content_hash_ignores_whitespace_and_position(self):
+        [a] = parse_string('\\begin{question}\\text{Some   text}\\option{A}{x}\\end{question}')
+        [_, b] = parse_string('\\begin{question}\\text{y}\\end{question}\n'
+                              '\\begin{question}\n\\text{Some\ntext}\n\\option{A}{x}\n\\end{question}')
+        self.assertEqual(content_hash(a), content_hash(b))
+        b.options[0].text = 'z'
+        self.assertNotEqual(content_hash(a), content_hash(b))
+
+    def test_expand_sources(self):
+        with tempfile.TemporaryDirectory() as root:
+            for name in ('b.tex', 'a.tex', 'c.jsonl', 'notes.txt', 'sub/d.tex'):
+                os.makedirs(os.path.dirname(os.path.join(root, name)), exist_ok=True)
+                open(os.path.join(root, name), 'w').close()
+            names = lambda paths: [os.path.relpath(p, root) for p in paths]
+            self.assertEqual(names(expand_sources([os.path.join(root, '*.tex')])), ['a.tex', 'b.tex'])
+            self.assertEqual(names(expand_sources([root])), ['a.tex', 'b.tex', 'c.jsonl', 'sub/d.tex'])
+            self.assertEqual(names(expand_sources([os.path.join(root, 'b.tex'), root])),
+                             ['b.tex', 'a.tex', 'c.jsonl', 'sub/d.tex'])
+
+    def test_parsed_files_keep_their_order(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = []
+            for i in range(4):
+                paths.append(os.path.join(root, f'{i}.tex'))
+                with open(paths[-1], 'w') as f:
+                    f.write(QUESTIONS.replace('First', f'File {i}'))
+            parsed = list(iter_parsed_files(paths, workers=2))
+        self.assertEqual([p.path for p in parsed], paths)
+        self.assertEqual([p.records[0].text.split(' \\includegraphics')[0] for p in parsed],
+                         [f'File {i}' for i in range(4)])
+        self.assertIsNone(parsed[0].images['red.png'])
+
+    def test_unreadable_file(self):
+        [parsed] = iter_parsed_files(['/nonexistent/questions.tex'])
+        self.assertIsNotNone(parsed.error)
+        self.assertTrue(parsed.last)
+
+    def test_source_parts(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'questions.tex')
+            with open(path, 'w') as f:
+                f.write(QUESTIONS)
+            parts = list(iter_source_parts(path, batch_size=2))
+        self.assertEqual([(p.part, len(p.records), p.last) for p in parts], [(0, 2, False), (1, 1, True)])
+        self.assertIs(parts[0].images, parts[1].images)
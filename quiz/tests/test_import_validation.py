@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from quiz.import_validation import ERROR, WARNING, ImageChecker, ImportReport, validate_record
+from quiz.latex_parser import parse_string
+from quiz.tests.utils import write_png
+
+
+class ValidateRecordTests(SimpleTestCase):
+
+    def severities(self, source, **kwargs):
+        [record] = parse_string(source)
+        return {issue.severity for issue in validate_record(record, **kwargs)}
+
+    def test_missing_answer_is_a_warning(self):
+        source = '\\begin{question}\\type{MCQ_SINGLE}\\text{x}\\option{A}{a}\\end{question}'
+        self.assertEqual(self.severities(source), {WARNING})
+        self.assertIn(ERROR, self.severities(source, strict=True))
+
+    def test_unknown_answer_is_an_error(self):
+        source = '\\begin{question}\\type{MCQ_SINGLE}\\text{x}\\option{A}{a}\\answer{C}\\end{question}'
+        self.assertIn(ERROR, self.severities(source))
+
+
+class ImageCheckerTests(SimpleTestCase):
+
+    def test_missing_and_unreadable_images(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_png(os.path.join(root, 'ok.png'), 'red')
+            with open(os.path.join(root, 'bad.png'), 'w') as f:
+                f.write('not a png')
+            [record] = parse_string('\\begin{question}\\text{x \\includegraphics{ok.png}}'
+                                    '\\option{A}{\\includegraphics{bad.png}}'
+                                    '\\solution{\\includegraphics{gone.png}}\\end{question}')
+            issues = ImageChecker().check(record, root)
+        messages = [issue.message for issue in issues]
+        self.assertEqual(len(messages), 2)
+        self.assertIn('bad.png is not a readable image', messages[0])
+        self.assertIn('gone.png not found', messages[1])
+
+
+class ImportReportTests(SimpleTestCase):
+
+    def test_counts_and_timings(self):
+        report = ImportReport(dry_run=True)
+        with report.stage('parse'):
+            records = list(parse_string('\\begin{question}\\type{NUMERICAL}\\text{a}\\answer{1}\\end{question}\n'
+                                        '\\begin{question}\\type{NOPE}\\text{b}\\end{question}'))
+        report.add_file('a.tex')
+        self.assertTrue(report.add_record('a.tex', records[0], validate_record(records[0])))
+        self.assertFalse(report.add_record('a.tex', records[1], validate_record(records[1])))
+        data = report.to_dict()
+        self.assertEqual(data['summary']['questions'], 2)
+        self.assertEqual(data['summary']['rejected'], 1)
+        self.assertEqual(data['files'][0]['errors'], data['summary']['errors'])
+        self.assertEqual(set(data['timings']), {'parse', 'validate', 'image', 'write', 'total'})
+        self.assertGreater(data['timings']['parse'], 0)
+
+    def test_file_read_in_parts_is_listed_once(self):
+        report = ImportReport()
+        report.add_file('a.tex')
+        report.add_file('a.tex', 'read error')
+        report.add_file('a.tex')
+        self.assertEqual([f['error'] for f in report.to_dict()['files']], ['read error'])
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz import leaderboard
+from quiz.caching import quiz_version
+from quiz.leaderboard import Leaderboard, get_leaderboard
+from quiz.models import Attempt, Quiz
+from quiz.views import LEADERBOARD_QUIZZES
+
+
+class LeaderboardTests(TestCase):
+
+    def test_rank_percentile_and_top(self):
+        board = Leaderboard(quiz_id=1, version=1)
+        now = timezone.now()
+        for user_id, score in [(1, 10.0), (2, 30.0), (3, 20.0), (4, 20.0)]:
+            board.add(user_id, score, now + timedelta(seconds=user_id))
+        self.assertEqual(board.top(2), [(2, 30.0), (3, 20.0)])
+        self.assertEqual(board.rank(20.0), 2)
+        self.assertEqual(board.rank(40.0), 1)
+        self.assertEqual(board.percentile(20.0), 75.0)
+        # Only a better score replaces a student's best
+        self.assertFalse(board.add(1, 5.0, now))
+        self.assertTrue(board.add(1, 40.0, now))
+        self.assertEqual(board.top(1), [(1, 40.0)])
+        self.assertEqual(len(board), 4)
+
+    def test_add_attempt_counts_each_attempt_once(self):
+        board = Leaderboard(quiz_id=1, version=1)
+        now = timezone.now()
+        board.add_attempt(7, 1, 10.0, now)
+        board.add_attempt(7, 1, 10.0, now)
+        self.assertEqual(board.attempts, 1)
+
+
+class GetLeaderboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title='Ranked', is_public=True)
+        cls.users = [get_user_model().objects.create_user(f'student{i}') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        leaderboard._leaderboards.clear()
+
+    def complete(self, user, score):
+        return Attempt.objects.create(quiz=self.quiz, user=user, score=score, completed_at=timezone.now())
+
+    def resync(self):
+        board = leaderboard._leaderboards[self.quiz.id]
+        board.synced_at = None
+        # As in a process that did not see the quiz version bump
+        board.version = quiz_version(self.quiz.id)
+        return get_leaderboard(self.quiz.id)
+
+    def test_sync_adds_attempts_from_other_processes(self):
+        self.complete(self.users[0], 10.0)
+        board = get_leaderboard(self.quiz.id)
+        self.assertEqual(board.top(5), [(self.users[0].id, 10.0)])
+        self.complete(self.users[1], 20.0)
+        board = self.resync()
+        self.assertEqual(board.top(5), [(self.users[1].id, 20.0), (self.users[0].id, 10.0)])
+        self.assertEqual(self.resync().attempts, 2)
+
+    def test_sync_drops_attempts_deleted_elsewhere(self):
+        self.complete(self.users[0], 10.0)
+        best = self.complete(self.users[1], 30.0)
+        get_leaderboard(self.quiz.id)
+        best.delete()
+        board = self.resync()
+        self.assertEqual(board.top(5), [(self.users[0].id, 10.0)])
+        self.assertEqual(board.attempts, 1)
+
+    def test_sync_picks_up_attempts_committed_late(self):
+        self.complete(self.users[0], 10.0)
+        get_leaderboard(self.quiz.id)
+        # Completed long before the sync window, but only committed now
+        Attempt.objects.create(quiz=self.quiz, user=self.users[1], score=50.0,
+                               completed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.resync().top(1), [(self.users[1].id, 50.0)])
+
+    def test_deleting_an_attempt_rebuilds(self):
+        self.complete(self.users[0], 10.0)
+        best = self.complete(self.users[1], 30.0)
+        self.assertEqual(get_leaderboard(self.quiz.id).top(1), [(self.users[1].id, 30.0)])
+        best.delete()
+        self.assertEqual(get_leaderboard(self.quiz.id).top(5), [(self.users[0].id, 10.0)])
+
+    def test_dashboard_and_result(self):
+        self.complete(self.users[0], 10.0)
+        attempt = self.complete(self.users[1], 20.0)
+        self.client.force_login(self.users[1])
+        [group] = self.client.get(reverse('dashboard')).context['performance_data']
+        self.assertEqual([leader['name'] for leader in group['leaders']], ['student1', 'student0'])
+        self.assertEqual((group['rank'], group['participants']), (1, 2))
+        standing = self.client.get(reverse('result', args=(attempt.id,))).context['standing']
+        self.assertEqual(standing, {'rank': 1, 'participants': 2, 'percentile': 100.0})
+
+    def test_dashboard_limits_leaderboards_to_recent_quizzes(self):
+        user = self.users[0]
+        quizzes = [Quiz.objects.create(title=f'Quiz {i}') for i in range(LEADERBOARD_QUIZZES + 2)]
+        now = timezone.now()
+        for i, quiz in enumerate(quizzes):
+            Attempt.objects.filter(pk=Attempt.objects.create(quiz=quiz, user=user).pk).update(
+                started_at=now - timedelta(minutes=i), completed_at=now, score=float(i))
+        self.client.force_login(user)
+        groups = self.client.get(reverse('dashboard')).context['performance_data']
+        self.assertEqual([group['quiz'] for group in groups], quizzes)
+        self.assertEqual([bool(group['leaders']) for group in groups],
+                         [True] * LEADERBOARD_QUIZZES + [False] * 2)
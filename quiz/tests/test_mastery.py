@@ -0,0 +1,107 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz.mastery import chapter_summary
+from quiz.models import Attempt, ChapterMastery, Option, Question, Quiz, QuizQuestion, Response
+from quiz.views import calculate_final_score
+
+
+class ChapterMasteryTests(TestCase):
+    """
+    One easy and one difficult KINEMATICS_1D question and one easy
+    NLM question; option A is correct.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('student')
+        cls.quiz = Quiz.objects.create(title='Mastery')
+        cls.options = []
+        for i, (chapter, difficulty) in enumerate([('KINEMATICS_1D', 'EASY'), ('KINEMATICS_1D', 'DIFFICULT'),
+                                                   ('NLM', 'EASY')]):
+            question = Question.objects.create(text=f'Q{i}', question_type=Question.Type.MCQ_SINGLE,
+                                               chapter=chapter, difficulty=difficulty)
+            QuizQuestion.objects.create(quiz=cls.quiz, question=question, order=i)
+            cls.options.append([Option.objects.create(question=question, text=label, is_correct=label == 'A')
+                                for label in 'AB'])
+
+    def answered(self, choices):
+        """
+        An open attempt; choices[i] is the option index picked for question
+        i, or None.
+        """
+        attempt = Attempt.objects.create(quiz=self.quiz, user=self.user)
+        Response.objects.bulk_create([
+            Response(attempt=attempt, question=options[0].question, answer_data=[str(options[choice].id)])
+            for options, choice in zip(self.options, choices) if choice is not None
+        ])
+        return attempt
+
+    def complete(self, choices):
+        attempt = self.answered(choices)
+        calculate_final_score(attempt)
+        return attempt
+
+    def totals(self):
+        return {(row.chapter, row.difficulty): (row.attempted, row.correct, row.marks)
+                for row in ChapterMastery.objects.filter(user=self.user)}
+
+    def test_completed_attempts_add_up(self):
+        self.complete([0, 1, None])
+        self.complete([0, 0, 1])
+        self.assertEqual(self.totals(), {
+            ('KINEMATICS_1D', 'EASY'): (2, 2, 8.0),
+            ('KINEMATICS_1D', 'DIFFICULT'): (2, 1, 3.0),
+            ('NLM', 'EASY'): (1, 0, -1.0),
+        })
+        # Weakest chapter first
+        self.assertEqual([(s.chapter, s.accuracy) for s in chapter_summary(self.user)],
+                         [('NLM', 0.0), ('KINEMATICS_1D', 75.0)])
+
+    def test_rebuild_matches_incremental_totals(self):
+        self.complete([0, 1, None])
+        self.complete([1, 0, 0])
+        expected = self.totals()
+        ChapterMastery.objects.update(attempted=0, correct=0, marks=0.0)
+        call_command('rebuild_mastery', '--chunk-size', '1', stdout=StringIO())
+        self.assertEqual(self.totals(), expected)
+
+    def test_double_submit_counts_once(self):
+        attempt = self.answered([0, 1, 0])
+        # Two requests that both loaded the attempt while it was open
+        first, second = Attempt.objects.get(pk=attempt.pk), Attempt.objects.get(pk=attempt.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(calculate_final_score(first))
+            self.assertFalse(calculate_final_score(second))
+        self.assertEqual(sum(attempted for attempted, _, _ in self.totals().values()), 3)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual((second.score, second.completed_at), (first.score, first.completed_at))
+
+    def test_timeout_racing_submit_counts_once(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_public=True, time_limit_minutes=30)
+        attempt = self.answered([0, 1, 0])
+        Attempt.objects.filter(pk=attempt.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        submitting = Attempt.objects.get(pk=attempt.pk)
+        self.client.force_login(self.user)
+        # The timer's page load completes the expired attempt first
+        response = self.client.get(reverse('take_quiz', args=(self.quiz.id,)))
+        self.assertRedirects(response, reverse('result', args=(attempt.id,)), fetch_redirect_response=False)
+        self.assertFalse(calculate_final_score(submitting))
+        self.assertEqual(sum(attempted for attempted, _, _ in self.totals().values()), 3)
+
+    def test_deleted_attempt_is_subtracted(self):
+        self.complete([0, 1, None])
+        attempt = self.complete([1, 0, 0])
+        # An open attempt never counted
+        self.answered([0, 0, 0]).delete()
+        attempt.delete()
+        self.assertEqual(self.totals(), {
+            ('KINEMATICS_1D', 'EASY'): (1, 1, 4.0),
+            ('KINEMATICS_1D', 'DIFFICULT'): (1, 0, -1.0),
+        })
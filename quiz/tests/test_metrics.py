@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz import metrics
+from quiz.models import Attempt, Quiz
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(mock.patch.dict(metrics._values, clear=True))
+        self.enterContext(mock.patch.object(metrics, '_ensure_thread'))
+
+    def test_render(self):
+        metrics.inc('quiz_attempts_submitted_total')
+        metrics.inc('quiz_attempts_submitted_total', 2)
+        metrics.cache_lookup('leaderboard', hit=False)
+        for seconds in (0.003, 0.04, 20.0):
+            metrics.observe('quiz_http_request_duration_seconds', seconds, view='result', method='GET')
+        text = metrics.render()
+        self.assertIn('# TYPE quiz_attempts_submitted_total counter\nquiz_attempts_submitted_total 3\n', text)
+        self.assertIn('quiz_cache_lookups_total{cache="leaderboard",result="miss"} 1\n', text)
+        labels = 'method="GET",view="result"'
+        self.assertIn(f'quiz_http_request_duration_seconds_bucket{{{labels},le="0.005"}} 1\n', text)
+        self.assertIn(f'quiz_http_request_duration_seconds_bucket{{{labels},le="0.05"}} 2\n', text)
+        self.assertIn(f'quiz_http_request_duration_seconds_bucket{{{labels},le="10.0"}} 2\n', text)
+        self.assertIn(f'quiz_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3\n', text)
+        self.assertIn(f'quiz_http_request_duration_seconds_count{{{labels}}} 3\n', text)
+
+    def test_open_attempts(self):
+        User = get_user_model()
+        quiz = Quiz.objects.create(title='Open', time_limit_minutes=60)
+        Attempt.objects.create(quiz=quiz, user=User.objects.create_user('a'))
+        # Past its time limit: abandoned rather than open
+        late = Attempt.objects.create(quiz=quiz, user=User.objects.create_user('b'))
+        Attempt.objects.filter(pk=late.pk).update(started_at=timezone.now() - timedelta(minutes=61))
+        Attempt.objects.create(quiz=quiz, user=User.objects.create_user('c'), completed_at=timezone.now())
+        self.assertIn(f'quiz_open_attempts{{quiz="{quiz.id}"}} 1\n', metrics.render())
+
+    def test_other_processes_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(QUIZ_METRICS_DIR=directory):
+            metrics.inc('quiz_attempts_submitted_total', 2)
+            metrics.flush()
+            self.assertEqual(os.listdir(directory), [f'{os.getpid()}.json'])
+            # A worker that has exited: its counters count, its gauges do not
+            with open(os.path.join(directory, '999999999.json'), 'w') as f:
+                json.dump([['quiz_attempts_submitted_total', {}, [5]],
+                           ['quiz_http_requests_in_flight', {}, [4]]], f)
+            text = metrics.render()
+        self.assertIn('quiz_attempts_submitted_total 7\n', text)
+        self.assertNotIn('quiz_http_requests_in_flight 4', text)
+
+    def test_requests_are_measured(self):
+        self.client.force_login(get_user_model().objects.create_user('student'))
+        self.client.get(reverse('dashboard'))
+        self.client.get('/no-such-page/')
+        text = metrics.render()
+        self.assertIn('quiz_http_responses_total{status="200",view="dashboard"} 1\n', text)
+        self.assertIn(f'quiz_http_responses_total{{status="404",view="{metrics.UNMATCHED}"}} 1\n', text)
+        self.assertIn('quiz_db_queries_per_request_count{view="dashboard"} 1\n', text)
+
+    @override_settings(QUIZ_METRICS_TOKEN='secret')
+    def test_endpoint_access(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.client.force_login(get_user_model().objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(QUIZ_METRICS=False):
+            self.assertEqual(self.client.get(url).status_code, 404)
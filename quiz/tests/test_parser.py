@@ -0,0 +1,87 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from quiz.latex_parser import (ParsedChoice, ParsedQuestion, check_argument, format_question, from_dict,
+                               parse_file, parse_string, to_dict)
+
+MATRIX = r'''
+% a comment before the block
+\begin{question}
+\type{MATRIX}
+\chapter{KINEMATICS_1D}
+\difficulty{MODERATE}
+\text{Match $\frac{a}{b}$ with
+the columns \includegraphics{m.png}}
+\row{A}{First}
+\row{B}{Second}
+\col{p}{One}
+\col{q}{Two}
+\matrix_answer{A}{p}
+\matrix_answer{B}{p,q}
+\solution{Because $x^{2}$}
+\end{question}
+'''
+
+
+class ParserTests(SimpleTestCase):
+
+    def test_matrix_question(self):
+        [record] = list(parse_string(MATRIX))
+        self.assertEqual(record.errors, [])
+        self.assertEqual(record.line, 3)
+        self.assertEqual(record.question_type, 'MATRIX')
+        self.assertEqual(record.text, 'Match $\\frac{a}{b}$ with\nthe columns')
+        self.assertEqual(record.image, 'm.png')
+        self.assertEqual([r.label for r in record.rows], ['A', 'B'])
+        self.assertEqual(record.matrix_correct, {'A': ['p'], 'B': ['p', 'q']})
+        self.assertEqual(record.solutions[0].text, 'Because $x^{2}$')
+
+    def test_multiple_choice_and_numerical(self):
+        records = list(parse_string(
+            '\\begin{question}\\type{MCQ_MULTI}\\text{Pick}\\option{A}{a}\\option{B}{b}\\answer{A, B}\\end{question}\n'
+            '\\begin{question}\n\\type{NUMERICAL}\n\\text{How many?}\n\\answer{2.5}\n\\tolerance{0.1}\n'
+            '\\end{question}\n'
+        ))
+        self.assertEqual([r.index for r in records], [0, 1])
+        self.assertEqual(records[0].answer_labels, ['A', 'B'])
+        self.assertEqual(records[1].numerical_answer, 2.5)
+        self.assertEqual(records[1].numerical_tolerance, 0.1)
+
+    def test_malformed_blocks_are_reported(self):
+        records = list(parse_string(
+            '\\begin{question}\\text{unclosed\n\\end{question}\n'
+            '\\begin{question}\\bogus{x}\\text{ok}\\end{question}\n'
+            '\\begin{question}\\text{no end}\n'
+        ))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0].errors[0][0], 'unbalanced braces')
+        self.assertEqual(records[1].unknown[0][0], 'bogus')
+        self.assertEqual(records[2].errors[-1][0], 'missing \\end{question}')
+
+    def test_parse_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.tex', delete=False) as f:
+            f.write(MATRIX * 2)
+        self.addCleanup(os.unlink, f.name)
+        records = list(parse_file(f.name))
+        self.assertEqual([r.index for r in records], [0, 1])
+        self.assertEqual(records[1].line, records[0].line + MATRIX.count('\n'))
+
+    def test_format_question_round_trip(self):
+        [record] = list(parse_string(MATRIX))
+        [again] = list(parse_string(format_question(record)))
+        self.assertEqual(to_dict(again), to_dict(record))
+
+    def test_dict_round_trip(self):
+        record = ParsedQuestion(index=0, line=1, question_type='MCQ_SINGLE', text='Q',
+                                options=[ParsedChoice('A', 'a'), ParsedChoice('B', 'b', 'b.png')], answer='B')
+        self.assertEqual(to_dict(from_dict(to_dict(record))), to_dict(record))
+        self.assertTrue(from_dict([]).errors)
+
+    def test_unrepresentable_text(self):
+        self.assertIsNone(check_argument('a {b} c'))
+        self.assertIsNotNone(check_argument('a } b'))
+        self.assertIsNotNone(check_argument('50% off'))
+        with self.assertRaises(ValueError):
+            format_question(ParsedQuestion(index=0, line=1, text='bad }'))
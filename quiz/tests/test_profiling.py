@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from quiz import profiling
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.enterContext(override_settings(QUIZ_PROFILE_DIR=self.directory, QUIZ_PROFILE_KEEP=2))
+        self.staff = get_user_model().objects.create_user('staff', is_staff=True)
+
+    def profile_dashboard(self, **headers):
+        return self.client.get(reverse('dashboard'), {profiling.QUERY_FLAG: '1'}, headers=headers)
+
+    def test_staff_requests_are_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.profile_dashboard()
+        self.assertEqual(response.status_code, 200)
+        name = response[profiling.HEADER]
+        self.assertTrue(name.endswith('-dashboard'))
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted(name + extension for extension in profiling.EXTENSIONS))
+
+        [stored] = profiling.stored_profiles()
+        self.assertEqual((stored.name, stored.view, stored.status, stored.user), (name, 'dashboard', 200, 'staff'))
+        self.assertIn('function calls', profiling.top_functions(name))
+
+        self.assertContains(self.client.get(reverse('profiles')), name)
+        self.assertContains(self.client.get(reverse('profile_detail', args=(name,))), 'cumulative')
+        download = self.client.get(reverse('profile_download', args=(name, 'collapsed')))
+        self.assertEqual(download['Content-Disposition'], f'attachment; filename="{name}.collapsed"')
+        self.assertEqual(self.client.get(reverse('profile_download', args=(name, 'txt'))).status_code, 404)
+
+    def test_newest_profiles_are_kept(self):
+        self.client.force_login(self.staff)
+        names = [self.client.get(reverse('dashboard'), headers={profiling.HEADER: '1'})[profiling.HEADER]
+                 for _ in range(3)]
+        self.assertEqual([stored.name for stored in profiling.stored_profiles()], names[:0:-1])
+        self.assertIsNone(profiling.file_path(names[0], '.pstats'))
+
+    def test_only_staff_are_profiled(self):
+        self.client.force_login(get_user_model().objects.create_user('student'))
+        response = self.profile_dashboard()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(profiling.HEADER, response)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 302)
+
+    def test_file_path_rejects_other_files(self):
+        self.assertIsNone(profiling.file_path('../settings', '.json'))
+        self.assertIsNone(profiling.file_path('name', '.py'))
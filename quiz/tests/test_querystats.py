@@ -0,0 +1,143 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from quiz import metrics, querystats
+from quiz.models import Attempt, MatrixCol, MatrixRow, Option, Question, Quiz, QuizQuestion
+
+# Queries of submit_quiz and result for the 10-question quiz below. Both
+# still grow with the number of questions; lower these as that is fixed.
+SUBMIT_BUDGET = 76
+RESULT_BUDGET = 37
+
+
+class FingerprintTests(TestCase):
+
+    def test_literals_and_in_lists_are_collapsed(self):
+        self.assertEqual(
+            querystats.fingerprint("SELECT * FROM t WHERE a = 12 AND b = 'it''s'\n AND c IN (%s, %s, %s)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)',
+        )
+        self.assertEqual(querystats.fingerprint('SELECT x FROM t WHERE id = %s'),
+                         querystats.fingerprint('SELECT x FROM t WHERE id = 7'))
+
+    def test_recorder_groups_repeated_queries(self):
+        with querystats.QueryRecorder().record() as recorder:
+            for i in range(querystats.REPEAT_THRESHOLD):
+                Question.objects.filter(pk=i).exists()
+            Attempt.objects.count()
+        self.assertEqual(recorder.count, querystats.REPEAT_THRESHOLD + 1)
+        [(sql, count)] = recorder.repeated()
+        self.assertEqual(count, querystats.REPEAT_THRESHOLD)
+        self.assertIn('"quiz_question"', sql)
+
+    def test_query_budget(self):
+        with querystats.query_budget(2):
+            Attempt.objects.count()
+            Attempt.objects.count()
+        with self.assertRaisesMessage(querystats.QueryBudgetExceeded, '3 queries, budget 2; repeated:\n  3 x SELECT'):
+            with querystats.query_budget(2):
+                for _ in range(3):
+                    Attempt.objects.count()
+
+
+class ViewQueryBudgetTests(TestCase):
+    """
+    Four single-answer, two multiple-answer, two numerical and two matrix
+    questions, all answered correctly.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('student')
+        cls.quiz = Quiz.objects.create(title='Budgeted', is_public=True)
+        cls.form = {}
+        questions = []
+        for i in range(4):
+            question = Question.objects.create(text=f'Single {i}', question_type=Question.Type.MCQ_SINGLE)
+            right, _ = Option.objects.bulk_create([Option(question=question, text='a', is_correct=True),
+                                                   Option(question=question, text='b')])
+            cls.form[f'question_{question.id}'] = [right.id]
+            questions.append(question)
+        for i in range(2):
+            question = Question.objects.create(text=f'Multi {i}', question_type=Question.Type.MCQ_MULTI)
+            options = Option.objects.bulk_create([Option(question=question, text=label, is_correct=label != 'c')
+                                                  for label in 'abc'])
+            cls.form[f'question_{question.id}'] = [o.id for o in options if o.is_correct]
+            questions.append(question)
+        for i in range(2):
+            question = Question.objects.create(text=f'Numerical {i}', question_type=Question.Type.NUMERICAL,
+                                               numerical_answer=float(i))
+            cls.form[f'question_{question.id}'] = [str(i)]
+            questions.append(question)
+        for i in range(2):
+            question = Question.objects.create(text=f'Matrix {i}', question_type=Question.Type.MATRIX)
+            MatrixRow.objects.bulk_create([MatrixRow(question=question, label='A', matches='p'),
+                                           MatrixRow(question=question, label='B', matches='q')])
+            MatrixCol.objects.bulk_create([MatrixCol(question=question, label=label) for label in 'pq'])
+            cls.form[f'question_{question.id}_row_A'] = ['p']
+            cls.form[f'question_{question.id}_row_B'] = ['q']
+            questions.append(question)
+        QuizQuestion.objects.bulk_create([QuizQuestion(quiz=cls.quiz, question=question, order=i)
+                                          for i, question in enumerate(questions, 1)])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def submit(self):
+        return self.client.post(reverse('submit_quiz', args=(self.quiz.id,)), self.form)
+
+    def test_submit_quiz(self):
+        Attempt.objects.create(quiz=self.quiz, user=self.user)
+        with querystats.query_budget(SUBMIT_BUDGET):
+            response = self.submit()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Attempt.objects.get(quiz=self.quiz, user=self.user).score, 40.0)
+
+    def test_result(self):
+        attempt = Attempt.objects.create(quiz=self.quiz, user=self.user)
+        self.submit()
+        with querystats.query_budget(RESULT_BUDGET):
+            response = self.client.get(reverse('result', args=(attempt.id,)))
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryStatsMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        querystats.reset()
+        self.addCleanup(querystats.reset)
+        self.client.force_login(self.staff)
+
+    @override_settings(QUIZ_QUERY_STATS=True, QUIZ_QUERY_STATS_MAX_QUERIES=0)
+    def test_requests_are_counted_per_view(self):
+        with self.assertLogs('quiz.querystats', 'WARNING') as logs:
+            self.client.get(reverse('dashboard'))
+            self.client.get(reverse('dashboard'))
+            stats = dict(querystats.view_stats())['dashboard']
+            self.assertEqual((stats.requests, stats.over_threshold), (2, 2))
+            self.assertGreater(stats.queries, 0)
+
+            self.assertContains(self.client.get(reverse('query_stats')), '<strong>dashboard</strong>')
+            self.client.post(reverse('query_stats'))
+            self.assertNotIn('dashboard', dict(querystats.view_stats()))
+        self.assertIn('GET / (dashboard)', logs.output[0])
+
+    @override_settings(QUIZ_QUERY_STATS=True)
+    def test_unmatched_paths_share_one_entry(self):
+        self.client.get('/no-such-page/')
+        self.client.get('/no-such-page/either/')
+        self.assertEqual([(view, stats.requests) for view, stats in querystats.view_stats()],
+                         [(metrics.UNMATCHED, 2)])
+
+    def test_off_by_default(self):
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(querystats.view_stats(), [])
+
+    def test_staff_only(self):
+        self.client.force_login(get_user_model().objects.create_user('student'))
+        self.assertEqual(self.client.get(reverse('query_stats')).status_code, 302)
@@ -0,0 +1,91 @@
+import csv
+import io
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from quiz import results_export
+from quiz.models import Attempt, Option, Question, Quiz, QuizQuestion, Response
+from quiz.views import calculate_final_score
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+class ResultsExportTests(TestCase):
+    """
+    Two single-answer questions (A correct); one student answers A, B and
+    another B, A. A third attempt is still open.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.quiz = Quiz.objects.create(title='Exported')
+        cls.questions, cls.options = [], []
+        for i in range(2):
+            question = Question.objects.create(text=f'Q{i}', question_type=Question.Type.MCQ_SINGLE)
+            QuizQuestion.objects.create(quiz=cls.quiz, question=question, order=i)
+            cls.questions.append(question)
+            cls.options.append([Option.objects.create(question=question, text=label, is_correct=label == 'A')
+                                for label in 'AB'])
+        cls.attempts = []
+        for i, choice in enumerate([(0, 1), (1, 0)]):
+            attempt = Attempt.objects.create(quiz=cls.quiz, user=User.objects.create_user(f'student{i}'))
+            Response.objects.bulk_create([
+                Response(attempt=attempt, question=question, answer_data=[str(cls.options[q][choice[q]].id)],
+                         status=Response.QuestionStatus.ANSWERED, time_spent=10.0 * (q + 1))
+                for q, question in enumerate(cls.questions)
+            ])
+            calculate_final_score(attempt)
+            cls.attempts.append(attempt)
+        Attempt.objects.create(quiz=cls.quiz, user=User.objects.create_user('late'))
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def read_csv(self, kind):
+        data = ''.join(results_export.stream(kind, results_export.CSV, self.quiz.id))
+        return list(csv.DictReader(io.StringIO(data)))
+
+    def test_attempts_csv(self):
+        rows = self.read_csv(results_export.ATTEMPTS)
+        self.assertEqual([name for name, _ in results_export.ATTEMPT_COLUMNS], list(rows[0]))
+        self.assertEqual([row['score'] for row in rows], ['3.0', '3.0', ''])
+
+    def test_responses_csv(self):
+        rows = self.read_csv(results_export.RESPONSES)
+        self.assertEqual(len(rows), 4)
+        first = [row for row in rows if row['attempt_id'] == str(self.attempts[0].id)]
+        self.assertEqual([(r['question_number'], r['answer'], r['is_correct']) for r in first],
+                         [('1', 'A', 'True'), ('2', 'B', 'False')])
+        self.assertEqual(first[1]['time_spent'], '20.0')
+
+    def test_parquet(self):
+        if pq is None:
+            self.skipTest('pyarrow is not installed')
+        data = b''.join(results_export.stream(results_export.RESPONSES, results_export.PARQUET, self.quiz.id))
+        table = pq.read_table(io.BytesIO(data))
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(table.column_names, [name for name, _ in results_export.RESPONSE_COLUMNS])
+
+    def test_view(self):
+        self.client.force_login(self.staff)
+        url = reverse('export_results', args=(self.quiz.id,))
+        response = self.client.get(url, {'kind': 'attempts'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 4)
+        self.assertEqual(self.client.get(url, {'format': 'xlsx'}).status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            output = os.path.join(out_dir, 'responses.csv')
+            call_command('export_results', str(self.quiz.id), '--kind', 'responses', '-o', output,
+                         stderr=StringIO())
+            with open(output, newline='', encoding='utf-8') as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 4)
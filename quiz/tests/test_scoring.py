@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz.models import Attempt, MatrixRow, Option, Question, Quiz, QuizQuestion, Response
+
+
+class ScoringTests(TestCase):
+    """
+    Scores for submitted and timed-out attempts. MCQ and numerical marks are
+    unchanged from the per-type scoring that views.py did before grading.py;
+    matrix questions without matrix_config are now graded from their
+    MatrixRows, and timed-out attempts are scored instead of left at 0.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('student', password='pw')
+        cls.quiz = Quiz.objects.create(title='Scored', is_public=True, time_limit_minutes=30)
+
+        cls.mcq = Question.objects.create(text='MCQ', question_type=Question.Type.MCQ_SINGLE)
+        cls.right, cls.wrong = Option.objects.bulk_create([
+            Option(question=cls.mcq, text='right', is_correct=True),
+            Option(question=cls.mcq, text='wrong'),
+        ])
+        cls.multi = Question.objects.create(text='Multi', question_type=Question.Type.MCQ_MULTI)
+        cls.multi_a, cls.multi_b, cls.multi_c = Option.objects.bulk_create([
+            Option(question=cls.multi, text='a', is_correct=True),
+            Option(question=cls.multi, text='b', is_correct=True),
+            Option(question=cls.multi, text='c'),
+        ])
+        cls.numerical = Question.objects.create(text='Numerical', question_type=Question.Type.NUMERICAL,
+                                                numerical_answer=9.8, numerical_tolerance=0.1)
+        cls.matrix = Question.objects.create(text='Matrix', question_type=Question.Type.MATRIX)
+        MatrixRow.objects.bulk_create([
+            MatrixRow(question=cls.matrix, label='A', matches='p'),
+            MatrixRow(question=cls.matrix, label='B', matches='p,q'),
+        ])
+        cls.legacy = Question.objects.create(text='Legacy', question_type=Question.Type.MATRIX, matrix_config={
+            'rows': [{'id': 'A'}, {'id': 'B'}], 'correct': {'A': ['q'], 'B': ['r']},
+        })
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=cls.quiz, question=q, order=i, marks=4.0, negative_marks=1.0)
+            for i, q in enumerate((cls.mcq, cls.multi, cls.numerical, cls.matrix, cls.legacy), 1)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def submit(self, data):
+        self.client.get(reverse('take_quiz', args=(self.quiz.id,)))
+        self.client.post(reverse('submit_quiz', args=(self.quiz.id,)), data)
+        return Attempt.objects.get(user=self.user)
+
+    def test_mcq_and_numerical_scores_are_unchanged(self):
+        attempt = self.submit({
+            f'question_{self.mcq.id}': [self.right.id],
+            f'question_{self.multi.id}': [self.multi_a.id],
+            f'question_{self.numerical.id}': ['9.75'],
+        })
+        # 4 + 1 of 2 correct options (partial) + 4
+        self.assertEqual(attempt.score, 10.0)
+
+    def test_wrong_answers_are_penalised(self):
+        attempt = self.submit({
+            f'question_{self.mcq.id}': [self.wrong.id],
+            f'question_{self.multi.id}': [self.multi_a.id, self.multi_c.id],
+            f'question_{self.numerical.id}': ['1'],
+        })
+        self.assertEqual(attempt.score, -3.0)
+
+    def test_matrix_rows_are_graded(self):
+        attempt = self.submit({
+            f'question_{self.matrix.id}_row_A': ['p'],
+            f'question_{self.matrix.id}_row_B': ['p'],
+            f'question_{self.legacy.id}_row_A': ['q'],
+            f'question_{self.legacy.id}_row_B': ['r'],
+        })
+        # Half of the matrix question (was 0: it has no matrix_config) and all of the legacy one
+        self.assertEqual(attempt.score, 6.0)
+        self.assertEqual(Response.objects.get(attempt=attempt, question=self.matrix).answer_data,
+                         {'A': ['p'], 'B': ['p']})
+
+    def test_timed_out_attempt_is_scored(self):
+        attempt = Attempt.objects.create(user=self.user, quiz=self.quiz)
+        Attempt.objects.filter(pk=attempt.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        Response.objects.create(attempt=attempt, question=self.mcq, answer_data=[self.right.id])
+
+        response = self.client.get(reverse('take_quiz', args=(self.quiz.id,)))
+        self.assertRedirects(response, reverse('result', args=(attempt.id,)), fetch_redirect_response=False)
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.completed_at)
+        # Was left at 0
+        self.assertEqual(attempt.score, 4.0)
@@ -0,0 +1,46 @@
+import runpy
+from pathlib import Path
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+SETTINGS = Path(__file__).resolve().parents[2] / 'config' / 'settings.py'
+
+
+def load_settings(**environ):
+    with mock.patch.dict('os.environ', environ):
+        return runpy.run_path(str(SETTINGS))
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+
+    def test_sqlite_is_tuned_for_concurrent_saves(self):
+        settings = load_settings(DATABASE_ENGINE='sqlite')
+        database = settings['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', database['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA synchronous=NORMAL', database['OPTIONS']['init_command'])
+        self.assertTrue(settings['QUIZ_SERIALIZE_WRITES'])
+
+    def test_postgresql_from_environment(self):
+        settings = load_settings(DATABASE_ENGINE='postgresql', POSTGRES_DB='exams', POSTGRES_HOST='db',
+                                 POSTGRES_PORT='6432', DATABASE_CONN_MAX_AGE='30', DATABASE_POOL='')
+        database = settings['DATABASES']['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((database['NAME'], database['HOST'], database['PORT']), ('exams', 'db', '6432'))
+        self.assertEqual(database['CONN_MAX_AGE'], 30)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database['OPTIONS'])
+        self.assertFalse(settings['QUIZ_SERIALIZE_WRITES'])
+
+    def test_postgresql_pool(self):
+        settings = load_settings(DATABASE_ENGINE='postgresql', DATABASE_POOL='1', DATABASE_POOL_MAX_SIZE='8')
+        database = settings['DATABASES']['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool'], {'min_size': 2, 'max_size': 8, 'timeout': 10})
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ImproperlyConfigured):
+            load_settings(DATABASE_ENGINE='mysql')
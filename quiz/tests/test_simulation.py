@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from quiz.models import Attempt, Option, Question, Quiz, QuizQuestion
+from quiz.simulation import Recorder, percentile
+
+
+@override_settings(QUIZ_SERIALIZE_WRITES=False)
+class SimulateExamTests(TransactionTestCase):
+    # The students run on their own threads and connections. One student,
+    # since the in-memory test database locks whole tables
+
+    def setUp(self):
+        self.quiz = Quiz.objects.create(title='Simulated', time_limit_minutes=30)
+        for i in range(3):
+            question = Question.objects.create(text=f'Q{i}', question_type=Question.Type.MCQ_SINGLE)
+            Option.objects.bulk_create([Option(question=question, text=label, is_correct=label == 'A')
+                                        for label in 'AB'])
+            QuizQuestion.objects.create(quiz=self.quiz, question=question, order=i)
+        numerical = Question.objects.create(text='N', question_type=Question.Type.NUMERICAL, numerical_answer=2.0)
+        QuizQuestion.objects.create(quiz=self.quiz, question=numerical, order=3)
+
+    def test_student_takes_the_quiz(self):
+        out = StringIO()
+        call_command('simulate_exam', self.quiz.id, '--students=1', '--think=0', '--ramp=0', '--keep', stdout=out)
+        output = out.getvalue()
+        self.assertIn('1/1 exams completed', output)
+        self.assertIn(', 0 errors', output)
+        self.assertEqual(Attempt.objects.filter(quiz=self.quiz, completed_at__isnull=False).count(), 1)
+        for view in ('take_quiz_single', 'submit_quiz', 'result'):
+            self.assertIn(view, output)
+
+    def test_attempts_are_removed_without_keep(self):
+        call_command('simulate_exam', self.quiz.id, '--students=1', '--think=0', '--ramp=0', stdout=StringIO())
+        self.assertFalse(Attempt.objects.exists())
+
+    def test_unknown_quiz(self):
+        with self.assertRaisesMessage(CommandError, 'does not exist'):
+            call_command('simulate_exam', 999, stdout=StringIO())
+
+
+class RecorderTests(SimpleTestCase):
+
+    def test_summary(self):
+        recorder = Recorder()
+        for ms in range(1, 101):
+            recorder.record('result', ms / 1000)
+        recorder.record('result', 0.5, 'HTTP 500')
+        [(view, count, errors, p50, p95, p99, slowest)] = recorder.summary()
+        self.assertEqual((view, count, errors), ('result', 101, 1))
+        self.assertLessEqual(p50, p95)
+        self.assertEqual(slowest, 0.5)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 3)
@@ -0,0 +1,34 @@
+import os
+
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, SimpleTestCase
+
+from quiz.storage import HASHED_NAME_RE, IMMUTABLE_CACHE_CONTROL, ContentAddressedStorage, serve_media
+from quiz.tests.utils import TemporaryMediaMixin, png_bytes
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.storage = ContentAddressedStorage()
+
+    def test_same_bytes_stored_once(self):
+        first = self.storage.save('questions/a.png', ContentFile(png_bytes('red')))
+        second = self.storage.save('questions/b.PNG', ContentFile(png_bytes('red')))
+        third = self.storage.save('questions/c.png', ContentFile(png_bytes('blue')))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertRegex(first, HASHED_NAME_RE)
+        self.assertTrue(first.startswith('questions/'))
+        self.assertEqual(len(os.listdir(os.path.dirname(self.storage.path(first)))), 1)
+
+    def test_hashed_names_are_cached_forever(self):
+        name = self.storage.save('questions/a.png', ContentFile(png_bytes()))
+        response = serve_media(RequestFactory().get('/'), name, document_root=self.storage.location)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+        with open(os.path.join(self.storage.location, 'plain.png'), 'wb') as f:
+            f.write(png_bytes())
+        response = serve_media(RequestFactory().get('/'), 'plain.png', document_root=self.storage.location)
+        self.assertNotIn('Cache-Control', response)
@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from quiz.models import Attempt, ChapterMastery, Question, Quiz, Response
+from quiz.synthetic import DatasetSizes, generate
+
+SMALL = dict(questions=30, passages=2, quizzes=2, questions_per_quiz=10, groups=2, users=6, attempts_per_user=2)
+
+
+class GenerateDatasetTests(TestCase):
+
+    def test_generate(self):
+        counts = generate(DatasetSizes(**SMALL), seed=3, batch_size=7)
+        self.assertEqual(Question.objects.count(), counts['questions'])
+        self.assertEqual(set(Question.objects.values_list('question_type', flat=True)), set(Question.Type.values))
+        self.assertEqual(Quiz.objects.count(), 2)
+        self.assertEqual(Attempt.objects.count(), counts['attempts'])
+        self.assertEqual(Response.objects.count(), counts['responses'])
+        self.assertEqual(counts['attempts'], 12)
+        self.assertEqual(ChapterMastery.objects.count(), counts['chapter mastery rows'])
+        for attempt in Attempt.objects.filter(completed_at__isnull=True):
+            self.assertEqual(attempt.score, 0)
+
+    def test_seeded(self):
+        generate(DatasetSizes(**SMALL), seed=3, prefix='a-')
+        first = list(Attempt.objects.order_by('id').values_list('score', flat=True))
+        generate(DatasetSizes(**SMALL), seed=3, prefix='b-')
+        second = list(Attempt.objects.filter(user__username__startswith='b-').order_by('id')
+                      .values_list('score', flat=True))
+        self.assertEqual(first, second)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('generate_dataset', *(f'--{name.replace("_", "-")}={value}' for name, value in SMALL.items()),
+                     stdout=out)
+        self.assertIn('Created', out.getvalue())
+        self.assertEqual(get_user_model().objects.filter(username__startswith='synthetic-').count(), 6)
+        with self.assertRaisesMessage(CommandError, 'already exist'):
+            call_command('generate_dataset', stdout=StringIO())
@@ -0,0 +1,135 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from quiz import telemetry
+from quiz.models import Attempt, QuestionVisit, Question, Quiz, QuizQuestion, Response
+
+MS = 1000
+
+
+class TelemetryMixin:
+    """
+    An open attempt at a two-question quiz with an empty response to each.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # The flush thread would write through its own connection
+        self.enterContext(mock.patch.object(telemetry, '_ensure_thread'))
+        telemetry._buffer.clear()
+        self.addCleanup(telemetry._buffer.clear)
+        self.user = get_user_model().objects.create_user('student')
+        quiz = Quiz.objects.create(title='Timed')
+        self.question_ids = []
+        for i in range(2):
+            question = Question.objects.create(text=f'Q{i}', question_type=Question.Type.NUMERICAL,
+                                               numerical_answer=1.0)
+            QuizQuestion.objects.create(quiz=quiz, question=question, order=i)
+            self.question_ids.append(question.id)
+        self.attempt = Attempt.objects.create(quiz=quiz, user=self.user)
+        Response.objects.bulk_create([Response(attempt=self.attempt, question_id=question_id)
+                                      for question_id in self.question_ids])
+
+    def visits(self, *seconds):
+        start = timezone.now().timestamp() * MS
+        return telemetry.parse_events(
+            [{'q': self.question_ids[0], 'enter': start, 'leave': start + s * MS} for s in seconds],
+            set(self.question_ids),
+        )
+
+
+class ParseEventsTests(TelemetryMixin, TestCase):
+
+    def test_valid_events(self):
+        [(question_id, entered_at, left_at, seconds)] = self.visits(12.5)
+        self.assertEqual(question_id, self.question_ids[0])
+        self.assertEqual(seconds, 12.5)
+        self.assertEqual(left_at - entered_at, timedelta(seconds=12.5))
+        [(*_, capped)] = self.visits(24 * 60 * 60)
+        self.assertEqual(capped, telemetry.MAX_VISIT_SECONDS)
+
+    def test_invalid_events(self):
+        ids = set(self.question_ids)
+        for events in ('x', [1], [{'q': 'x', 'enter': 0, 'leave': 1}], [{'q': -1, 'enter': 0, 'leave': 1}],
+                       [{'q': self.question_ids[0], 'enter': 'soon', 'leave': 1}],
+                       [{'q': self.question_ids[0], 'enter': 2, 'leave': 1}],
+                       [{'q': self.question_ids[0], 'enter': 0, 'leave': 1}] * (telemetry.MAX_EVENTS_PER_REQUEST + 1)):
+            with self.subTest(events=str(events)[:40]), self.assertRaises(telemetry.TelemetryError):
+                telemetry.parse_events(events, ids)
+
+
+class FlushTests(TelemetryMixin, TestCase):
+
+    def test_flush_writes_visits_and_time_spent(self):
+        telemetry.record_visits(self.attempt.id, self.visits(10, 5))
+        self.assertEqual(telemetry.flush(), 2)
+        self.assertEqual(QuestionVisit.objects.filter(attempt=self.attempt).count(), 2)
+        response = Response.objects.get(attempt=self.attempt, question_id=self.question_ids[0])
+        self.assertEqual(response.time_spent, 15.0)
+        # Recomputed from the visits, so a second flush adds rather than overwrites
+        telemetry.record_visits(self.attempt.id, self.visits(1))
+        telemetry.flush()
+        response.refresh_from_db()
+        self.assertEqual(response.time_spent, 16.0)
+
+    def test_failed_batch_is_retried(self):
+        telemetry.record_visits(self.attempt.id, self.visits(10))
+        with mock.patch.object(QuestionVisit.objects, 'bulk_create', side_effect=OperationalError('locked')), \
+                self.assertLogs('quiz.telemetry', 'ERROR'):
+            self.assertEqual(telemetry.flush(), 0)
+        telemetry.record_visits(self.attempt.id, self.visits(3))
+        self.assertEqual([visit[-1] for visit in telemetry._buffer], [10, 3])
+        self.assertEqual(telemetry.flush(), 2)
+        self.assertEqual(QuestionVisit.objects.count(), 2)
+
+    def test_buffer_is_bounded(self):
+        dropped = telemetry.dropped
+        with mock.patch.object(telemetry, 'MAX_BUFFERED', 3):
+            telemetry.record_visits(self.attempt.id, self.visits(1, 2))
+            # A failed batch goes back in front, within the same bound
+            with mock.patch.object(QuestionVisit.objects, 'bulk_create', side_effect=OperationalError), \
+                    self.assertLogs('quiz.telemetry', 'ERROR'):
+                telemetry.flush()
+            telemetry.record_visits(self.attempt.id, self.visits(3, 4))
+        # The oldest visits go first
+        self.assertEqual([visit[-1] for visit in telemetry._buffer], [2, 3, 4])
+        self.assertEqual(telemetry.dropped, dropped + 1)
+
+    def test_record_visits_view(self):
+        self.client.force_login(self.user)
+        url = reverse('record_visits', args=(self.attempt.id,))
+        start = timezone.now().timestamp() * MS
+        events = [{'q': self.question_ids[1], 'enter': start, 'leave': start + 4 * MS}]
+        self.assertEqual(self.client.post(url, {'events': json.dumps(events)}).status_code, 204)
+        self.assertEqual(len(telemetry._buffer), 1)
+        self.assertEqual(self.client.post(url, {'events': 'not json'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'events': json.dumps([{'q': 0}])}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+    def test_closed_attempts_take_no_visits(self):
+        self.attempt.completed_at = timezone.now() - timedelta(hours=1)
+        self.attempt.save()
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('record_visits', args=(self.attempt.id,)), {'events': '[]'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FlushIntegrityTests(TelemetryMixin, TransactionTestCase):
+    # SQLite checks foreign keys at commit, which a TestCase never reaches
+
+    def test_visits_of_deleted_attempts_are_dropped(self):
+        other = Attempt.objects.create(quiz=self.attempt.quiz, user=get_user_model().objects.create_user('other'))
+        telemetry.record_visits(self.attempt.id, self.visits(10))
+        telemetry.record_visits(other.id, self.visits(5))
+        Attempt.objects.filter(pk=other.pk).delete()
+        with self.assertLogs('quiz.telemetry', 'ERROR'):
+            self.assertEqual(telemetry.flush(), 0)
+        self.assertEqual([visit[0] for visit in telemetry._buffer], [self.attempt.id])
+        self.assertEqual(telemetry.flush(), 1)
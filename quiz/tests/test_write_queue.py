@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TransactionTestCase, override_settings
+
+from quiz import write_queue
+
+User = get_user_model()
+
+
+def create_user(username):
+    return User.objects.create(username=username).pk, threading.current_thread().name
+
+
+@override_settings(QUIZ_SERIALIZE_WRITES=True)
+class WriteQueueTests(TransactionTestCase):
+    # The writer thread has its own connection, so the writes must commit
+
+    def test_run_goes_through_the_writer_thread(self):
+        pk, thread = write_queue.run(create_user, 'a')
+        self.assertEqual(thread, 'write-queue')
+        self.assertTrue(User.objects.filter(pk=pk, username='a').exists())
+
+    def test_failing_write_only_fails_its_caller(self):
+        write_queue.run(create_user, 'a')
+        futures = [write_queue.submit(create_user, name) for name in ('b', 'a', 'c')]
+        futures[0].result(write_queue.RESULT_TIMEOUT)
+        with self.assertRaises(IntegrityError):
+            futures[1].result(write_queue.RESULT_TIMEOUT)
+        futures[2].result(write_queue.RESULT_TIMEOUT)
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)), ['a', 'b', 'c'])
+
+    def test_arun(self):
+        pk, thread = asyncio.run(write_queue.arun(create_user, 'a'))
+        self.assertEqual(thread, 'write-queue')
+        self.assertTrue(User.objects.filter(pk=pk).exists())
+
+    @override_settings(QUIZ_SERIALIZE_WRITES=False)
+    def test_run_inline_when_off(self):
+        _, thread = write_queue.run(create_user, 'a')
+        self.assertEqual(thread, threading.current_thread().name)
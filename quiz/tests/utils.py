@@ -0,0 +1,29 @@
+import io
+import shutil
+import tempfile
+
+from django.test import override_settings
+from PIL import Image
+
+
+class TemporaryMediaMixin:
+    """
+    Points MEDIA_ROOT at a directory that is removed after each test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+
+
+def png_bytes(color='red', size=(40, 30)):
+    out = io.BytesIO()
+    Image.new('RGB', size, color).save(out, 'PNG')
+    return out.getvalue()
+
+
+def write_png(path, color='red', size=(40, 30)):
+    with open(path, 'wb') as f:
+        f.write(png_bytes(color, size))
@@ -7,7 +7,19 @@ urlpatterns = [
     path('quiz/<int:quiz_id>/single/', views.take_quiz_single, name='take_quiz_single'),
     path('quiz/<int:quiz_id>/single/<int:question_index>/', views.take_quiz_single, name='take_quiz_single'),
     path('quiz/<int:quiz_id>/submit/', views.submit_quiz, name='submit_quiz'),
+    path('attempt/<int:attempt_id>/visits/', views.record_visits, name='record_visits'),
+    path('attempt/<int:attempt_id>/autosave/', views.autosave, name='autosave'),
+    path('attempt/<int:attempt_id>/heartbeat/', views.heartbeat, name='heartbeat'),
+    path('attempt/<int:attempt_id>/palette/', views.palette, name='palette'),
     path('result/<int:attempt_id>/', views.result, name='result'),
+    path('quiz/<int:quiz_id>/analysis/', views.item_analysis, name='item_analysis'),
+    path('quiz/<int:quiz_id>/export/', views.export_results, name='export_results'),
+    path('cohorts/', views.cohort_dashboard, name='cohort_dashboard'),
+    path('stats/queries/', views.query_stats, name='query_stats'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
+    path('stats/profiles/', views.profiles, name='profiles'),
+    path('stats/profiles/<str:name>/', views.profile_detail, name='profile_detail'),
+    path('stats/profiles/<str:name>/<str:kind>/', views.profile_download, name='profile_download'),
     path('question-bank/', views.question_bank, name='question_bank'),
     path('create-test/', views.create_test, name='create_test'),
 ]
@@ -1,10 +1,29 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
-from .models import Quiz, Attempt, Question, Response, Option, QuizQuestion, Passage
+from . import metrics, profiling, querystats, results_export, telemetry, write_queue
+from .analytics import analyze_quiz
+from .cohorts import get_report
+from .grading import load_answer_keys, grade
+from .leaderboard import get_leaderboard
+from .mastery import MasteryDeltas, chapter_summary
+from .models import Quiz, Attempt, Question, Response, QuizQuestion, Passage
+from .signals import attempt_completed
 from django.db.models import Subquery, OuterRef, Q
-import json, random
+import json, random, secrets
+from datetime import timedelta
+
+LEADERBOARD_SIZE = 5
+# The dashboard shows leaderboards for this many of the most recently attempted quizzes
+LEADERBOARD_QUIZZES = 3
+VISIT_GRACE = timedelta(minutes=1)
 
 @login_required
 def dashboard(request):
@@ -27,10 +46,33 @@ def dashboard(request):
     
     # Convert to list for template iteration
     performance_data = [{'quiz': q, 'attempts': atts} for q, atts in grouped.items()]
-    
+
+    # Top students and the user's own standing in the quizzes they attempted last;
+    # each leaderboard costs a sync, and a build the first time
+    for group in performance_data:
+        group['leaders'] = []
+    for group in performance_data[:LEADERBOARD_QUIZZES]:
+        board = get_leaderboard(group['quiz'].id)
+        group['leaders'] = board.top(LEADERBOARD_SIZE)
+        best = board.best_score(request.user.id)
+        group['rank'] = board.rank(best) if best is not None else None
+        group['participants'] = len(board)
+    names = get_user_model().objects.in_bulk(
+        {user_id for group in performance_data for user_id, _ in group['leaders']}
+    )
+    for group in performance_data:
+        group['leaders'] = [
+            {'name': names[user_id].username if user_id in names else '?', 'score': score,
+             'is_me': user_id == request.user.id}
+            for user_id, score in group['leaders']
+        ]
+    
+    mastery = chapter_summary(request.user)
+
     return render(request, 'quiz/dashboard.html', {
         'quizzes': quizzes, 
-        'performance_data': performance_data
+        'performance_data': performance_data,
+        'mastery': mastery,
     })
 
 @login_required
@@ -62,8 +104,7 @@ def take_quiz(request, quiz_id):
     
     # If time has expired, auto-submit
     if remaining_seconds <= 0:
-        attempt.completed_at = timezone.now()
-        attempt.save()
+        calculate_final_score(attempt)
         return redirect('result', attempt_id=attempt.id)
     
     questions = quiz.questions.all().prefetch_related('options')
@@ -74,6 +115,23 @@ def take_quiz(request, quiz_id):
         'remaining_seconds': remaining_seconds
     })
 
+def _remaining_seconds(attempt, quiz):
+    elapsed_seconds = (timezone.now() - attempt.started_at).total_seconds()
+    return max(0, int(quiz.time_limit_minutes * 60 - elapsed_seconds))
+
+def _posted_answer(data, question):
+    """
+    The answer to question posted from the exam page: a list of values, or
+    {row label: [values]} for a matrix question.
+    """
+    answer = data.getlist(f'question_{question.id}')
+    if question.question_type in [Question.Type.MATRIX, Question.Type.MATRIX_SINGLE]:
+        prefix = f'question_{question.id}_row_'
+        matrix_data = {key[len(prefix):]: data.getlist(key) for key in data if key.startswith(prefix)}
+        if matrix_data:
+            answer = matrix_data
+    return answer
+
 @login_required
 def take_quiz_single(request, quiz_id, question_index=1):
     quiz = get_object_or_404(Quiz, pk=quiz_id)
@@ -88,16 +146,12 @@ def take_quiz_single(request, quiz_id, question_index=1):
     attempt = Attempt.objects.filter(user=request.user, quiz=quiz, completed_at__isnull=True).first()
     
     if not attempt:
-        attempt = Attempt.objects.create(user=request.user, quiz=quiz)
+        attempt = write_queue.run(Attempt.objects.create, user=request.user, quiz=quiz)
     
-    # Calculate remaining time
-    elapsed_seconds = (timezone.now() - attempt.started_at).total_seconds()
-    total_seconds = quiz.time_limit_minutes * 60
-    remaining_seconds = max(0, int(total_seconds - elapsed_seconds))
+    remaining_seconds = _remaining_seconds(attempt, quiz)
     
     if remaining_seconds <= 0:
-        attempt.completed_at = timezone.now()
-        attempt.save()
+        calculate_final_score(attempt)
         return redirect('result', attempt_id=attempt.id)
     
     all_questions = list(quiz.questions.all().order_by('quizquestion__order', 'id'))
@@ -112,38 +166,28 @@ def take_quiz_single(request, quiz_id, question_index=1):
     current_question = all_questions[question_index - 1]
     
     # Get or create response for the current question to track status
-    response, created = Response.objects.get_or_create(attempt=attempt, question=current_question)
+    response, created = write_queue.run(Response.objects.get_or_create, attempt=attempt, question=current_question)
     
     # If it was not visited, mark it as not answered now that we are here
     if response.status == Response.QuestionStatus.NOT_VISITED:
         response.status = Response.QuestionStatus.NOT_ANSWERED
-        response.save()
+        write_queue.run(response.save)
 
     if request.method == 'POST':
         action = request.POST.get('action')
-        answer = request.POST.getlist(f'question_{current_question.id}')
-        
-        # Matrix Row handling
-        matrix_data = {}
-        if current_question.question_type in [Question.Type.MATRIX, Question.Type.MATRIX_SINGLE]:
-            for key in request.POST:
-                if key.startswith(f'question_{current_question.id}_row_'):
-                    row_label = key.replace(f'question_{current_question.id}_row_', '')
-                    matrix_data[row_label] = request.POST.getlist(key)
-            if matrix_data:
-                answer = matrix_data
+        answer = _posted_answer(request.POST, current_question)
 
         if action == 'clear':
             response.answer_data = None
             response.status = Response.QuestionStatus.NOT_ANSWERED
-            response.save()
+            write_queue.run(response.save)
             return redirect('take_quiz_single', quiz_id=quiz.id, question_index=question_index)
             
         elif action == 'save_next':
             if answer:
                 response.answer_data = answer
                 response.status = Response.QuestionStatus.ANSWERED
-                response.save()
+                write_queue.run(response.save)
             if question_index < total_questions:
                 return redirect('take_quiz_single', quiz_id=quiz.id, question_index=question_index + 1)
             else:
@@ -153,12 +197,12 @@ def take_quiz_single(request, quiz_id, question_index=1):
             if answer:
                 response.answer_data = answer
                 response.status = Response.QuestionStatus.ANSWERED_MARKED
-                response.save()
+                write_queue.run(response.save)
             return redirect('take_quiz_single', quiz_id=quiz.id, question_index=question_index)
 
         elif action == 'mark_next':
             response.status = Response.QuestionStatus.MARKED_FOR_REVIEW
-            response.save()
+            write_queue.run(response.save)
             if question_index < total_questions:
                 return redirect('take_quiz_single', quiz_id=quiz.id, question_index=question_index + 1)
             else:
@@ -212,65 +256,136 @@ def take_quiz_single(request, quiz_id, question_index=1):
         'remaining_seconds': remaining_seconds
     })
 
+@login_required
+def record_visits(request, attempt_id):
+    """
+    Beacon endpoint for time-on-task events; queues them without writing.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    attempt = get_object_or_404(Attempt, pk=attempt_id, user=request.user)
+    # The last page's beacon can arrive just after the submit it followed
+    if attempt.completed_at and timezone.now() - attempt.completed_at > VISIT_GRACE:
+        return HttpResponseBadRequest('Attempt already completed')
+    try:
+        events = json.loads(request.POST.get('events', ''))
+        question_ids = set(QuizQuestion.objects.filter(quiz_id=attempt.quiz_id).values_list('question_id', flat=True))
+        visits = telemetry.parse_events(events, question_ids)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    telemetry.record_visits(attempt.id, visits)
+    return HttpResponse(status=204)
+
+# The exam page's background requests (autosave, timer heartbeat, palette
+# refresh) are async views: they are small and frequent, and under ASGI
+# (uvicorn config.asgi:application) they wait on the database without
+# holding a worker thread each.
+
+def _save_answer(attempt, question, answer, status):
+    Response.objects.update_or_create(
+        attempt=attempt, question=question, defaults={'answer_data': answer or None, 'status': status}
+    )
+
+@login_required
+async def autosave(request, attempt_id):
+    """
+    Saves the answer to one question without leaving the page.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    user = await request.auser()
+    attempt = await aget_object_or_404(
+        Attempt.objects.select_related('quiz'), pk=attempt_id, user=user, completed_at__isnull=True
+    )
+    if _remaining_seconds(attempt, attempt.quiz) <= 0:
+        return JsonResponse({'error': 'Time is up'}, status=409)
+    question_id = request.POST.get('question', '')
+    question = None
+    if question_id.isdigit():
+        question = await Question.objects.filter(pk=question_id, quizquestion__quiz_id=attempt.quiz_id).afirst()
+    if question is None:
+        return HttpResponseBadRequest('Question is not in this quiz')
+
+    answer = _posted_answer(request.POST, question)
+    marked = request.POST.get('marked') == '1'
+    if answer:
+        status = Response.QuestionStatus.ANSWERED_MARKED if marked else Response.QuestionStatus.ANSWERED
+    else:
+        status = Response.QuestionStatus.MARKED_FOR_REVIEW if marked else Response.QuestionStatus.NOT_ANSWERED
+    await write_queue.arun(_save_answer, attempt, question, answer, status)
+    return JsonResponse({'question': question.id, 'status': status})
+
+@login_required
+async def heartbeat(request, attempt_id):
+    """
+    The server's remaining time, which the page's countdown resyncs to.
+    """
+    user = await request.auser()
+    attempt = await aget_object_or_404(Attempt.objects.select_related('quiz'), pk=attempt_id, user=user)
+    if attempt.completed_at:
+        return JsonResponse({
+            'completed': True,
+            'remaining_seconds': 0,
+            'result_url': reverse('result', args=(attempt.id,)),
+        })
+    return JsonResponse({'completed': False, 'remaining_seconds': _remaining_seconds(attempt, attempt.quiz)})
+
+@login_required
+async def palette(request, attempt_id):
+    """
+    The status of every question of the attempt in quiz order, and how many
+    questions have each status.
+    """
+    user = await request.auser()
+    attempt = await aget_object_or_404(Attempt, pk=attempt_id, user=user)
+    quiz_questions = QuizQuestion.objects.filter(quiz_id=attempt.quiz_id).order_by('order', 'question_id')
+    saved = {
+        question_id: status
+        async for question_id, status in Response.objects.filter(attempt=attempt).values_list('question_id', 'status')
+    }
+    statuses = [
+        saved.get(question_id, Response.QuestionStatus.NOT_VISITED)
+        async for question_id in quiz_questions.values_list('question_id', flat=True)
+    ]
+    counts = {status: 0 for status, label in Response.QuestionStatus.choices}
+    for status in statuses:
+        counts[status] += 1
+    return JsonResponse({'statuses': statuses, 'counts': counts})
+
 def calculate_final_score(attempt):
-    quiz = attempt.quiz
+    """
+    Grades every response of the attempt, completes it together with the
+    student's chapter mastery totals and announces it
+    (signals.attempt_completed) once the transaction commits.
+
+    Completing is a conditional UPDATE, so when a double submit or the timer
+    races another request only one of them counts the attempt; the other
+    gets False and the attempt as the winner stored it.
+    """
+    quiz_questions = list(QuizQuestion.objects.filter(quiz_id=attempt.quiz_id).select_related('question'))
+    keys = load_answer_keys(qq.question_id for qq in quiz_questions)
+    answers = dict(Response.objects.filter(attempt=attempt).values_list('question_id', 'answer_data'))
+
     score = 0.0
-    quiz_questions = QuizQuestion.objects.filter(quiz=quiz).select_related('question')
-    responses = {r.question_id: r for r in Response.objects.filter(attempt=attempt)}
-    
+    deltas = MasteryDeltas()
     for qq in quiz_questions:
-        question = qq.question
-        resp = responses.get(question.id)
-        if not resp or not resp.answer_data:
-            continue
-            
-        user_answer = resp.answer_data
-        q_marks = qq.marks if qq.marks > 0 else 4.0
-        q_neg = qq.negative_marks if qq.negative_marks > 0 else 1.0
-        
-        if question.question_type in [Question.Type.MCQ_SINGLE, Question.Type.ASSERTION_REASON]:
-            selected_option_id = user_answer[0]
-            try:
-                option = Option.objects.get(id=selected_option_id)
-                if option.is_correct:
-                    score += q_marks
-                else:
-                    score -= q_neg
-            except: pass
-        elif question.question_type == Question.Type.MCQ_MULTI:
-            selected_ids = set(str(x) for x in user_answer)
-            correct_ids = set(str(o.id) for o in question.options.filter(is_correct=True))
-            if any(sid not in correct_ids for sid in selected_ids):
-                score -= q_neg
-            else:
-                if len(correct_ids) > 0:
-                    if question.allow_partial_marking:
-                        score += len(selected_ids) * (q_marks / len(correct_ids))
-                    elif selected_ids == correct_ids:
-                        score += q_marks
-                    else:
-                        score -= q_neg
-        elif question.question_type == Question.Type.NUMERICAL:
-            try:
-                val = float(user_answer[0])
-                correct = question.numerical_answer
-                tol = question.numerical_tolerance or 0.0
-                if abs(val - correct) <= tol: score += q_marks
-                else: score -= q_neg
-            except: pass
-        elif question.question_type == Question.Type.MATRIX:
-            if question.matrix_config:
-                rows = question.matrix_config.get('rows', [])
-                num_rows = len(rows)
-                marks_per_row = q_marks / num_rows if num_rows > 0 else 0
-                for row in rows:
-                    rid = row['id']
-                    if set(user_answer.get(rid, [])) == set(question.matrix_config.get('correct', {}).get(rid, [])):
-                        score += marks_per_row
-    
-    attempt.score = score
-    attempt.completed_at = timezone.now()
-    attempt.save()
+        answer_data = answers.get(qq.question_id)
+        marks, is_correct = grade(keys[qq.question_id], answer_data, qq.marks, qq.negative_marks)
+        score += marks
+        deltas.add(attempt.user_id, qq.question.chapter, qq.question.difficulty, answer_data, marks, is_correct)
+
+    completed_at = timezone.now()
+    with transaction.atomic():
+        claimed = Attempt.objects.filter(pk=attempt.pk, completed_at__isnull=True).update(
+            score=score, completed_at=completed_at)
+        if claimed != 1:
+            attempt.refresh_from_db(fields=['score', 'completed_at'])
+            return False
+        attempt.score = score
+        attempt.completed_at = completed_at
+        deltas.apply()
+        transaction.on_commit(lambda: attempt_completed.send(sender=Attempt, attempt=attempt))
+    return True
 
 @login_required
 def submit_quiz(request, quiz_id):
@@ -293,140 +408,22 @@ def submit_quiz(request, quiz_id):
             return redirect('result', attempt_id=last_attempt.id)
         return redirect('dashboard')
     
-    score = 0.0
-    
-    # Iterate over QuizQuestion to get marks/negative_marks
-    quiz_questions = QuizQuestion.objects.filter(quiz=quiz).select_related('question')
-    
-    for qq in quiz_questions:
+    for qq in QuizQuestion.objects.filter(quiz=quiz).select_related('question'):
         question = qq.question
-        user_answer = request.POST.getlist(f'question_{question.id}')
-        
-        # Determine marks and negative marks for this question
-        # Default fallback if 0, though normally set in admin
-        q_marks = qq.marks if qq.marks > 0 else 4.0
-        q_neg = qq.negative_marks if qq.negative_marks > 0 else 1.0 # Typically +4/-1 or +4/-2
-        
-        answer_data = user_answer
-        
-        if question.question_type in [Question.Type.MCQ_SINGLE, Question.Type.ASSERTION_REASON]:
-            if user_answer:
-                selected_option_id = user_answer[0]
-                try:
-                    option = Option.objects.get(id=selected_option_id)
-                    if option.is_correct:
-                        score += q_marks
-                    else:
-                        score -= q_neg
-                except Option.DoesNotExist:
-                    pass
-                    
-        elif question.question_type == Question.Type.MCQ_MULTI:
-            # Logic:
-            # 1. If any wrong option is chosen -> -Negative Marks
-            # 2. If NO wrong option is chosen -> (No. of selected correct) * (Total Marks / Total Correct Options)
-            #    Note: If all correct are selected, this naturally equals Total Marks.
-
-            selected_ids_str = set(user_answer)
-            correct_options = question.options.filter(is_correct=True)
-            correct_ids_str = set(str(o.id) for o in correct_options)
-            
-            if not selected_ids_str:
-                # Unanswered
-                pass
-            else:
-                # Check if any wrong option selected
-                wrong_selected = False
-                for sel_id in selected_ids_str:
-                    if sel_id not in correct_ids_str:
-                        wrong_selected = True
-                        break
-                
-                if wrong_selected:
-                    score -= q_neg
-                else:
-                    # Partial / Full Marks Formula
-                    num_correct_options = len(correct_ids_str)
-                    if num_correct_options > 0:
-                        if question.allow_partial_marking:
-                            score += len(selected_ids_str) * (q_marks / num_correct_options)
-                        else:
-                            # Non-partial: Only full marks if all correct are selected
-                            if len(selected_ids_str) == num_correct_options:
-                                score += q_marks
-                            else:
-                                # Not all correct selected and no wrong selected
-                                # In strict JEE style without partial, this is usually 0 or negative.
-                                # User said "scoring without partial marking", which usually means 0 unless it's wrong.
-                                # But if ANY deviation from correct set, standard competitive exams give negative or 0.
-                                # Let's assume negative if not perfectly correct, to be safe, or 0? 
-                                # Usually, "No Partial" means you MUST get all right for +4, else -2.
-                                score -= q_neg
-
-        elif question.question_type == Question.Type.NUMERICAL:
-            if user_answer and user_answer[0]:
-                try:
-                    val = float(user_answer[0])
-                    correct_val = question.numerical_answer
-                    tolerance = question.numerical_tolerance if question.numerical_tolerance is not None else 0.0
-                    
-                    if correct_val is not None and abs(val - correct_val) <= tolerance:
-                        score += q_marks
-                    else:
-                        score -= q_neg
-                except ValueError:
-                    pass # Invalid input, treated as 0 or wrong? Usually 0 if not parsed, but here ignored.
-
-        elif question.question_type == Question.Type.MATRIX:
-            # Matrix Match Logic
-            # Usually evaluated per Row.
-            # Total Marks = q_marks.
-            # Marks per row = q_marks / number_of_rows?
-            # Or q_marks is per question?
-            # Let's assume q_marks is TOTAL for the question.
-            
-            if question.matrix_config and 'rows' in question.matrix_config and 'correct' in question.matrix_config:
-                answer_data = {}
-                rows = question.matrix_config['rows']
-                num_rows = len(rows)
-                marks_per_row = q_marks / num_rows if num_rows > 0 else 0
-                
-                rows_correct_count = 0
-                
-                for row in rows:
-                    row_id = row['id']
-                    user_selected_cols = request.POST.getlist(f'question_{question.id}_row_{row_id}')
-                    answer_data[row_id] = user_selected_cols
-                    
-                    # Logic: "Correct" if the set of selected matches the set of correct
-                    correct_cols = set(question.matrix_config['correct'].get(row_id, []))
-                    user_cols = set(user_selected_cols)
-                    
-                    if correct_cols == user_cols:
-                        score += marks_per_row
-                        rows_correct_count += 1
-                    else:
-                        # Incorrect row? Usually 0, sometimes negative.
-                        # Assuming 0 for now unless defined.
-                        pass
-                
-                # No overall negative for Matrix unless specified.
-
-        elif question.question_type == Question.Type.MATRIX_SINGLE:
-             # Treat as multiple MCQ_SINGLE questions joined?
-             # For now, let's skip complex logic or treat similar to MATRIX
-             pass
-
-        # Save Response
+        answer_data = request.POST.getlist(f'question_{question.id}')
+        if question.question_type in [Question.Type.MATRIX, Question.Type.MATRIX_SINGLE]:
+            prefix = f'question_{question.id}_row_'
+            matrix_data = {key[len(prefix):]: request.POST.getlist(key) for key in request.POST if key.startswith(prefix)}
+            if matrix_data:
+                answer_data = matrix_data
+
         Response.objects.update_or_create(
             attempt=attempt,
             question=question,
             defaults={'answer_data': answer_data}
         )
 
-    attempt.score = score
-    attempt.completed_at = timezone.now()
-    attempt.save()
+    calculate_final_score(attempt)
     
     return redirect('result', attempt_id=attempt.id)
 
@@ -554,9 +551,19 @@ def result(request, attempt_id):
 
         final_responses_list.append(response)
 
+    standing = None
+    if attempt.completed_at:
+        board = get_leaderboard(attempt.quiz_id)
+        standing = {
+            'rank': board.rank(attempt.score),
+            'participants': len(board),
+            'percentile': board.percentile(attempt.score),
+        }
+
     return render(request, 'quiz/result.html', {
         'attempt': attempt,
-        'responses': final_responses_list
+        'responses': final_responses_list,
+        'standing': standing,
     })
 
 @user_passes_test(lambda u: u.is_staff or u.is_superuser)
@@ -572,7 +579,7 @@ def question_bank(request):
     selected_difficulty = request.GET.get('difficulty')
     
     # Query
-    questions = Question.objects.all().order_by('-id')
+    questions = Question.objects.filter(is_retired=False).order_by('-id')
     
     if selected_type:
         questions = questions.filter(question_type=selected_type)
@@ -597,6 +604,107 @@ def question_bank(request):
         'selected_chapter': selected_chapter,
         'selected_difficulty': selected_difficulty,
     })
+
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+def item_analysis(request, quiz_id):
+    quiz = get_object_or_404(Quiz, pk=quiz_id)
+    return render(request, 'quiz/item_analysis.html', {
+        'quiz': quiz,
+        'analysis': analyze_quiz(quiz.id),
+    })
+
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+def cohort_dashboard(request):
+    groups = Group.objects.order_by('name')
+    group = groups.filter(pk=request.GET['group']).first() if request.GET.get('group', '').isdigit() else None
+    quizzes = Quiz.objects.order_by('title')
+    if group is not None:
+        # Quizzes assigned to the group first, then the rest
+        assigned = set(group.quizzes.values_list('id', flat=True))
+        quizzes = sorted(quizzes, key=lambda q: q.id not in assigned)
+    quiz = None
+    if request.GET.get('quiz', '').isdigit():
+        quiz = next((q for q in quizzes if q.id == int(request.GET['quiz'])), None)
+    report = get_report(group.id, quiz.id) if group is not None and quiz is not None else None
+    return render(request, 'quiz/cohort_dashboard.html', {
+        'groups': groups,
+        'quizzes': quizzes,
+        'group': group,
+        'quiz': quiz,
+        'report': report,
+        'histogram_peak': max((n for _, _, n in report.histogram), default=0) if report else 0,
+    })
+
+def prometheus_metrics(request):
+    """
+    Prometheus scrape endpoint, for a bearer token or a logged-in staff user.
+    """
+    if not metrics.enabled():
+        raise Http404
+    token = getattr(settings, 'QUIZ_METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    authorized = request.user.is_staff or request.user.is_superuser
+    if token and authorization.startswith('Bearer '):
+        authorized = authorized or secrets.compare_digest(authorization[len('Bearer '):], token)
+    if not authorized:
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+def query_stats(request):
+    if request.method == 'POST':
+        querystats.reset()
+        return redirect('query_stats')
+    max_queries, max_sql_ms = querystats.thresholds()
+    return render(request, 'quiz/query_stats.html', {
+        'enabled': querystats.enabled(),
+        'views': querystats.view_stats(),
+        'max_queries': max_queries,
+        'max_sql_ms': max_sql_ms,
+        'repeat_threshold': querystats.REPEAT_THRESHOLD,
+    })
+
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+def profiles(request):
+    return render(request, 'quiz/profiles.html', {
+        'profiles': profiling.stored_profiles(),
+        'header': profiling.HEADER,
+        'query_flag': profiling.QUERY_FLAG,
+        'keep': profiling.keep(),
+    })
+
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+def profile_detail(request, name):
+    profile = next((p for p in profiling.stored_profiles() if p.name == name), None)
+    if profile is None:
+        raise Http404
+    sort = 'tottime' if request.GET.get('sort') == 'tottime' else 'cumulative'
+    return render(request, 'quiz/profile_detail.html', {
+        'profile': profile,
+        'sort': sort,
+        'report': profiling.top_functions(name, sort),
+    })
+
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+def profile_download(request, name, kind):
+    path = profiling.file_path(name, f'.{kind}')
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{name}.{kind}')
+
+@user_passes_test(lambda u: u.is_staff or u.is_superuser)
+def export_results(request, quiz_id):
+    quiz = get_object_or_404(Quiz, pk=quiz_id)
+    kind = request.GET.get('kind', results_export.ATTEMPTS)
+    fmt = request.GET.get('format', results_export.CSV)
+    try:
+        content = results_export.stream(kind, fmt, quiz.id)
+    except results_export.ExportError as e:
+        return HttpResponseBadRequest(str(e))
+    response = StreamingHttpResponse(content, content_type=results_export.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="quiz-{quiz.id}-{kind}.{fmt}"'
+    return response
+
 @login_required
 def create_test(request):
     if request.method == 'POST':
@@ -608,7 +716,7 @@ def create_test(request):
         time_limit = int(request.POST.get('time_limit', 30))
         
         # Base Query
-        questions_pool = Question.objects.all()
+        questions_pool = Question.objects.filter(is_retired=False)
         
         if syllabus_type == 'PART' and chapters:
             questions_pool = questions_pool.filter(chapter__in=chapters)
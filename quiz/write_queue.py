@@ -0,0 +1,117 @@
+"""
+Single-writer queue for the hot-path writes of an exam (answer saves).
+
+SQLite allows one writer at a time. With many request threads each writing
+on its own connection, they queue on the busy timeout and every save is its
+own transaction and fsync. With QUIZ_SERIALIZE_WRITES on, run() instead hands
+the write to one thread per process. That thread owns a single connection
+and commits whatever is waiting (up to BATCH_SIZE writes) in one
+transaction. Each write runs in its own savepoint, so a failing write only
+fails its own caller.
+
+The work runs on another connection, so run() must not be called inside an
+open transaction.atomic() block whose data the write depends on.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+# How long run() waits for its write before giving up
+RESULT_TIMEOUT = 30
+
+_queue = queue.SimpleQueue()
+_lock = threading.Lock()
+_thread = None
+
+
+def enabled():
+    return getattr(settings, 'QUIZ_SERIALIZE_WRITES', False)
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Queues fn(*args, **kwargs) for the writer thread; returns a Future.
+    """
+    future = Future()
+    _ensure_thread()
+    _queue.put((future, fn, args, kwargs))
+    return future
+
+
+def run(fn, *args, **kwargs):
+    """
+    Runs a write and returns its result. It goes through the writer thread
+    when QUIZ_SERIALIZE_WRITES is on, and runs here otherwise.
+    """
+    if not enabled():
+        return fn(*args, **kwargs)
+    return submit(fn, *args, **kwargs).result(RESULT_TIMEOUT)
+
+
+async def arun(fn, *args, **kwargs):
+    """
+    run() for async views: awaits the writer thread without blocking the
+    event loop, or runs fn through sync_to_async when the queue is off.
+    """
+    if not enabled():
+        return await sync_to_async(fn)(*args, **kwargs)
+    return await asyncio.wait_for(asyncio.wrap_future(submit(fn, *args, **kwargs)), RESULT_TIMEOUT)
+
+
+def _take_batch():
+    batch = [_queue.get()]
+    while len(batch) < BATCH_SIZE:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write(batch):
+    done = []
+    with transaction.atomic():
+        for future, fn, args, kwargs in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with transaction.atomic():
+                    done.append((future, fn(*args, **kwargs)))
+            except Exception as e:
+                future.set_exception(e)
+    # Results are only handed back once they are committed
+    for future, result in done:
+        future.set_result(result)
+
+
+def _run():
+    while True:
+        batch = _take_batch()
+        close_old_connections()
+        try:
+            _write(batch)
+        except Exception as e:
+            logger.exception('Could not commit %d queued writes', len(batch))
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+def _ensure_thread():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock:
+        # Started lazily so that each forked worker gets its own
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='write-queue', daemon=True)
+            _thread.start()